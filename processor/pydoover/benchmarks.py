@@ -0,0 +1,306 @@
+"""
+pydoover.benchmarks
+~~~~~~~~~~~~~~~~~~~
+Micro-benchmarks for the hot paths in pydoover. Run with `python -m pydoover.benchmarks [name ...]`.
+"""
+
+import json
+import random
+import sys
+import threading
+import time
+
+from . import codec
+from .utils import Calibration, map_reading, np
+
+
+def _timeit(func, repeat: int = 5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _report(name: str, elapsed: float, count: int):
+    print(f"{name:<40} {elapsed * 1000:>10.2f}ms {count / elapsed:>14,.0f}/s")
+
+
+def _legacy_map_reading(in_val, output_values, raw_readings=[4, 20], ignore_below=3):
+    # the original linear-scan implementation, kept here as a baseline.
+    if in_val < ignore_below:
+        return None
+
+    lower_val_ind = 0
+    found = False
+    for i in range(0, len(raw_readings)):
+        if in_val <= raw_readings[i]:
+            lower_val_ind = i - 1
+            found = True
+            break
+
+    if not found:
+        lower_val_ind = len(raw_readings) - 2
+
+    inSpan = raw_readings[lower_val_ind + 1] - raw_readings[lower_val_ind]
+    outSpan = output_values[lower_val_ind + 1] - output_values[lower_val_ind]
+    valueScaled = float(in_val - raw_readings[lower_val_ind]) / float(inSpan)
+    return output_values[lower_val_ind] + (valueScaled * outSpan)
+
+
+def bench_map_reading(num_samples: int = 100_000):
+    raw = [4, 6, 8, 10, 12, 14, 16, 18, 20]
+    out = [0, 5, 12, 20, 35, 50, 70, 85, 100]
+    samples = [random.uniform(2, 21) for _ in range(num_samples)]
+    calibration = Calibration(out, raw)
+
+    _report("map_reading (legacy)", _timeit(lambda: [_legacy_map_reading(s, out, raw) for s in samples]), num_samples)
+    _report("map_reading", _timeit(lambda: [map_reading(s, out, raw) for s in samples]), num_samples)
+    _report("Calibration.map", _timeit(lambda: [calibration.map(s) for s in samples]), num_samples)
+
+    if np is not None:
+        arr = np.asarray(samples)
+        _report("Calibration.map_array", _timeit(lambda: calibration.map_array(arr)), num_samples)
+
+
+def bench_client_threads(num_threads: int = 16, requests_per_thread: int = 100, latency: float = 0.002):
+    """Stress a single `Client` from many threads against a `LocalBroker` served over HTTP.
+
+    Raises if any request errors, if the expired token is refreshed more than once, or if a publish is lost.
+    """
+    from datetime import datetime, timedelta
+    from .cloud.api import Client, LocalBroker
+    from .cloud.api.client import AccessToken
+
+    broker = LocalBroker(latency=latency, seed=0)
+    agent_id = broker.add_agent()
+    broker.add_user("bench", "bench", agent_id)
+    server = broker.serve()
+
+    client = Client("bench", "bench", base_url=server.url, login_callback=lambda: None, pool_maxsize=num_threads)
+    client.login()
+    channel = client.create_channel("bench", agent_id)
+
+    # expire the token so every thread races to refresh it.
+    client.access_token = AccessToken(client.access_token.token, datetime.utcnow() - timedelta(seconds=1))
+    logins_before = broker.calls["POST /accounts/login/"]
+    tokens_before = broker.calls["GET /ch/v1/get_temp_token/"]
+    messages_before = len(broker.channels[channel.id].messages)
+
+    errors = []
+
+    def work(thread_num):
+        try:
+            for i in range(requests_per_thread):
+                if i % 2:
+                    channel.publish({f"thread_{thread_num}": i})
+                else:
+                    client.get_channel(channel.id)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=work, args=(n, )) for n in range(num_threads)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    total = num_threads * requests_per_thread
+    logins = broker.calls["POST /accounts/login/"] - logins_before
+    tokens = broker.calls["GET /ch/v1/get_temp_token/"] - tokens_before
+    published = len(broker.channels[channel.id].messages) - messages_before
+    expected = num_threads * (requests_per_thread // 2)
+
+    _report(f"Client x {num_threads} threads", elapsed, total)
+    print(f"errors: {len(errors)}, logins: {logins}, token refreshes: {tokens}, publishes applied: {published}/{expected}")
+    if errors:
+        raise errors[0]
+    if logins != 1 or tokens != 1:
+        raise AssertionError(f"Expected the expired token to be refreshed once, got {logins} logins and {tokens} tokens.")
+    if published != expected:
+        raise AssertionError(f"Expected {expected} publishes to reach the broker, got {published}.")
+
+
+def _make_ui_state(num_submodules: int, vars_per_submodule: int) -> dict:
+    # a typical dashboard: submodules of ranged variables, as pushed by `UIManager`.
+    # (pydoover.ui can't be imported before pydoover.cloud, they import each other.)
+    from . import cloud  # noqa: F401
+    from .ui import Container, Range, Submodule, Variable
+
+    submodules = []
+    for i in range(num_submodules):
+        variables = [
+            Variable(
+                f"var_{i}_{j}", f"Variable {i}.{j}", "float", curr_val=random.uniform(0, 100), precision=2,
+                ranges=[Range("Low", 0, 20, "yellow"), Range("OK", 20, 80, "green"), Range("High", 80, 100, "red")],
+            )
+            for j in range(vars_per_submodule)
+        ]
+        submodules.append(Submodule(f"submodule_{i}", f"Submodule {i}", children=variables, status="Running"))
+    return {"state": Container("state", children=submodules, auto_add_elements=False).to_dict()}
+
+
+def bench_codec(repeat: int = 20):
+    codecs = [codec.get_codec(name) for name in codec.CODECS]
+    for num_submodules, vars_per_submodule in ((2, 5), (10, 20), (50, 40)):
+        ui_state = _make_ui_state(num_submodules, vars_per_submodule)
+        encoded = json.dumps(ui_state).encode()
+        print(f"ui_state with {num_submodules * vars_per_submodule} variables ({len(encoded) / 1024:.1f}KB):")
+
+        for c in codecs:
+            _report(f"  {c.name} dumps", _timeit(lambda: [c.dumps(ui_state) for _ in range(repeat)]), repeat)
+            _report(f"  {c.name} loads", _timeit(lambda: [c.loads(encoded) for _ in range(repeat)]), repeat)
+
+
+def bench_message_batch(num_messages: int = 100_000):
+    import tracemalloc
+    from .cloud.api.message import Message, MessageBatch
+
+    now = time.time()
+    data = [
+        {"message": f"{i:032x}", "agent": "agent", "timestamp": now - i, "payload": {"pressure": random.random()}}
+        for i in range(num_messages)
+    ]
+
+    _report("list[Message]", _timeit(lambda: [Message(None, m, channel_id="c") for m in data], repeat=3), num_messages)
+    if np is None:
+        return
+    _report("MessageBatch.from_data", _timeit(lambda: MessageBatch.from_data(None, "c", data), repeat=3), num_messages)
+
+    for name, build in (
+        ("list[Message]", lambda: [Message(None, m, channel_id="c") for m in data]),
+        ("MessageBatch", lambda: MessageBatch.from_data(None, "c", data)),
+    ):
+        tracemalloc.start()
+        result = build()
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del result
+        print(f"{name + ' memory':<40} {size / 1024 / 1024:>10.2f}MB")
+
+    batch = MessageBatch.from_data(None, "c", data)
+    _report("MessageBatch.newer_than(1h)", _timeit(lambda: batch.newer_than(3600)), num_messages)
+    _report("MessageBatch.field", _timeit(lambda: batch.field("pressure"), repeat=3), num_messages)
+
+
+def bench_rolling(num_samples: int = 100_000):
+    """Rolling-window updates, one at a time and vectorised, with samples arriving out of order."""
+    if np is None:
+        return
+    from .rolling import RollingWindow
+
+    now = time.time()
+    timestamps = now - np.random.random(num_samples) * 5 * 3600
+    values = np.random.random(num_samples) * 10
+    pairs = list(zip(timestamps.tolist(), values.tolist()))
+
+    def one_at_a_time():
+        window = RollingWindow(600, 30)
+        for ts, value in pairs:
+            window.add(ts, value)
+
+    _report("RollingWindow.add", _timeit(one_at_a_time, repeat=3), num_samples)
+    _report("RollingWindow.add_many", _timeit(lambda: RollingWindow(600, 30).add_many(timestamps, values)), num_samples)
+
+    window = RollingWindow(600, 30)
+    window.add_many(timestamps, values)
+    _report("RollingWindow.stats", _timeit(window.stats), 1)
+
+
+def bench_fleet_health(num_agents: int = 10_000):
+    if np is None:
+        return
+    from .health import FleetHealth
+
+    now = time.time()
+    health = FleetHealth()
+    health.set_agents({
+        f"agent-{i}": {"connectionType": "periodic", "connectionPeriod": 600, "allowedMisses": 2}
+        for i in range(num_agents)
+    })
+    last_seen = {f"agent-{i}": now - random.random() * 3600 for i in range(num_agents)}
+
+    _report("FleetHealth.set_last_seen", _timeit(lambda: health.set_last_seen(last_seen)), num_agents)
+    _report("FleetHealth.evaluate", _timeit(lambda: health.evaluate(now)), num_agents)
+
+
+def bench_ui_manager(num_variables: int = 200, iterations: int = 200):
+    """`UIManager` push, diff and command throughput, over HTTP (a `Client`) and a persistent connection (a
+    `LocalDeviceAgent`), both backed by a `LocalBroker`."""
+    import contextlib
+    import io
+    from . import cloud  # noqa: F401
+    from .cloud.api import LocalBroker, LocalDeviceAgent
+    from .ui import Action, NumericVariable, UIManager
+
+    for mode in ("http", "dda"):
+        broker = LocalBroker(seed=0)
+        if mode == "http":
+            agent_id = broker.add_agent(name="device")
+            for channel_name in ("ui_state", "ui_cmds"):
+                broker.add_channel(agent_id, channel_name, {})
+            manager = UIManager(agent_id, broker.client(agent_id))
+        else:
+            dda = LocalDeviceAgent(broker, observers=1)
+            agent_id = dda.agent_id
+            manager = UIManager(agent_id, dda, auto_start=True)
+
+        handled = []
+        manager.add_children(
+            *[NumericVariable(f"var_{i}", f"Variable {i}") for i in range(num_variables)],
+            Action("pump", "Pump", callback=handled.append),
+        )
+        cloud_client = broker.client(agent_id)
+
+        def push():
+            for i in range(iterations):
+                manager.update_variable(f"var_{i % num_variables}", i)
+                manager.push()
+
+        def commands():
+            for i in range(iterations):
+                cloud_client.publish_to_channel_name(agent_id, "ui_cmds", {"cmds": {"pump": i}})
+                if mode == "http":
+                    manager.pull()
+
+        # push() prints on every call.
+        with contextlib.redirect_stdout(io.StringIO()):
+            manager.push()
+            push_time = _timeit(push, repeat=1)
+            diff_time = _timeit(lambda: [manager._get_ui_state_update() for _ in range(iterations)])
+            command_time = _timeit(commands, repeat=1)
+
+        _report(f"{mode}: push", push_time, iterations)
+        _report(f"{mode}: diff", diff_time, iterations)
+        _report(f"{mode}: commands", command_time, iterations)
+
+        print(f"{mode}: commands handled {len(handled)}/{iterations}, requests: {broker.request_count}")
+        if mode == "dda":
+            dda.close()
+
+
+BENCHMARKS = {
+    "map_reading": bench_map_reading,
+    "client_threads": bench_client_threads,
+    "codec": bench_codec,
+    "message_batch": bench_message_batch,
+    "rolling": bench_rolling,
+    "fleet_health": bench_fleet_health,
+    "ui_manager": bench_ui_manager,
+}
+
+
+def main(names=None):
+    for name in names or BENCHMARKS.keys():
+        print(f"== {name} ==")
+        BENCHMARKS[name]()
+        print()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -30,6 +30,9 @@ from . import parsers
 from .. import __version__
 from ..cloud.api import Client, Forbidden, NotFound
 from ..cloud.api.channel import Processor, Task
+from ..cloud.processor.replay import ReplayHarness, read_message_log
+from ..cloud.processor.runner import LocalRunner
+from ..utils import get_path
 
 from .config import ConfigEntry, ConfigManager, NotSet
 from .decorators import command, annotate_arg
@@ -368,7 +371,7 @@ class CLI:
         msg_obj = None
         if channel_name:
             channel = self.api.get_channel_named(channel_name, self.agent_id)
-            msg_obj = channel.last_message
+            msg_obj = channel.last_message and channel.last_message.to_dict()
 
         task.invoke_locally(
             package_path,
@@ -376,6 +379,60 @@ class CLI:
             {"deployment_config": {}}
         )
 
+    @command(setup_api=True)
+    @annotate_arg("task_name", "Task channel name to run.")
+    @annotate_arg("package_path", "Path to the processor package to run and watch for changes")
+    @annotate_arg("channel_name", "[Optional] re-run the task when a new message arrives on this channel.")
+    @annotate_arg("poll_interval", "How often to check the package for changes (in seconds)")
+    def watch_local_task(
+        self, task_name: parsers.task_name, package_path: pathlib.Path, channel_name: Optional[str] = None,
+        poll_interval: float = 0.25,
+    ):
+        """Run a task locally, re-running it whenever the package changes or a new message arrives."""
+        task = self.api.get_channel_named(task_name, self.agent_id)
+        if not isinstance(task, Task):
+            print("That wasn't a task channel. Try again?")
+            return
+        print(self.format_channel_info(task))
+
+        runner = LocalRunner(
+            task, str(package_path), channel_names=channel_name and [channel_name] or None, poll_interval=poll_interval
+        )
+        print(f"Watching {runner.package_dir} for changes. Press Ctrl+C to stop.")
+        try:
+            runner.watch()
+        except KeyboardInterrupt:
+            print(f"Stopped after {runner.run_count} runs.")
+
+    @command(description="Replay a recorded message log through a processor package locally")
+    @annotate_arg("package_path", "Path to the processor package to replay messages through")
+    @annotate_arg("log_file", "Newline-delimited JSON file of recorded channel messages")
+    @annotate_arg("speed", "Replay speed as a multiple of real time. 0 replays as fast as possible.")
+    @annotate_arg("task_config", "[Optional] Task config (JSON) to invoke the processor with")
+    @annotate_arg("snapshot", "[Optional] JSON file of channel name to aggregate to seed the local backend with")
+    def replay_processor(
+        self, package_path: pathlib.Path, log_file: pathlib.Path, speed: float = 0,
+        task_config: parsers.maybe_json = None, snapshot: pathlib.Path = None
+    ):
+        if not package_path.exists():
+            print("Package path was incorrect.")
+            return
+        if not log_file.exists():
+            print("Log file not found.")
+            return
+
+        snapshot_data = None
+        if snapshot is not None:
+            with open(snapshot, "r") as fp:
+                snapshot_data = json.loads(fp.read())
+
+        messages = read_message_log(log_file)
+        print(f"Replaying {len(messages)} messages at {speed and f'{speed}x' or 'max'} speed...")
+
+        harness = ReplayHarness(str(package_path), task_config=task_config, snapshot=snapshot_data)
+        report = harness.run(messages, speed=speed or None)
+        print(report.format())
+
     @command(setup_api=True)
     def create_processor(self, processor_name: parsers.processor_name):
         """Create new processor channel."""
@@ -455,6 +512,44 @@ class CLI:
 
             time.sleep(poll_rate)
 
+    @command(description="Show a channel's aggregate across many agents", setup_api=True)
+    @annotate_arg("channel_name", "Channel name to fetch the aggregate of")
+    @annotate_arg("agent_ids", "[Optional] Comma-separated agent IDs. Defaults to all agents you have access to.")
+    @annotate_arg("fields", "[Optional] Comma-separated aggregate fields to show as columns, eg. state.pressure")
+    @annotate_arg("concurrency", "[Optional] Maximum number of requests to make at once. Defaults to one per agent, up to 32.")
+    def fleet_aggregates(
+        self, channel_name: str, agent_ids: parsers.comma_list = None, fields: parsers.comma_list = None,
+        concurrency: int = None,
+    ):
+        if agent_ids:
+            names = {a: a for a in agent_ids}
+        else:
+            agents = self.api.get_agent_list()
+            names = {a.id: a.name or a.id for a in agents}
+            agent_ids = list(names.keys())
+
+        start = time.perf_counter()
+        aggregates, errors = self.api.fetch_aggregates(agent_ids, channel_name, concurrency=concurrency)
+        elapsed = time.perf_counter() - start
+
+        columns = fields or ["aggregate"]
+        rows = []
+        for agent_id in agent_ids:
+            if agent_id in errors:
+                values = [f"error: {errors[agent_id]}"] + [""] * (len(columns) - 1)
+            elif fields:
+                values = [get_path(aggregates[agent_id], tuple(f.split(".")), "") for f in fields]
+            else:
+                values = [json.dumps(aggregates[agent_id])]
+            rows.append([names[agent_id]] + [str(v) for v in values])
+
+        header = ["agent"] + columns
+        widths = [min(60, max(len(r[i]) for r in rows + [header])) for i in range(len(header))]
+        for row in [header, ["-" * w for w in widths]] + rows:
+            print("  ".join(v[:w].ljust(w) for v, w in zip(row, widths)))
+
+        print(f"\nFetched {len(aggregates)} aggregates ({len(errors)} errors) in {elapsed:.2f}s")
+
     @command(setup_api=True)
     @annotate_arg("task_name", "Task name to add the subscription to")
     @annotate_arg("channel_name", "Channel name to subscribe to")
@@ -9,6 +9,10 @@ def task_name(name: str) -> str:
     return "!" + name.lstrip("!")
 
 
+def comma_list(data: str) -> list[str]:
+    return [d.strip() for d in data.split(",") if d.strip()]
+
+
 def maybe_json(data: str):
     try:
         return json.loads(data)
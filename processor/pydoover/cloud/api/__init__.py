@@ -1,5 +1,10 @@
 from .agent import Agent
+from .cache import QueryCache
 from .channel import Channel, Processor
 from .client import Client
-from .message import Message
+from .message import Message, MessageBatch
 from .exceptions import Forbidden, HTTPException, NotFound
+from .local import LocalBroker, LocalDeviceAgent
+from .mirror import MessageMirror
+from .outbox import Outbox
+from .rollup import RollupStore
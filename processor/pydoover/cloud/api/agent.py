@@ -1,7 +1,10 @@
+from typing import Optional
+
 from .channel import Channel
 
 
 class Agent:
+    __slots__ = ("client", "id", "type", "name", "owner_org", "deployment_config", "channels", "_channel_index")
 
     def __init__(self, client, data):
         self.client = client
@@ -12,6 +15,7 @@ class Agent:
         self.owner_org = None
         self.deployment_config = None
         self.channels = None
+        self._channel_index = None
 
         self._from_data(data)
 
@@ -29,12 +33,23 @@ class Agent:
         if 'settings' in data and 'deployment_config' in data['settings']: self.deployment_config = data["settings"]["deployment_config"]
         else: self.deployment_config = None
 
-        self.channels = [Channel(data=c, client=self.client) for c in data["channels"]]
+        self.channels = [self.client._parse_channel(c) for c in data["channels"]]
+        self._channel_index = None
 
     @property
     def agent_id(self):
         return self.id
 
+    @property
+    def channel_index(self) -> dict[str, Channel]:
+        """Channel name: channel, built on first use (and rebuilt after `update`)."""
+        if self._channel_index is None:
+            self._channel_index = {c.name: c for c in self.channels}
+        return self._channel_index
+
+    def get_channel(self, channel_name: str) -> Optional[Channel]:
+        return self.channel_index.get(channel_name)
+
     def update(self):
         res = self.client._get_agent_raw(self.id)
         return self._from_data(res)
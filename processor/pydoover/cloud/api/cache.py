@@ -0,0 +1,115 @@
+import threading
+import time
+
+from collections import OrderedDict
+from typing import Any, Optional
+
+from ... import codec
+
+
+# returned by `QueryCache.get` on a miss, since None is a valid cached value.
+MISSING = object()
+
+
+class QueryCache:
+    """A bounded LRU cache of channel reads (eg. aggregates and message windows), shared by every `Channel` of a
+    `Client`.
+
+    Keys are tuples of ``(kind, channel_id, *query)``. Values are stored encoded, so their size is known and
+    callers can't mutate a cached value through a previous result. Entries are evicted least recently used first
+    once there are more than ``max_entries`` or they take more than ``max_bytes``.
+
+    Parameters
+    ----------
+    max_bytes: int
+        Maximum total size of the encoded entries.
+    max_entries: int
+        Maximum number of entries.
+    ttl: float
+        Default maximum age (seconds) of an entry served by `get`. Reads can ask for a different ``max_age``.
+    """
+
+    def __init__(self, max_bytes: int = 8 * 1024 * 1024, max_entries: int = 1024, ttl: float = 30):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        # key: (encoded value, stored at)
+        self._entries: OrderedDict[tuple, tuple[bytes, float]] = OrderedDict()
+        self._by_channel: dict[str, set[tuple]] = {}
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key: tuple):
+        data, _ = self._entries.pop(key)
+        self._bytes -= len(data)
+        keys = self._by_channel.get(key[1])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_channel[key[1]]
+
+    def get(self, key: tuple, max_age: Optional[float] = None) -> Any:
+        """The cached value for ``key`` if it's at most ``max_age`` (default ``ttl``) seconds old, else `MISSING`."""
+        max_age = self.ttl if max_age is None else max_age
+        with self._lock:
+            try:
+                data, stored_at = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return MISSING
+
+            age = time.monotonic() - stored_at
+            if age > max_age:
+                if age > self.ttl:
+                    self._remove(key)
+                self.misses += 1
+                return MISSING
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return codec.loads(data)
+
+    def set(self, key: tuple, value: Any):
+        data = codec.dumps(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if len(data) > self.max_bytes or self.max_entries <= 0:
+                return
+
+            self._entries[key] = (data, time.monotonic())
+            self._by_channel.setdefault(key[1], set()).add(key)
+            self._bytes += len(data)
+
+            while self._bytes > self.max_bytes or len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, channel_id: str):
+        """Drop every entry for a channel, eg. after publishing to it."""
+        with self._lock:
+            for key in list(self._by_channel.get(channel_id, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_channel.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
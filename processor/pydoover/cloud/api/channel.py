@@ -4,23 +4,25 @@ import shutil
 import uuid
 import mimetypes
 import logging
-import sys
-import importlib
 import pathlib
 from datetime import datetime
 
-from typing import TYPE_CHECKING, Any, Optional
+from typing import TYPE_CHECKING, Any, Iterator, Optional, Union
+
+from .cache import MISSING
+from .message import Message
 
 if TYPE_CHECKING:
     from .client import Client
+    from .message import MessageBatch
 
 
 class Channel:
+    __slots__ = ("client", "id", "name", "agent_id", "_agent", "_aggregate", "_loaded")
 
     def __init__(self, *, client, data):
         self.client: "Client" = client
         self._aggregate = None
-        self._messages = None
 
         self._from_data(data)
 
@@ -34,18 +36,26 @@ class Channel:
         self.agent_id = (data.get("owner") or data.get("agent"))
         self._agent = None
 
+        # channels listed by an agent only have an ID and name; the rest is loaded on first use.
+        self._loaded = "aggregate" in data
         try:
             self._aggregate = data["aggregate"]["payload"]
-        except KeyError:
+        except (KeyError, TypeError):
             self._aggregate = None
 
+        if self._loaded:
+            self.client.query_cache.set(("aggregate", self.id), self._aggregate)
+
     @property
     def aggregate(self):
+        if not self._loaded:
+            self.update()
         return self._aggregate
 
     def update(self):
         res = self.client._get_channel_raw(self.id)
         self._from_data(res)
+        self._loaded = True
 
     def get_tunnel_url(self, address):
         if self.name != "tunnels":
@@ -68,19 +78,62 @@ class Channel:
         self._agent = self.client.get_agent(self.agent_id)
         return self._agent
 
-    def fetch_aggregate(self):
-        if self._aggregate is not None:
-            return self._aggregate
-    
+    def fetch_aggregate(self, max_age: Optional[float] = None):
+        """The channel's aggregate, from the client's query cache if it's at most ``max_age`` seconds old.
+
+        ``max_age`` defaults to the cache's TTL; pass 0 to always fetch.
+        """
+        aggregate = self.client.query_cache.get(("aggregate", self.id), max_age)
+        if aggregate is not MISSING:
+            self._aggregate = aggregate
+            return aggregate
+
         self.update()
         return self._aggregate
 
-    def fetch_messages(self, num_messages: int = 10):
-        if self._messages is not None:
-            return self._messages
-
-        self._messages = self.client.get_channel_messages(self.id, num_messages=num_messages)
-        return self._messages
+    def fetch_messages(self, num_messages: int = 10, max_age: Optional[float] = None) -> list["Message"]:
+        """The newest ``num_messages`` messages, from the client's query cache if they're at most ``max_age``
+        seconds old (see `fetch_aggregate`)."""
+        mirror = self.client.mirror
+        if mirror is not None:
+            # the mirror is the cache; syncing it only fetches messages from around the newest it already has.
+            mirror.sync(self.id)
+            messages = mirror.last(self.id, num_messages)
+            if len(messages) >= num_messages or num_messages <= mirror.page_size:
+                return messages
+
+            # the mirror only holds a limited history (see `MessageMirror.initial_history`); ask the API.
+            messages = self.client.get_channel_messages(self.id, num_messages=num_messages)
+            mirror.add_messages(messages)
+            return messages
+
+        # one entry per channel, holding the largest window fetched, which also answers smaller ones.
+        key = ("messages", self.id)
+        cached = self.client.query_cache.get(key, max_age)
+        if cached is not MISSING and (
+            cached["num_messages"] >= num_messages or len(cached["messages"]) < cached["num_messages"]
+        ):
+            return [Message(self.client, m, channel_id=self.id) for m in cached["messages"][:num_messages]]
+
+        messages = self.client.get_channel_messages(self.id, num_messages=num_messages)
+        self.client.query_cache.set(key, {"num_messages": num_messages, "messages": [m.to_dict() for m in messages]})
+        return messages
+
+    def iter_messages(
+        self, since: Union[datetime, float] = None, until: Union[datetime, float] = None, page_size: int = 100
+    ) -> Iterator["Message"]:
+        """Lazily iterate over messages in a time window, newest first. See `Client.iter_channel_messages`."""
+        return self.client.iter_channel_messages(self.id, since=since, until=until, page_size=page_size)
+
+    def fetch_message_batch(
+        self,
+        since: Union[datetime, float] = None,
+        until: Union[datetime, float] = None,
+        page_size: int = 100,
+        max_age: Optional[float] = None,
+    ) -> "MessageBatch":
+        """Fetch messages in a time window into a columnar `MessageBatch`. See `Client.fetch_message_batch`."""
+        return self.client.fetch_message_batch(self.id, since=since, until=until, page_size=page_size, max_age=max_age)
 
     def publish(self, data: Any, save_log: bool = True, log_aggregate: bool = False, override_aggregate: bool = False, timestamp: Optional[datetime] = None):
         return self.client.publish_to_channel(self.id, data, save_log, log_aggregate, override_aggregate, timestamp)
@@ -115,6 +168,7 @@ class Channel:
 
 
 class Processor(Channel):
+    __slots__ = ()
 
     def update_from_package(self, package_dir):
         fp = f"/tmp/{uuid.uuid4()}"
@@ -139,17 +193,10 @@ class Processor(Channel):
             agent_settings={},
             # *args, **kwargs
         ):
-        
-        logging.basicConfig(level=logging.DEBUG)
-        sys.path.append(package_dir)
 
         ## import the loaded generator file
-        spec = importlib.util.spec_from_file_location("target", "target.py")
-        target_task = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(target_task)
-
-        # from .target import generator
-        target_task = getattr(target_task, 'target')
+        from ..processor.loader import load_processor_class, task_logging
+        target_task = load_processor_class(package_dir)
 
         #     'agent_id' : The Doover agent id invoking the task e.g. '9843b273-6580-4520-bdb0-0afb7bfec049'
         #     'access_token' : A temporary token that can be used to interact with the Doover API .e.g 'ABCDEFGHJKLMNOPQRSTUVWXYZ123456890',
@@ -160,22 +207,27 @@ class Processor(Channel):
         #     'log_channel' : The identifier string of the channel to publish any logs to
         #     'agent_settings' : {
         #       'deployment_config' : {} # a dictionary of the deployment config for this agent
-        task_obj = target_task(
-            agent_id=agent_id,
-            access_token=access_token,
-            api_endpoint=api_endpoint,
-            package_config=package_config,
-            msg_obj=msg_obj,
-            task_id=task_id,
-            log_channel=log_channel,
-            agent_settings=agent_settings,
-            # *args, **kwargs,
-        )
-
-        task_obj.execute()
+        ## debug logging is only turned on while the task runs
+        with task_logging(logging.DEBUG):
+            task_obj = target_task(
+                agent_id=agent_id,
+                access_token=access_token,
+                api_endpoint=api_endpoint,
+                package_config=package_config,
+                msg_obj=msg_obj,
+                task_id=task_id,
+                log_channel=log_channel,
+                agent_settings=agent_settings,
+                # *args, **kwargs,
+            )
+            ## the processor sets the root logger to INFO when it's created
+            logging.getLogger().setLevel(logging.DEBUG)
+
+            task_obj.execute()
 
 
 class Task(Channel):
+    __slots__ = ("processor_id", "_processor")
 
     def _from_data(self, data):
         super()._from_data(data)
@@ -185,6 +237,8 @@ class Task(Channel):
     def fetch_processor(self) -> Optional[Processor]:
         if self._processor is not None:
             return self._processor
+        if self.processor_id is None and not self._loaded:
+            self.update()
         if self.processor_id is None:
             return
 
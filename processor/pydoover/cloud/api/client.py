@@ -1,26 +1,52 @@
 import logging
+import math
+import threading
+import time
+import uuid
+import warnings
 
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
-from typing import Any, Union, Callable, overload, Literal, Optional, TypeVar
-from urllib.parse import quote, urlencode
+from typing import Any, Union, Callable, Iterator, overload, Literal, Optional, TypeVar
+from urllib.parse import quote, urlencode, urlsplit
 
 import requests
+import requests.adapters
 
-from .message import Message
+from ... import codec
+from .message import Message, MessageBatch
 from .agent import Agent
+from .cache import MISSING, QueryCache
 from .channel import Channel, Processor, Task
+from .compression import available_encodings, compress
 from .exceptions import NotFound, Forbidden, HTTPException
+from .metrics import ClientMetrics
+from .mirror import MessageMirror
+from .outbox import Outbox
+from .retry import CircuitBreaker, RetryPolicy
 
 
 log = logging.getLogger(__name__)
 AccessToken = namedtuple("AccessToken", ["token", "expires_at"], defaults=(None, ))
+# agent ID: aggregate payload, and agent ID: exception for agents that couldn't be fetched.
+FleetAggregates = namedtuple("FleetAggregates", ["aggregates", "errors"])
 T = TypeVar("T", bound=Channel)
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+# seconds to wait before trying again after a failed background token refresh.
+TOKEN_REFRESH_RETRY_INTERVAL = 30
+REQUEST_HOOKS = ("before_request", "after_request", "request_error")
+# default upper bound on concurrent requests in `fetch_aggregates`.
+MAX_FETCH_CONCURRENCY = 32
+# largest page `iter_channel_messages` will grow to when more than a page of messages share one timestamp.
+MAX_PAGE_SIZE = 10_000
 
 
 class Route:
     def __init__(self, method, route, *args, **kwargs):
         self.method = method
+        # the unformatted route, eg. "/ch/v1/channel/{}", for grouping metrics.
+        self.template = route
 
         self.url = route
         if args:
@@ -30,6 +56,30 @@ class Route:
             self.url = f"{self.url}?{urlencode(kwargs)}"
 
 
+def _body_size(data: Any) -> int:
+    return len(data) if isinstance(data, (bytes, str)) else 0
+
+
+def _response_size(resp) -> int:
+    # bytes on the wire, ie. before requests decompresses a gzipped response. Falls back to the
+    # (decoded) body length for chunked responses without a Content-Length.
+    try:
+        return int(resp.headers["Content-Length"])
+    except (KeyError, ValueError):
+        return len(resp.content)
+
+
+def _log_body(resp, limit: int = 256) -> str:
+    body = resp.content[:limit].decode("utf-8", errors="replace")
+    return body + "..." if len(resp.content) > limit else body
+
+
+def _to_timestamp(value: Union[datetime, float, None]) -> Optional[float]:
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return value
+
+
 class Client:
 
     def __init__(
@@ -42,6 +92,18 @@ class Client:
         agent_id: str = None,
         verify: bool = True,
         login_callback: Callable = None,
+        session_factory: Callable[[], requests.Session] = None,
+        retry_policy: RetryPolicy = None,
+        circuit_breaker: dict[str, Any] = None,
+        outbox: Outbox = None,
+        pool_connections: int = 4,
+        pool_maxsize: int = 8,
+        token_refresh_fraction: Optional[float] = 0.8,
+        compression: Optional[str] = None,
+        compression_threshold: int = 2048,
+        compression_level: Optional[int] = None,
+        mirror: MessageMirror = None,
+        query_cache: QueryCache = None,
     ):
         self.access_token = AccessToken(token, token_expires)
         self.agent_id = agent_id
@@ -52,57 +114,312 @@ class Client:
 
         self.verify = verify
         self.base_url = base_url
-        self.session = requests.Session()
-
-        self.request_retries = 1
+        # anything that quacks like a `requests.Session`, eg. a `LocalBroker` session for offline testing.
+        self._session_factory = session_factory or requests.Session
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+
+        # `requests.Session` isn't guaranteed to be thread-safe, so each thread gets its own.
+        self._local = threading.local()
+        # set by assigning `client.session`; shared by every thread, see the setter.
+        self._shared_session = None
+        self._auth_headers = dict()
+        self._token_lock = threading.RLock()
+        self._breaker_lock = threading.Lock()
+        self._executor_lock = threading.Lock()
+        # pool size: executor. Never shut down while the client's alive, as other threads may be using them.
+        self._executors: dict[int, ThreadPoolExecutor] = {}
+        # agent ID: agent, for each agent fetched with `get_agent` or `get_agent_list`. See `get_channel_named`.
+        self._agents: dict[str, Agent] = {}
+
+        # renew the token in the background once this fraction of its lifetime has passed (None to disable),
+        # so requests don't stall on an inline login when it expires.
+        self.token_refresh_fraction = token_refresh_fraction
+        self._refresh_due = None
+        self._refresher = None
+        self._refresh_wakeup = threading.Event()
+        self._refresh_stop = threading.Event()
+
+        self.retry_policy = retry_policy or RetryPolicy()
         self.request_timeout = 25
 
+        self.metrics = ClientMetrics()
+        self._hooks: dict[str, list[Callable]] = {event: [] for event in REQUEST_HOOKS}
+        self._circuit_breaker_config = circuit_breaker or {}
+        self._circuit_breakers: dict[str, CircuitBreaker] = {}
+
+        # opt-in request body compression ("gzip" or "zstd") for bodies of at least compression_threshold bytes.
+        if compression is not None and compression not in available_encodings():
+            raise ValueError(f"Unsupported compression {compression}, must be one of {', '.join(available_encodings())}")
+        self.compression = compression
+        self.compression_threshold = compression_threshold
+        self.compression_level = compression_level
+        # set if the server responds 415 to a compressed body, so we stop compressing.
+        self._compression_rejected = False
+
+        # optional store-and-forward queue for publishes made while the API is unreachable
+        self.outbox = outbox
+
+        # optional local copy of channel messages, which `Channel.fetch_messages` is served from.
+        self.mirror = mirror
+        if mirror is not None and mirror.client is None:
+            mirror.client = self
+
+        # LRU cache of channel aggregates and message windows, shared by every channel from this client.
+        self.query_cache = QueryCache() if query_cache is None else query_cache
+        # (agent ID, channel name): channel ID, so publishing by name can invalidate the channel's cache entries.
+        self._channel_ids: dict[tuple[str, str], str] = {}
+
         if not ((username and password) or token):
             raise RuntimeError("Must have username and password or access token set.")
         elif token:
             self.update_headers()
 
+    def _new_session(self) -> requests.Session:
+        session = self._session_factory()
+        if isinstance(session, requests.Session):
+            adapter = requests.adapters.HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        session.verify = self.verify
+        return session
+
+    @property
+    def session(self) -> requests.Session:
+        if self._shared_session is not None:
+            return self._shared_session
+        try:
+            return self._local.session
+        except AttributeError:
+            session = self._local.session = self._new_session()
+            return session
+
+    @session.setter
+    def session(self, session: requests.Session):
+        # kept for backwards compatibility: an assigned session is used by every thread, as it was before
+        # sessions became per-thread. `session_factory` is the thread-safe way to customise sessions.
+        warnings.warn(
+            "Assigning Client.session is deprecated, pass session_factory instead.", DeprecationWarning, stacklevel=2
+        )
+        self._shared_session = session
+        if session is not None:
+            session.headers.update(self._auth_headers)
+
     def update_headers(self):
-        self.session.headers.update({"Authorization": f"Token {self.access_token.token}"})
-        self.session.verify = self.verify
+        # auth headers are sent with each request rather than stored on a (per-thread) session.
+        self._auth_headers = {"Authorization": f"Token {self.access_token.token}"}
+        if self._shared_session is not None:
+            self._shared_session.headers.update(self._auth_headers)
 
-    def request(self, route: Route, **kwargs):
+    def _token_expired(self) -> bool:
         # default is access token to not expire
-        if self.access_token.expires_at and self.access_token.expires_at < datetime.utcnow():
-            logging.info("Token expired, attempting to refresh token.")
-            self.login()
+        return bool(self.access_token.expires_at and self.access_token.expires_at < datetime.utcnow())
+
+    def _ensure_token(self):
+        if not self._token_expired():
+            return
+
+        # the background refresh didn't get to it (or isn't running), so refresh inline.
+        # single-flight: one thread logs in while the others wait, then they all see the new token.
+        with self._token_lock:
+            if self._token_expired():
+                logging.info("Token expired, attempting to refresh token.")
+                start = time.perf_counter()
+                self._login()
+                self.metrics.incr("inline_token_refreshes")
+                self.metrics.incr("inline_token_refresh_seconds", time.perf_counter() - start)
+
+    def request(self, route: Route, **kwargs):
+        self._ensure_token()
 
         url = self.base_url + route.url
+        kwargs["headers"] = {**self._auth_headers, **(kwargs.get("headers") or {})}
 
-        attempt_counter = 0
-        retries = self.request_retries if route.method == "GET" else 0
+        body = kwargs.pop("json", None)
+        if body is not None:
+            # encode once here (rather than letting requests use stdlib json), which also covers any retries.
+            kwargs["data"] = codec.dumps(body)
+            kwargs["headers"].setdefault("Content-Type", "application/json")
 
-        while attempt_counter <= retries:
-            attempt_counter += 1
+        uncompressed = None
+        data = kwargs.get("data")
+        if (
+            self.compression and not self._compression_rejected
+            and isinstance(data, (bytes, str)) and len(data) >= self.compression_threshold
+        ):
+            uncompressed = data.encode("utf-8") if isinstance(data, str) else data
+            kwargs["data"] = self._compress(uncompressed)
+            kwargs["headers"]["Content-Encoding"] = self.compression
+
+        breaker = self._get_circuit_breaker(url)
+        policy = self.retry_policy
 
-            log.debug(f"Making {route.method} request to {url} with kwargs {kwargs}")
-            resp = self.session.request(route.method, url, timeout=self.request_timeout, **kwargs)
-
-            if resp.status_code == 200:
-                ## if we get a 200, we're good to go
-                break
-            elif resp.status_code == 403:
-                raise Forbidden("Access denied.")
-            elif resp.status_code == 404:
-                raise NotFound("Resource not found.")
-            elif resp.status_code != 200:
-                log.info(f"Failed to make request to {url}. Status code: {resp.status_code}, message: {resp.text}")
-                if attempt_counter > retries:
-                    raise HTTPException(resp.text)
+        # POSTs are only safe to retry if the server can de-duplicate them.
+        can_retry = route.method == "GET" or IDEMPOTENCY_HEADER in kwargs["headers"]
+
+        route_name = f"{route.method} {route.template}"
+
+        attempt_counter = 0
+        while True:
+            attempt_counter += 1
+            breaker.before_request()
+
+            # anything not recorded below (eg. a codec error) mustn't leave a half-open circuit waiting on this trial.
+            try:
+                log.debug("Making %s request to %s with kwargs %s", route.method, url, kwargs)
+                self._run_hooks("before_request", route, kwargs)
+                self.metrics.incr("requests")
+                self.metrics.incr("request_bytes", _body_size(kwargs.get("data")))
+
+                start = time.perf_counter()
+                try:
+                    resp = self.session.request(route.method, url, timeout=self.request_timeout, **kwargs)
+                except (requests.ConnectionError, requests.Timeout, ConnectionError, TimeoutError) as e:
+                    self._run_hooks("request_error", route, e, time.perf_counter() - start)
+                    self.metrics.incr("transport_errors")
+                    breaker.record_failure()
+                    if not (can_retry and policy.can_retry(attempt_counter)):
+                        raise
+                    log.info("Failed to make request to %s: %s", url, e)
+                    self._sleep_before_retry(policy.get_backoff(attempt_counter))
+                    continue
+
+                elapsed = time.perf_counter() - start
+                self.metrics.observe(route_name, elapsed)
+                self.metrics.incr("response_bytes", _response_size(resp))
+                self._run_hooks("after_request", route, resp, elapsed)
+
+                if resp.status_code == 200:
+                    ## if we get a 200, we're good to go
+                    breaker.record_success()
+                    break
+                elif resp.status_code == 403:
+                    breaker.record_success()
+                    raise Forbidden("Access denied.")
+                elif resp.status_code == 404:
+                    breaker.record_success()
+                    raise NotFound("Resource not found.")
+                elif resp.status_code == 415 and uncompressed is not None:
+                    # the server doesn't accept compressed bodies; resend this one as-is and stop compressing.
+                    log.warning("%s rejected a %s compressed body, disabling request compression.", url, self.compression)
+                    breaker.record_success()
+                    self.metrics.incr("compression_rejected")
+                    self._compression_rejected = True
+                    kwargs["data"] = uncompressed
+                    del kwargs["headers"]["Content-Encoding"]
+                    uncompressed = None
+                    continue
+
+                log.info("Failed to make request to %s. Status code: %s, message: %s", url, resp.status_code, _log_body(resp))
+                retryable = policy.is_retryable_status(resp.status_code)
+                if retryable:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+
+                if not (retryable and can_retry and policy.can_retry(attempt_counter)):
+                    self.metrics.incr("failures")
+                    raise HTTPException(resp.text, status_code=resp.status_code)
+
+                self._sleep_before_retry(policy.get_backoff(attempt_counter, resp.headers.get("Retry-After")))
+            except BaseException:
+                breaker.release_trial()
+                raise
 
         try:
-            data = resp.json()
+            data = codec.loads(resp.content)
         except ValueError:
             data = resp.text
 
-        log.debug(f"{url} has received {data}")
+        log.debug("%s has received %s", url, data)
         return data
 
+    def add_hook(self, event: str, hook: Callable):
+        """Add a hook that's called for every request attempt.
+
+        - ``before_request(route, kwargs)`` before sending; ``kwargs`` (including ``headers``) can be modified.
+        - ``after_request(route, response, elapsed)`` when a response is received, whatever its status.
+        - ``request_error(route, exception, elapsed)`` when the request couldn't be sent or timed out.
+        """
+        if event not in self._hooks:
+            raise ValueError(f"Unknown hook {event}, must be one of {', '.join(REQUEST_HOOKS)}")
+        self._hooks[event].append(hook)
+
+    def remove_hook(self, event: str, hook: Callable):
+        self._hooks[event].remove(hook)
+
+    def _run_hooks(self, event: str, *args):
+        for hook in self._hooks[event]:
+            try:
+                hook(*args)
+            except Exception as e:
+                log.error("Request hook %s failed: %s", hook, e, exc_info=e)
+
+    def stats(self) -> dict[str, Any]:
+        """A snapshot of request counters, per-route latencies and circuit breaker state."""
+        return {
+            "counters": self.metrics.snapshot(),
+            "routes": self.metrics.latency_snapshot(),
+            "query_cache": self.query_cache.stats(),
+            "circuit_breakers": {
+                host: {
+                    "state": b.state.value,
+                    "times_opened": b.times_opened,
+                    "rejected": b.rejected,
+                    "open_seconds": b.open_seconds,
+                }
+                for host, b in list(self._circuit_breakers.items())
+            },
+        }
+
+    def _compress(self, data: bytes) -> bytes:
+        start = time.thread_time()
+        compressed = compress(data, self.compression, self.compression_level)
+        self.metrics.incr("compressed_requests")
+        self.metrics.incr("compression_bytes_in", len(data))
+        self.metrics.incr("compression_bytes_out", len(compressed))
+        self.metrics.incr("compression_cpu_seconds", time.thread_time() - start)
+        return compressed
+
+    @property
+    def compression_ratio(self) -> Optional[float]:
+        """Uncompressed / compressed size, across all compressed request bodies so far."""
+        compressed = self.metrics["compression_bytes_out"]
+        return compressed and self.metrics["compression_bytes_in"] / compressed or None
+
+    def _sleep_before_retry(self, delay: float):
+        self.metrics.incr("retries")
+        self.metrics.incr("retry_sleep_seconds", delay)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _get_circuit_breaker(self, url: str) -> CircuitBreaker:
+        host = urlsplit(url).netloc
+        try:
+            return self._circuit_breakers[host]
+        except KeyError:
+            pass
+
+        with self._breaker_lock:
+            try:
+                return self._circuit_breakers[host]
+            except KeyError:
+                breaker = self._circuit_breakers[host] = CircuitBreaker(host, **self._circuit_breaker_config)
+                return breaker
+
+    @property
+    def circuit_open_seconds(self) -> float:
+        """Total time spent with an open circuit, across all hosts."""
+        return sum(b.open_seconds for b in list(self._circuit_breakers.values()))
+
+    @property
+    def request_retries(self) -> int:
+        return self.retry_policy.total
+
+    @request_retries.setter
+    def request_retries(self, value: int):
+        self.retry_policy.total = value
+
     def _get_agent_raw(self, agent_id: str) -> dict[str, Any]:
         return self.request(Route("GET", "/ch/v1/agent/{}", agent_id))
 
@@ -111,15 +428,24 @@ class Client:
 
     def get_agent(self, agent_id: str) -> Optional[Agent]:
         data = self._get_agent_raw(agent_id)
-        return data and Agent(client=self, data=data)
+        agent = data and Agent(client=self, data=data)
+        if agent:
+            self._agents[agent.id] = agent
+        return agent
 
     def get_agent_list(self) -> list[Agent]:
         data = self._get_agent_list_raw()
         if not "agents" in data:
             return []
-        return [Agent(client=self, data=d) for d in data["agents"]]
+        agents = [Agent(client=self, data=d) for d in data["agents"]]
+        self._agents.update((a.id, a) for a in agents)
+        return agents
 
     def _parse_channel(self, data) -> T:
+        agent_id = data.get("owner") or data.get("agent")
+        if agent_id is not None:
+            self._channel_ids[(agent_id, data["name"])] = data["channel"]
+
         if data["name"].startswith("!"):
             return Task(client=self, data=data)
         elif data["name"].startswith("#"):
@@ -138,9 +464,59 @@ class Client:
         return self.request(Route("GET", "/ch/v1/agent/{}/{}", agent_id, channel_name))
 
     def get_channel_named(self, channel_name: str, agent_id: str) -> Optional[T]:
+        # an agent we've already fetched knows its channels' IDs, so there's no need to look the name up.
+        # a fresh channel is returned each time, which loads its aggregate (if used) on first access.
+        agent = self._agents.get(agent_id)
+        channel = agent and agent.get_channel(channel_name)
+        if channel:
+            return self._parse_channel({"channel": channel.id, "name": channel.name, "agent": channel.agent_id})
+
         data = self._get_channel_named_raw(channel_name, agent_id)
         return data and self._parse_channel(data)
 
+    def _get_executor(self, max_workers: int) -> ThreadPoolExecutor:
+        # kept between calls so worker threads (and their sessions' connections) stay warm.
+        with self._executor_lock:
+            try:
+                return self._executors[max_workers]
+            except KeyError:
+                executor = self._executors[max_workers] = ThreadPoolExecutor(
+                    max_workers=max_workers, thread_name_prefix=f"doover-client-{max_workers}"
+                )
+                return executor
+
+    def fetch_aggregates(
+        self, agent_ids: list[str], channel_name: str, concurrency: Optional[int] = None
+    ) -> FleetAggregates:
+        """Fetch the aggregate of ``channel_name`` for many agents concurrently.
+
+        At most ``concurrency`` requests are in flight at once; by default one per agent, up to
+        ``MAX_FETCH_CONCURRENCY``. Agents that fail (eg. the channel doesn't exist) are returned in ``errors``
+        rather than failing the whole call.
+        """
+        if not agent_ids:
+            return FleetAggregates({}, {})
+
+        def fetch(agent_id):
+            data = self._get_channel_named_raw(channel_name, agent_id)
+            return data and (data.get("aggregate") or {}).get("payload")
+
+        # the default pool's threads are only started as they're needed, so a small fleet doesn't start them all.
+        executor = self._get_executor(MAX_FETCH_CONCURRENCY if concurrency is None else max(1, concurrency))
+        futures = {executor.submit(fetch, agent_id): agent_id for agent_id in agent_ids}
+
+        results, errors = {}, {}
+        for future in as_completed(futures):
+            agent_id = futures[future]
+            try:
+                results[agent_id] = future.result()
+            except Exception as e:
+                errors[agent_id] = e
+
+        # keep the order the agents were asked for
+        aggregates = {agent_id: results[agent_id] for agent_id in agent_ids if agent_id in results}
+        return FleetAggregates(aggregates, errors)
+
     def get_channel_messages(self, channel_id: str, num_messages: Optional[int] = None) -> list[Message]:
         if num_messages:
             data = self.request(Route("GET", "/ch/v1/channel/{}/messages/{}", channel_id, str(num_messages)))
@@ -152,6 +528,123 @@ class Client:
 
         return [Message(client=self, data=m, channel_id=channel_id) for m in data["messages"]]
 
+    def iter_channel_messages(
+        self,
+        channel_id: str,
+        since: Union[datetime, float] = None,
+        until: Union[datetime, float] = None,
+        page_size: int = 100,
+    ) -> Iterator[Message]:
+        """Iterate over a channel's messages, newest first, fetching ``page_size`` messages at a time.
+
+        Only one page (and the IDs of messages sharing the oldest timestamp so far) is held in memory at once, so
+        this can be used to scan long histories. If more than a page of messages share one timestamp, the page
+        size is doubled (up to ``MAX_PAGE_SIZE``, then a `RuntimeError` is raised) until paging gets past them.
+        Paging stops with a warning if the server stops returning older messages.
+
+        Parameters
+        ----------
+        since: datetime or float
+            Only messages at or after this time (inclusive).
+        until: datetime or float
+            Only messages before this time (exclusive).
+        page_size: int
+            Number of messages to request per page.
+        """
+        for data in self._iter_channel_messages_raw(channel_id, since, until, page_size):
+            yield Message(client=self, data=data, channel_id=channel_id)
+
+    def fetch_message_batch(
+        self,
+        channel_id: str,
+        since: Union[datetime, float] = None,
+        until: Union[datetime, float] = None,
+        page_size: int = 100,
+        max_age: Optional[float] = None,
+    ) -> MessageBatch:
+        """Fetch a channel's messages in a time window into a columnar `MessageBatch`, newest first.
+
+        This doesn't build a `Message` per message, and payloads are only decoded when accessed.
+        Closed windows (with ``until`` set) are kept in the query cache, and served from it if they're at most
+        ``max_age`` seconds old.
+        """
+        key = None
+        if until is not None:
+            key = ("window", channel_id, _to_timestamp(since), _to_timestamp(until))
+            data = self.query_cache.get(key, max_age)
+            if data is not MISSING:
+                return MessageBatch.from_data(self, channel_id, data)
+
+        data = list(self._iter_channel_messages_raw(channel_id, since, until, page_size))
+        if key is not None:
+            self.query_cache.set(key, data)
+        return MessageBatch.from_data(self, channel_id, data)
+
+    def _iter_channel_messages_raw(self, channel_id, since, until, page_size) -> Iterator[dict[str, Any]]:
+        since, until = _to_timestamp(since), _to_timestamp(until)
+        upper = until
+        # the oldest timestamp yielded so far, and the IDs yielded at it. The next page re-fetches messages sharing
+        # that timestamp, so only those need remembering.
+        boundary = None
+        boundary_ids = set()
+        fetch_size = page_size
+
+        while True:
+            query = {}
+            if since is not None:
+                query["since"] = since
+            if upper is not None:
+                query["until"] = upper
+            data = self.request(Route("GET", "/ch/v1/channel/{}/messages/{}", channel_id, str(fetch_size), **query))
+            page = data and data.get("messages") or []
+
+            new = outside = 0
+            for m in page:
+                timestamp = m.get("timestamp")
+                # don't rely on the server honouring the window.
+                if upper is not None and timestamp is not None and timestamp >= upper:
+                    outside += 1
+                    continue
+                if since is not None and timestamp is not None and timestamp < since:
+                    return
+                if timestamp is not None and timestamp == boundary and m.get("message") in boundary_ids:
+                    continue
+
+                if timestamp is not None and (boundary is None or timestamp < boundary):
+                    boundary = timestamp
+                    boundary_ids = set()
+                if timestamp == boundary:
+                    boundary_ids.add(m.get("message"))
+                new += 1
+                yield m
+
+            if len(page) < fetch_size:
+                return
+            if boundary is None:
+                log.warning("Stopped paging messages for %s; the server returned no timestamps.", channel_id)
+                return
+
+            # until is exclusive; step just past the oldest timestamp so messages sharing it aren't skipped.
+            next_upper = math.nextafter(boundary, math.inf)
+            if next_upper != upper:
+                upper = next_upper
+                fetch_size = page_size
+                continue
+
+            if new == 0 and outside:
+                # eg. a server that ignores since / until would return the same page forever.
+                log.warning("Stopped paging messages for %s; the server returned no new messages.", channel_id)
+                return
+
+            # the whole page shares the oldest timestamp, so there may be more of them than fit in a page.
+            # there's no offset to page within a timestamp, so ask for a bigger page instead.
+            if fetch_size >= MAX_PAGE_SIZE:
+                raise RuntimeError(
+                    f"More than {fetch_size} messages in {channel_id} share the timestamp {boundary}, "
+                    f"unable to page past them."
+                )
+            fetch_size = min(fetch_size * 2, MAX_PAGE_SIZE)
+
     def _get_message_raw(self, channel_id: str, message_id: str) -> dict[str, Any]:
         return self.request(Route("GET", "/ch/v1/channel/{}/message/{}", channel_id, message_id))
 
@@ -192,8 +685,8 @@ class Client:
     def unsubscribe_from_channel(self, channel_id: str, task_id: str) -> bool:
         return self._maybe_subscribe_to_channel(channel_id, task_id, False)
 
-    def publish_to_channel(self, channel_id: str, data: Any, save_log: bool = True, log_aggregate: bool = False, override_aggregate: bool = False, timestamp: Optional[datetime] = None):
-        # basically we're assuming there's only 2 types of data - dict or string...
+    @staticmethod
+    def _build_post_data(data: Any, save_log: bool, log_aggregate: bool, override_aggregate: bool, timestamp: Optional[datetime]) -> dict[str, Any]:
         post_data = {"msg": data}
         if save_log:
             post_data["record_log"] = save_log
@@ -203,27 +696,73 @@ class Client:
             post_data["override_aggregate"] = True
         if timestamp:
             post_data["timestamp"] = int(timestamp.timestamp())
-
-        if isinstance(post_data, dict):
-            return self.request(Route("POST", "/ch/v1/channel/{}/", channel_id), json=post_data)
-        else:
-            return self.request(Route("POST", "/ch/v1/channel/{}/", channel_id), data=str(post_data))
-
-    def publish_to_channel_name(self, agent_id: str, channel_name: str, data: Any, save_log: bool = True, log_aggregate: bool = False, override_aggregate: bool = False, timestamp: Optional[datetime] = None):
-        post_data = {"msg": data}
-        if save_log:
-            post_data["record_log"] = save_log
-        if log_aggregate:
-            post_data["log_aggregate"] = True
-        if override_aggregate:
-            post_data["override_aggregate"] = True
-        if timestamp:
-            post_data["timestamp"] = int(timestamp.timestamp())
-        
+        return post_data
+
+    @staticmethod
+    def _is_transient_error(exception: Exception) -> bool:
+        """Whether a request failed because the API was unreachable or unhealthy, rather than rejecting it."""
+        if isinstance(exception, (requests.ConnectionError, requests.Timeout, ConnectionError, TimeoutError)):
+            return True
+        if isinstance(exception, HTTPException):
+            return exception.status_code is None or exception.status_code >= 500 or exception.status_code == 429
+        return False
+
+    def _send_publish(self, url: str, post_data: dict[str, Any], idempotency_key: str, template: Optional[str] = None):
+        route = Route("POST", url)
+        # group metrics by the original route rather than the channel-specific URL.
+        route.template = template or url
+
+        # the same key is sent on every retry, so the server only applies the publish once.
+        headers = {IDEMPOTENCY_HEADER: idempotency_key}
+        # basically we're assuming there's only 2 types of data - dict or string...
         if isinstance(post_data, dict):
-            return self.request(Route("POST", "/ch/v1/agent/{}/{}/", agent_id, channel_name), json=post_data)
+            return self.request(route, json=post_data, headers=headers)
         else:
-            return self.request(Route("POST", "/ch/v1/agent/{}/{}/", agent_id, channel_name), data=str(post_data))
+            return self.request(route, data=str(post_data), headers=headers)
+
+    def _publish(self, route: Route, post_data: dict[str, Any], idempotency_key: Optional[str] = None):
+        idempotency_key = idempotency_key or str(uuid.uuid4())
+        if self.outbox is None:
+            return self._send_publish(route.url, post_data, idempotency_key, route.template)
+
+        # keep the original time, in case this sits in the outbox for a while.
+        post_data.setdefault("timestamp", int(time.time()))
+
+        if len(self.outbox) == 0:
+            try:
+                return self._send_publish(route.url, post_data, idempotency_key, route.template)
+            except Exception as e:
+                if not self._is_transient_error(e):
+                    raise
+                log.warning(f"Failed to publish to {route.url}, queueing in outbox: {e}")
+                self.outbox.put(route.url, post_data, idempotency_key)
+                self.outbox.start(self)
+                self.outbox.wake()
+                return None
+
+        # there's a backlog, so queue behind it to keep messages in order. Sending the backlog can take a while
+        # (it's rate limited, and retried), so leave that to the background flusher rather than holding up this call.
+        self.outbox.put(route.url, post_data, idempotency_key)
+        self.outbox.start(self)
+        self.outbox.wake()
+        return None
+
+    def publish_to_channel(self, channel_id: str, data: Any, save_log: bool = True, log_aggregate: bool = False, override_aggregate: bool = False, timestamp: Optional[datetime] = None, idempotency_key: Optional[str] = None):
+        post_data = self._build_post_data(data, save_log, log_aggregate, override_aggregate, timestamp)
+        self.query_cache.invalidate(channel_id)
+        return self._publish(Route("POST", "/ch/v1/channel/{}/", channel_id), post_data, idempotency_key)
+
+    def publish_to_channel_name(self, agent_id: str, channel_name: str, data: Any, save_log: bool = True, log_aggregate: bool = False, override_aggregate: bool = False, timestamp: Optional[datetime] = None, idempotency_key: Optional[str] = None):
+        post_data = self._build_post_data(data, save_log, log_aggregate, override_aggregate, timestamp)
+        channel_id = self._channel_ids.get((agent_id, channel_name))
+        if channel_id is not None:
+            self.query_cache.invalidate(channel_id)
+        return self._publish(Route("POST", "/ch/v1/agent/{}/{}/", agent_id, channel_name), post_data, idempotency_key)
+
+    def flush_outbox(self, max_chunks: Optional[int] = None) -> int:
+        if self.outbox is None:
+            return 0
+        return self.outbox.flush(self, max_chunks=max_chunks)
 
     def create_tunnel_endpoints(self, agent_id: str, endpoint_type: str, amount: int):
         to_return = []
@@ -237,11 +776,67 @@ class Client:
         return self.request(Route("GET", "/ch/v1/agent/{}/ngrok_tunnels/{}", agent_id, endpoint_type))
 
     def login(self):
+        with self._token_lock:
+            return self._login()
+
+    @property
+    def is_refreshing_in_background(self) -> bool:
+        return self._refresher is not None and self._refresher.is_alive()
+
+    def _schedule_token_refresh(self, lifetime: float):
+        if not self.token_refresh_fraction or not (self.username and self.password):
+            return
+
+        self._refresh_due = time.monotonic() + lifetime * self.token_refresh_fraction
+        if self.is_refreshing_in_background:
+            self._refresh_wakeup.set()
+            return
+
+        self._refresh_stop.clear()
+        self._refresher = threading.Thread(target=self._run_token_refresher, name="doover-token-refresh", daemon=True)
+        self._refresher.start()
+
+    def _run_token_refresher(self):
+        while not self._refresh_stop.is_set():
+            delay = self._refresh_due - time.monotonic()
+            if delay > 0:
+                # woken early if the token is refreshed inline (rescheduling us) or we're stopped.
+                self._refresh_wakeup.wait(delay)
+                self._refresh_wakeup.clear()
+                continue
+
+            self._refresh_token()
+
+    def _refresh_token(self):
+        start = time.perf_counter()
+        try:
+            with self._token_lock:
+                # a background thread can't prompt for a 2FA code
+                self._login(interactive=False)
+        except Exception as e:
+            self.metrics.incr("token_refresh_failures")
+            log.warning(f"Failed to refresh token in the background, retrying in {TOKEN_REFRESH_RETRY_INTERVAL}s: {e}")
+            self._refresh_due = time.monotonic() + TOKEN_REFRESH_RETRY_INTERVAL
+            return
+
+        elapsed = time.perf_counter() - start
+        self.metrics.incr("token_refreshes")
+        self.metrics.incr("token_refresh_seconds", elapsed)
+        self.metrics.set("last_token_refresh_seconds", elapsed)
+
+    def stop_token_refresh(self):
+        self._refresh_stop.set()
+        self._refresh_wakeup.set()
+        if self._refresher is not None:
+            self._refresher.join()
+            self._refresher = None
+
+    def _login(self, interactive: bool = True):
         if not (self.username or self.password):
             raise RuntimeError("Must have username and password set since access token has expired.")
 
         logging.info("Logging in...")
-        session = requests.Session()
+        session = self._new_session()
 
         login_url = f"{self.base_url}/accounts/login/"
 
@@ -256,6 +851,9 @@ class Client:
 
         # bit of a hack... don't know a better way? Two-Factor is the title on the page...
         if "Two-Factor" in res.text:
+            if not interactive:
+                raise RuntimeError("Account has 2FA enabled, can't log in non-interactively.")
+
             print("Your account has 2FA enabled. It is recommended to instead use `doover configure_token` "
                   "and use a long-lived token, otherwise you will have to 2FA authenticate every 20min.\n"
                   "Quit and run that command, or supply your 2FA code to authenticate now.\n")
@@ -274,7 +872,7 @@ class Client:
 
         try:
             data = res.json()
-        except requests.exceptions.JSONDecodeError:
+        except ValueError:
             raise RuntimeError("Failed to get temporary token. Login failed.")
 
         # FIXME: can these expire in UTC?
@@ -284,6 +882,7 @@ class Client:
         self.access_token = AccessToken(token=data["token"], expires_at=expires_at)
         self.agent_id = data["agent_id"]
         self.update_headers()
+        self._schedule_token_refresh(difference.total_seconds())
 
         logging.info(f"Successfully logged in and set token to expire in {int(difference.total_seconds()/60)}min...")
         try:
@@ -0,0 +1,33 @@
+import gzip
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def available_encodings() -> tuple[str, ...]:
+    if zstandard is None:
+        return ("gzip", )
+    return ("gzip", "zstd")
+
+
+def compress(data: bytes, encoding: str, level: int = None) -> bytes:
+    if encoding == "gzip":
+        # level 6 is a good trade-off for JSON (and base64 text); 9 is much slower for a few % smaller.
+        return gzip.compress(data, compresslevel=6 if level is None else level, mtime=0)
+    elif encoding == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd compression requires the `zstandard` package.")
+        return zstandard.ZstdCompressor(level=3 if level is None else level).compress(data)
+    raise ValueError(f"Unknown content encoding: {encoding}")
+
+
+def decompress(data: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        return gzip.decompress(data)
+    elif encoding == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd decompression requires the `zstandard` package.")
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"Unknown content encoding: {encoding}")
@@ -3,7 +3,9 @@ class DooverException(Exception):
 
 
 class HTTPException(DooverException):
-    pass
+    def __init__(self, message: str = "", status_code: int = None):
+        super().__init__(message)
+        self.status_code = status_code
 
 
 class NotFound(DooverException):
@@ -12,3 +14,7 @@ class NotFound(DooverException):
 
 class Forbidden(DooverException):
     pass
+
+
+class CircuitOpen(HTTPException):
+    pass
@@ -0,0 +1,866 @@
+"""
+An in-memory stand-in for the Doover channels API.
+
+This implements the `/ch/v1` routes used by `Client` (agents, named channels, messages, aggregates, subscriptions
+and task dispatch) so processors, `UIManager` and the CLI can be exercised and benchmarked offline.
+
+It can be used in-process, by passing ``broker.session`` as a `Client` session factory (or using
+``broker.client()``), or over HTTP with ``broker.serve()``.
+"""
+
+import bisect
+import copy
+import http.server
+import json
+import logging
+import random
+import re
+import threading
+import time
+import uuid
+
+from collections import Counter, OrderedDict, deque
+from http.cookies import SimpleCookie
+from typing import Any, Callable, Optional, Union
+from urllib.parse import urlsplit, parse_qsl, unquote, urlencode
+
+from .compression import available_encodings, compress, decompress
+
+
+log = logging.getLogger(__name__)
+
+
+def merge_aggregate(current: Any, update: Any) -> Any:
+    """Merge an update into an aggregate the same way Doover does.
+
+    Dicts are merged recursively, with ``None`` values removing a key. Anything else replaces the aggregate.
+    ``current`` is modified in place where possible.
+    """
+    if not (isinstance(current, dict) and isinstance(update, dict)):
+        return copy.deepcopy(update)
+
+    for key, value in update.items():
+        if value is None:
+            current.pop(key, None)
+        elif isinstance(value, dict) and isinstance(current.get(key), dict):
+            current[key] = merge_aggregate(current[key], value)
+        else:
+            current[key] = copy.deepcopy(value)
+    return current
+
+
+class LocalResponse:
+    def __init__(self, status_code: int, content: bytes = b"", headers: dict[str, str] = None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8")
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class LocalSession:
+    """A minimal `requests.Session` look-alike that sends requests straight to a `LocalBroker`."""
+
+    def __init__(self, broker: "LocalBroker"):
+        self.broker = broker
+        self.headers = {}
+        self.cookies = {}
+        self.verify = True
+
+    def request(self, method: str, url: str, timeout: float = None, json: Any = None, data: Any = None,
+                headers: dict[str, str] = None, **kwargs) -> LocalResponse:
+        req_headers = {**self.headers, **(headers or {})}
+        if self.cookies:
+            req_headers["Cookie"] = "; ".join(f"{k}={v}" for k, v in self.cookies.items())
+
+        if json is not None:
+            body = _dumps(json)
+            req_headers.setdefault("Content-Type", "application/json")
+        elif isinstance(data, dict):
+            body = urlencode(data).encode()
+            req_headers.setdefault("Content-Type", "application/x-www-form-urlencoded")
+        elif isinstance(data, str):
+            body = data.encode()
+        else:
+            body = data or b""
+
+        status, resp_headers, content = self.broker.handle(method, url, req_headers, body)
+
+        cookie = resp_headers.get("Set-Cookie")
+        if cookie:
+            parsed = SimpleCookie(cookie)
+            self.cookies.update({k: v.value for k, v in parsed.items()})
+
+        return LocalResponse(status, content, resp_headers)
+
+    def get(self, url: str, **kwargs) -> LocalResponse:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> LocalResponse:
+        return self.request("POST", url, **kwargs)
+
+    def mount(self, prefix, adapter):
+        pass
+
+    def close(self):
+        pass
+
+
+class _Channel:
+    def __init__(self, channel_id: str, name: str, agent_id: str):
+        self.id = channel_id
+        self.name = name
+        self.agent_id = agent_id
+        self.aggregate = None
+        self.aggregate_timestamp = None
+        self.processor_id = None
+        # ids of task channels subscribed to this channel
+        self.subscribers = set()
+        # oldest first, by timestamp (a message published late with an older timestamp is inserted, not appended)
+        self.messages = []
+
+    def to_dict(self) -> dict[str, Any]:
+        res = {
+            "channel": self.id,
+            "name": self.name,
+            "type": "base",
+            "owner": self.agent_id,
+            "agent": self.agent_id,
+            "aggregate": {"payload": self.aggregate, "timestamp": self.aggregate_timestamp},
+        }
+        if self.processor_id is not None:
+            res["processor"] = self.processor_id
+        return res
+
+
+class _Route:
+    def __init__(self, method: str, pattern: str, handler: Callable):
+        self.method = method
+        self.pattern = pattern
+        self.regex = re.compile("^" + re.sub(r"{(\w+)}", r"(?P<\1>[^/]+)", pattern) + "$")
+        self.handler = handler
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str = ""):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class LocalBroker:
+    """In-memory Doover channels API.
+
+    Parameters
+    ----------
+    latency: float or (float, float)
+        Seconds of latency to add to every request, or a (min, max) range to pick from uniformly.
+    error_rate: float
+        Probability (0-1) that any request fails with ``error_status``.
+    error_status: int
+        Status code returned for injected errors.
+    seed: int
+        Seed for latency, error injection and generated IDs, so runs are reproducible.
+    auto_dispatch: bool
+        Invoke subscribed tasks as soon as a message is published. Otherwise call ``run_pending()``.
+    require_auth: bool
+        Reject requests that don't carry a token issued by this broker.
+    accept_compression: bool
+        Decompress request bodies sent with a ``Content-Encoding``. If False they're rejected with a 415.
+    idempotency_cache_size: int
+        Number of responses to idempotent publishes remembered for replaying to retries, most recent first.
+    """
+
+    base_url = "http://doover.local"
+
+    def __init__(
+        self,
+        latency: Union[float, tuple[float, float]] = 0,
+        error_rate: float = 0,
+        error_status: int = 502,
+        seed: int = None,
+        auto_dispatch: bool = True,
+        require_auth: bool = False,
+        accept_compression: bool = True,
+        idempotency_cache_size: int = 10000,
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.auto_dispatch = auto_dispatch
+        self.require_auth = require_auth
+        self.accept_compression = accept_compression
+
+        self._rng = random.Random(seed)
+        self._lock = threading.RLock()
+        self._local = threading.local()
+
+        self.agents: dict[str, dict[str, Any]] = {}
+        self.channels: dict[str, _Channel] = {}
+        self._channels_by_name: dict[tuple[str, str], _Channel] = {}
+        self._messages: dict[str, dict[str, Any]] = {}
+
+        self.users: dict[str, tuple[str, str]] = {}  # username: (password, agent_id)
+        self.tokens: dict[str, str] = {}  # token: agent_id
+        self.token_lifetime = 20 * 60
+        self._sessions: dict[str, str] = {}  # session id: username
+
+        self._processors: dict[str, Callable] = {}
+        self._aggregate_listeners: list[Callable[[str, str, Any], None]] = []
+        self._pending = deque()
+        self._forced_failures = deque()
+
+        self.idempotency_cache_size = idempotency_cache_size
+        self._idempotent_responses = OrderedDict()
+
+        self.calls = Counter()
+        self.request_count = 0
+        self.duplicates = 0
+        self.compressed_requests = 0
+
+        self._routes = [
+            _Route("GET", "/ch/v1/agent/{agent_id}", self._get_agent),
+            _Route("GET", "/ch/v1/list_agents/", self._list_agents),
+            _Route("GET", "/ch/v1/channel/{channel_id}", self._get_channel),
+            _Route("GET", "/ch/v1/agent/{agent_id}/{channel_name}", self._get_channel_named),
+            _Route("GET", "/ch/v1/channel/{channel_id}/messages", self._get_messages),
+            _Route("GET", "/ch/v1/channel/{channel_id}/messages/{num_messages}", self._get_messages),
+            _Route("GET", "/ch/v1/channel/{channel_id}/message/{message_id}", self._get_message),
+            _Route("POST", "/ch/v1/agent/{agent_id}/{channel_name}/", self._publish_named),
+            _Route("POST", "/ch/v1/channel/{channel_id}/", self._publish),
+            _Route("POST", "/ch/v1/channel/{channel_id}/subscribe/", self._subscribe),
+            _Route("GET", "/ch/v1/get_temp_token/", self._get_temp_token),
+            _Route("GET", "/accounts/login/", self._get_login),
+            _Route("POST", "/accounts/login/", self._post_login),
+        ]
+
+    # setup helpers
+
+    def _new_id(self) -> str:
+        return str(uuid.UUID(int=self._rng.getrandbits(128), version=4))
+
+    def add_agent(self, agent_id: str = None, name: str = None, type: str = "user",
+                  deployment_config: dict[str, Any] = None, owner_org: str = None) -> str:
+        with self._lock:
+            agent_id = agent_id or self._new_id()
+            self.agents[agent_id] = {
+                "agent": agent_id,
+                "name": name,
+                "type": type,
+                "owner_org": owner_org,
+                "settings": {"deployment_config": deployment_config or {}},
+            }
+            return agent_id
+
+    def add_user(self, username: str, password: str, agent_id: str):
+        self.users[username] = (password, agent_id)
+
+    def add_token(self, agent_id: str, token: str = None) -> str:
+        token = token or uuid.UUID(int=self._rng.getrandbits(128)).hex
+        self.tokens[token] = agent_id
+        return token
+
+    def add_channel(self, agent_id: str, name: str, aggregate: Any = None) -> str:
+        with self._lock:
+            channel = self._get_or_create_channel(agent_id, name)
+            if aggregate is not None:
+                self._update_aggregate(channel, aggregate, override=True)
+            return channel.id
+
+    def add_processor(self, agent_id: str, name: str, handler: Callable) -> str:
+        """Register a processor. ``handler`` is either a `ProcessorBase` subclass, or a callable which
+        accepts the same keyword arguments a processor is constructed with."""
+        channel_id = self.add_channel(agent_id, "#" + name.lstrip("#"))
+        self._processors[channel_id] = handler
+        return channel_id
+
+    def get_aggregate(self, agent_id: str, channel_name: str) -> Any:
+        with self._lock:
+            channel = self._channels_by_name.get((agent_id, channel_name))
+            return channel and copy.deepcopy(channel.aggregate)
+
+    def fail_next(self, count: int = 1, status: int = None, exception: Exception = None, retry_after: float = None):
+        """Fail the next ``count`` requests with ``status`` or by raising ``exception`` (eg. ``ConnectionError()``)."""
+        for _ in range(count):
+            self._forced_failures.append((status or self.error_status, exception, retry_after))
+
+    def reset_stats(self):
+        self.calls.clear()
+        self.request_count = 0
+
+    def session(self) -> LocalSession:
+        return LocalSession(self)
+
+    def client(self, agent_id: str = None, token: str = None, **kwargs):
+        from .client import Client
+
+        if agent_id is None:
+            agent_id = next(iter(self.agents), None) or self.add_agent()
+        if token is None:
+            token = self.add_token(agent_id)
+        return Client(token=token, base_url=self.base_url, agent_id=agent_id, session_factory=self.session, **kwargs)
+
+    # request handling
+
+    def handle(self, method: str, url: str, headers: dict[str, str], body: bytes) -> tuple[int, dict[str, str], bytes]:
+        parts = urlsplit(url)
+        path = parts.path
+        query = dict(parse_qsl(parts.query))
+
+        for route in self._routes:
+            if route.method != method:
+                continue
+            match = route.regex.match(path)
+            if match:
+                break
+        else:
+            route, match = None, None
+
+        with self._lock:
+            self.request_count += 1
+            self.calls[f"{method} {route.pattern if route else path}"] += 1
+            latency = self._pick_latency()
+            forced = self._forced_failures.popleft() if self._forced_failures else None
+            failed = forced is None and self.error_rate and self._rng.random() < self.error_rate
+
+        if latency:
+            time.sleep(latency)
+
+        if forced is not None:
+            status, exception, retry_after = forced
+            if exception is not None:
+                # remembered so `serve` can tell an injected transport error from a bug in the broker.
+                self._local.injected = exception
+                raise exception
+            return status, retry_after is not None and {"Retry-After": str(retry_after)} or {}, b"Injected failure."
+        if failed:
+            return self.error_status, {}, b"Injected failure."
+
+        if route is None:
+            return 404, {}, b"Not found."
+
+        encoding = headers.get("Content-Encoding")
+        if encoding:
+            if not self.accept_compression or encoding not in available_encodings():
+                return 415, {}, f"Unsupported content encoding {encoding}.".encode()
+            try:
+                body = decompress(body, encoding)
+            except Exception:
+                return 400, {}, b"Failed to decode request body."
+            with self._lock:
+                self.compressed_requests += 1
+
+        request = {
+            "headers": headers,
+            "query": query,
+            "cookies": {k: v.value for k, v in SimpleCookie(headers.get("Cookie", "")).items()},
+            "body": body,
+        }
+
+        # publishes carry an idempotency key so retries are only applied once.
+        idempotency_key = method == "POST" and headers.get("Idempotency-Key")
+        if idempotency_key:
+            with self._lock:
+                cached = self._idempotent_responses.get(idempotency_key)
+                if cached is not None:
+                    self.duplicates += 1
+            if cached is not None:
+                return cached
+
+        try:
+            if self.require_auth and not route.pattern.startswith("/accounts") and route.handler != self._get_temp_token:
+                self._check_auth(headers)
+            kwargs = {k: unquote(v) for k, v in match.groupdict().items()}
+            result = route.handler(request, **kwargs)
+        except HTTPError as e:
+            return e.status, {}, e.message.encode()
+
+        resp_headers = {}
+        if isinstance(result, tuple):
+            result, resp_headers = result
+
+        if self.auto_dispatch and self._pending:
+            self.run_pending()
+
+        if isinstance(result, str):
+            response = 200, resp_headers, result.encode()
+        else:
+            response = 200, {"Content-Type": "application/json", **resp_headers}, _dumps(result)
+
+        if idempotency_key:
+            with self._lock:
+                self._idempotent_responses[idempotency_key] = response
+                while len(self._idempotent_responses) > self.idempotency_cache_size:
+                    self._idempotent_responses.popitem(last=False)
+        return response
+
+    def _pick_latency(self) -> float:
+        if isinstance(self.latency, (tuple, list)):
+            return self._rng.uniform(*self.latency)
+        return self.latency
+
+    def _check_auth(self, headers: dict[str, str]):
+        auth = headers.get("Authorization", "")
+        if not auth.startswith("Token ") or auth[6:] not in self.tokens:
+            raise HTTPError(403, "Invalid token.")
+
+    @staticmethod
+    def _parse_body(request) -> dict[str, Any]:
+        body = request["body"]
+        if not body:
+            return {}
+        try:
+            return json.loads(body)
+        except ValueError:
+            return dict(parse_qsl(body.decode()))
+
+    def _agent_dict(self, agent_id: str) -> dict[str, Any]:
+        try:
+            data = dict(self.agents[agent_id])
+        except KeyError:
+            raise HTTPError(404, "Agent not found.")
+
+        data["current_time"] = time.time()
+        data["channels"] = [
+            {"channel": c.id, "name": c.name, "type": "base", "agent": c.agent_id}
+            for c in self.channels.values() if c.agent_id == agent_id
+        ]
+        return data
+
+    def _get_agent(self, request, agent_id):
+        with self._lock:
+            return self._agent_dict(agent_id)
+
+    def _list_agents(self, request):
+        with self._lock:
+            return {"agents": [self._agent_dict(a) for a in self.agents]}
+
+    def _get_channel_obj(self, channel_id) -> _Channel:
+        try:
+            return self.channels[channel_id]
+        except KeyError:
+            raise HTTPError(404, "Channel not found.")
+
+    def _get_channel(self, request, channel_id):
+        with self._lock:
+            return self._get_channel_obj(channel_id).to_dict()
+
+    def _get_channel_named(self, request, agent_id, channel_name):
+        with self._lock:
+            try:
+                return self._channels_by_name[(agent_id, channel_name)].to_dict()
+            except KeyError:
+                raise HTTPError(404, "Channel not found.")
+
+    def _get_messages(self, request, channel_id, num_messages=10):
+        with self._lock:
+            channel = self._get_channel_obj(channel_id)
+            since = float(request["query"].get("since", 0) or 0)
+            until = request["query"].get("until")
+            until = float(until) if until else None
+
+            result = []
+            # newest first
+            for message in reversed(channel.messages):
+                if until is not None and message["timestamp"] >= until:
+                    continue
+                if message["timestamp"] < since:
+                    break
+                result.append(message)
+                if len(result) >= int(num_messages):
+                    break
+
+            return {"messages": result}
+
+    def _get_message(self, request, channel_id, message_id):
+        with self._lock:
+            try:
+                message = dict(self._messages[message_id])
+            except KeyError:
+                raise HTTPError(404, "Message not found.")
+
+        message["payload"] = json.dumps(message["payload"])
+        return message
+
+    def _get_or_create_channel(self, agent_id: str, name: str) -> _Channel:
+        try:
+            return self._channels_by_name[(agent_id, name)]
+        except KeyError:
+            pass
+
+        if agent_id not in self.agents:
+            self.add_agent(agent_id)
+
+        channel = _Channel(self._new_id(), name, agent_id)
+        self.channels[channel.id] = channel
+        self._channels_by_name[(agent_id, name)] = channel
+        return channel
+
+    def _update_aggregate(self, channel: _Channel, data: Any, override: bool = False):
+        if override:
+            channel.aggregate = copy.deepcopy(data)
+        else:
+            channel.aggregate = merge_aggregate(channel.aggregate, data)
+        channel.aggregate_timestamp = time.time()
+
+    def _publish_message(self, channel: _Channel, request) -> dict[str, Any]:
+        body = self._parse_body(request)
+        if "msg" not in body:
+            # eg. an empty post to create a channel
+            return {"channel": channel.id}
+
+        if channel.name.startswith("!") and body.get("processor_id"):
+            channel.processor_id = body["processor_id"]
+
+        return self._publish_data(
+            channel, body["msg"], bool(body.get("record_log")), bool(body.get("override_aggregate")), body.get("timestamp"),
+        )
+
+    def _publish_data(self, channel: _Channel, data: Any, record_log: bool, override: bool = False, timestamp: float = None) -> dict[str, Any]:
+        self._update_aggregate(channel, data, override=override)
+
+        message = {
+            "message": self._new_id(),
+            "agent": channel.agent_id,
+            "channel": channel.id,
+            "channel_name": channel.name,
+            "type": "base",
+            "timestamp": float(timestamp or time.time()),
+            "payload": copy.deepcopy(data),
+        }
+        if record_log:
+            bisect.insort(channel.messages, message, key=lambda m: m["timestamp"])
+            self._messages[message["message"]] = message
+
+        for task_id in channel.subscribers:
+            self._pending.append((task_id, copy.deepcopy(message)))
+
+        return {"channel": channel.id, "message": message["message"]}
+
+    def _notify_listeners(self, channel: _Channel):
+        # called outside the lock, so listeners can make requests of their own.
+        if not self._aggregate_listeners:
+            return
+        with self._lock:
+            aggregate = copy.deepcopy(channel.aggregate)
+        for listener in list(self._aggregate_listeners):
+            listener(channel.agent_id, channel.name, aggregate)
+
+    def add_aggregate_listener(self, listener: Callable[[str, str, Any], None]):
+        """Call ``listener(agent_id, channel_name, aggregate)`` after every publish, eg. for a `LocalDeviceAgent`."""
+        self._aggregate_listeners.append(listener)
+
+    def remove_aggregate_listener(self, listener: Callable[[str, str, Any], None]):
+        try:
+            self._aggregate_listeners.remove(listener)
+        except ValueError:
+            pass
+
+    def publish(self, agent_id: str, channel_name: str, data: Any, record_log: bool = True, override: bool = False) -> dict[str, Any]:
+        """Publish to a channel in-process, without going through a request (eg. from a `LocalDeviceAgent`)."""
+        with self._lock:
+            channel = self._get_or_create_channel(agent_id, channel_name)
+            result = self._publish_data(channel, data, record_log, override)
+        self._notify_listeners(channel)
+        if self.auto_dispatch and self._pending:
+            self.run_pending()
+        return result
+
+    def _publish_named(self, request, agent_id, channel_name):
+        with self._lock:
+            channel = self._get_or_create_channel(agent_id, channel_name)
+            result = self._publish_message(channel, request)
+        self._notify_listeners(channel)
+        return result
+
+    def _publish(self, request, channel_id):
+        with self._lock:
+            channel = self._get_channel_obj(channel_id)
+            result = self._publish_message(channel, request)
+        self._notify_listeners(channel)
+        return result
+
+    def _subscribe(self, request, channel_id):
+        body = self._parse_body(request)
+        with self._lock:
+            task = self._get_channel_obj(channel_id)
+            channel = self._get_channel_obj(body["channel_id"])
+            if body.get("subscribe"):
+                channel.subscribers.add(task.id)
+            else:
+                channel.subscribers.discard(task.id)
+        return True
+
+    def _get_login(self, request):
+        return "<html>Login</html>", {"Set-Cookie": f"csrftoken={uuid.uuid4().hex}; Path=/"}
+
+    def _post_login(self, request):
+        body = self._parse_body(request)
+        username = body.get("login")
+        try:
+            password, _ = self.users[username]
+        except KeyError:
+            raise HTTPError(403, "Invalid login.")
+        if password != body.get("password"):
+            raise HTTPError(403, "Invalid login.")
+
+        session_id = uuid.uuid4().hex
+        self._sessions[session_id] = username
+        return "<html>Logged in</html>", {"Set-Cookie": f"sessionid={session_id}; Path=/"}
+
+    def _get_temp_token(self, request):
+        username = self._sessions.get(request["cookies"].get("sessionid"))
+        if username is None:
+            raise HTTPError(403, "Not logged in.")
+
+        agent_id = self.users[username][1]
+        now = time.time()
+        return {
+            "token": self.add_token(agent_id),
+            "agent_id": agent_id,
+            "current_time": now,
+            "valid_until": now + self.token_lifetime,
+        }
+
+    # task dispatch
+
+    def run_pending(self) -> int:
+        """Invoke tasks for any published messages. Returns the number of tasks invoked."""
+        if getattr(self._local, "dispatching", False):
+            # a processor published a message while being invoked; the outer loop will pick it up.
+            return 0
+
+        self._local.dispatching = True
+        count = 0
+        try:
+            while True:
+                with self._lock:
+                    if not self._pending:
+                        break
+                    task_id, message = self._pending.popleft()
+                    invocation = self._build_invocation(task_id, message)
+
+                if invocation is None:
+                    continue
+
+                handler, kwargs = invocation
+                try:
+                    if isinstance(handler, type):
+                        handler(**kwargs).execute()
+                    else:
+                        handler(**kwargs)
+                except Exception as e:
+                    log.error(f"Error invoking task {task_id}: {e}", exc_info=e)
+                count += 1
+        finally:
+            self._local.dispatching = False
+
+        return count
+
+    def _build_invocation(self, task_id: str, message: dict[str, Any]) -> Optional[tuple[Callable, dict[str, Any]]]:
+        task = self.channels.get(task_id)
+        if task is None:
+            return None
+
+        handler = self._processors.get(task.processor_id)
+        if handler is None:
+            log.info(f"No local handler registered for processor {task.processor_id}, skipping task {task.name}.")
+            return None
+
+        token = self.add_token(task.agent_id)
+        agent = self.agents.get(task.agent_id, {})
+        kwargs = {
+            "agent_id": task.agent_id,
+            "access_token": token,
+            "api_endpoint": self.base_url,
+            "package_config": copy.deepcopy(task.aggregate) or {},
+            "msg_obj": message,
+            "task_id": task.id,
+            "log_channel": None,
+            "agent_settings": copy.deepcopy(agent.get("settings", {})),
+            "client": self.client(task.agent_id, token),
+        }
+        return handler, kwargs
+
+    # HTTP server
+
+    def serve(self, host: str = "127.0.0.1", port: int = 0) -> http.server.ThreadingHTTPServer:
+        """Serve this broker over HTTP in a background thread. The base URL is available as ``server.url``."""
+        broker = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _handle(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                broker._local.injected = None
+                try:
+                    status, headers, content = broker.handle(self.command, self.path, dict(self.headers), body)
+                except Exception as e:
+                    if e is broker._local.injected:
+                        # an injected transport error; drop the connection.
+                        self.close_connection = True
+                        return
+                    log.error("Error handling %s %s: %s", self.command, self.path, e, exc_info=e)
+                    status, headers, content = 500, {}, b"Internal server error."
+
+                # compress larger responses if the client accepts it, as the real API does.
+                if len(content) > 1024 and "gzip" in self.headers.get("Accept-Encoding", ""):
+                    content = compress(content, "gzip")
+                    headers = {**headers, "Content-Encoding": "gzip"}
+
+                self.send_response(status)
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            do_GET = _handle
+            do_POST = _handle
+
+            def log_message(self, format, *args):
+                log.debug(format, *args)
+
+        server = http.server.ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        server.url = f"http://{host}:{server.server_address[1]}"
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+class LocalDeviceAgent:
+    """An in-process stand-in for the device agent (DDA) interface used by `UIManager` on devices.
+
+    Channels live in a `LocalBroker`, so anything published through the broker's HTTP API (eg. a cloud-side
+    `UIManager` sending a command) reaches this agent's subscribers too, and the other way around.
+
+    Subscribers are called with ``(channel_name, aggregate)`` when they subscribe and after each publish. With an
+    ``update_rate``, deliveries run on a background thread at most that many times a second, and updates in between
+    are coalesced so only the latest aggregate is delivered; otherwise they're delivered straight away.
+
+    Parameters
+    ----------
+    broker: LocalBroker
+        Broker to keep channels in. A new one is created if not given.
+    agent_id: str
+        The device's agent. A new agent is added to the broker if not given.
+    update_rate: float
+        Maximum deliveries per second, or None to deliver synchronously.
+    observers: int
+        Number of (simulated) users watching the device's UI, as reported on ``ui_state@wss_connections``.
+    """
+
+    WSS_CHANNEL = "ui_state@wss_connections"
+
+    def __init__(self, broker: LocalBroker = None, agent_id: str = None, update_rate: Optional[float] = None, observers: int = 0):
+        self.broker = broker or LocalBroker()
+        self.agent_id = agent_id or self.broker.add_agent(name="device")
+        self.dda_uri = f"local://{self.agent_id}"
+        self.update_rate = update_rate
+
+        self.online = True
+        self._has_been_online = True
+        self.deliveries = 0
+
+        self._lock = threading.Lock()
+        self._subscriptions: dict[str, list[Callable[[str, Any], Any]]] = {}
+        self._dirty: dict[str, Any] = {}
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self._wss_connections = {"connections": {}}
+        self.set_observers(observers)
+        self.broker.add_aggregate_listener(self._on_publish)
+
+        if update_rate is not None:
+            self._thread = threading.Thread(target=self._run_delivery, name="local-dda", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        self.broker.remove_aggregate_listener(self._on_publish)
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    ## device agent interface
+
+    def add_subscription(self, channel_name: str, callback: Callable[[str, Any], Any]):
+        with self._lock:
+            self._subscriptions.setdefault(channel_name, []).append(callback)
+        callback(channel_name, self.get_channel_aggregate(channel_name))
+
+    def publish_to_channel(self, channel_name: str, data: Any, record_log: bool = True, **kwargs):
+        self.broker.publish(self.agent_id, channel_name, data, record_log=record_log)
+        return True
+
+    def get_channel_aggregate(self, channel_name: str) -> Any:
+        if channel_name == self.WSS_CHANNEL:
+            return copy.deepcopy(self._wss_connections)
+        return self.broker.get_aggregate(self.agent_id, channel_name)
+
+    def get_is_dda_online(self) -> bool:
+        return self.online
+
+    def get_has_dda_been_online(self) -> bool:
+        return self._has_been_online
+
+    ## simulation
+
+    def set_online(self, online: bool):
+        self.online = online
+        self._has_been_online = self._has_been_online or online
+
+    def set_observers(self, count: int):
+        """Simulate ``count`` users watching the UI. The device itself is always one of the connections."""
+        connections = {self.agent_id: True}
+        connections.update({f"observer-{i}": True for i in range(count)})
+        self._wss_connections = {"connections": connections}
+        self._schedule(self.WSS_CHANNEL, copy.deepcopy(self._wss_connections))
+
+    def _on_publish(self, agent_id: str, channel_name: str, aggregate: Any):
+        if agent_id == self.agent_id:
+            self._schedule(channel_name, aggregate)
+
+    def _schedule(self, channel_name: str, aggregate: Any):
+        if self.update_rate is None:
+            self._deliver(channel_name, aggregate)
+            return
+
+        with self._lock:
+            self._dirty[channel_name] = aggregate
+        self._wakeup.set()
+
+    def _deliver(self, channel_name: str, aggregate: Any):
+        with self._lock:
+            callbacks = list(self._subscriptions.get(channel_name, ()))
+        for i, callback in enumerate(callbacks):
+            self.deliveries += 1
+            try:
+                # aggregate is already a copy; only further subscribers need their own.
+                callback(channel_name, aggregate if i == 0 else copy.deepcopy(aggregate))
+            except Exception as e:
+                log.error("Error in subscription callback for %s: %s", channel_name, e, exc_info=e)
+
+    def _run_delivery(self):
+        interval = 1 / self.update_rate
+        while not self._stop.is_set():
+            self._wakeup.wait()
+            self._wakeup.clear()
+            with self._lock:
+                dirty, self._dirty = self._dirty, {}
+            for channel_name, aggregate in dirty.items():
+                self._deliver(channel_name, aggregate)
+            self._stop.wait(interval)
+
+
+def _dumps(data: Any) -> bytes:
+    return json.dumps(data).encode("utf-8")
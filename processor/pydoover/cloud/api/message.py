@@ -1,8 +1,18 @@
-import json, time
-from typing import Any
+import time
+from typing import Any, Iterator, Optional, Union
+
+from ... import codec
+from ...utils import get_path
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
 class Message:
+    __slots__ = ("client", "id", "channel_id", "agent_id", "channel_name", "timestamp", "_payload")
+
     def __init__(self, client, data, channel_id=None, agent_id=None, channel_name=None):
         self.client = client
         self.channel_id = channel_id
@@ -29,6 +39,17 @@ class Message:
 
         self._payload = data.get("payload")
 
+    def to_dict(self) -> dict[str, Any]:
+        # the same shape as the API returns, eg. for passing to a processor as `msg_obj`.
+        return {
+            "message": self.id,
+            "agent": self.agent_id,
+            "channel": self.channel_id,
+            "channel_name": self.channel_name,
+            "timestamp": self.timestamp,
+            "payload": self._payload,
+        }
+
     def update(self):
         data = self.client._get_message_raw(self.channel_id, self.id)
         self._from_data(data)
@@ -38,8 +59,125 @@ class Message:
             return self._payload
 
         data = self.client._get_message_raw(self.channel_id, self.id)
-        self._payload = json.loads(data["payload"])
+        payload = data["payload"]
+        # single messages come back with the payload as a JSON string, but don't decode it twice if it's not.
+        if isinstance(payload, (str, bytes)):
+            payload = codec.loads(payload)
+        self._payload = payload
         return self._payload
 
     def get_age(self):
-        return time.time() - self.timestamp
\ No newline at end of file
+        return time.time() - self.timestamp
+
+class MessageBatch:
+    """A columnar collection of messages from one channel.
+
+    Message IDs are kept in a list and timestamps in a NumPy float64 array, so filtering by time is vectorised.
+    Payloads are kept as received and only decoded when accessed. Indexing with an int returns a `Message`;
+    indexing with a slice, boolean mask or index array returns a new `MessageBatch`.
+
+    Requires NumPy.
+    """
+
+    __slots__ = ("client", "channel_id", "ids", "timestamps", "_payloads")
+
+    def __init__(self, client, channel_id: str, ids: list[str], timestamps, payloads: list[Any]):
+        if np is None:
+            raise RuntimeError("MessageBatch requires numpy to be installed.")
+        if not (len(ids) == len(timestamps) == len(payloads)):
+            raise ValueError("ids, timestamps and payloads must be the same length.")
+
+        self.client = client
+        self.channel_id = channel_id
+        self.ids = list(ids)
+        self.timestamps = np.asarray(timestamps, dtype=np.float64)
+        # raw (possibly still JSON-encoded) payloads, decoded in place on first access.
+        self._payloads = list(payloads)
+
+    @classmethod
+    def from_data(cls, client, channel_id: str, data: list[dict[str, Any]]) -> "MessageBatch":
+        """Build a batch from raw API message dicts, without creating a `Message` for each."""
+        return cls(
+            client,
+            channel_id,
+            [m.get("message") for m in data],
+            np.fromiter((m.get("timestamp") or np.nan for m in data), dtype=np.float64, count=len(data)),
+            [m.get("payload") for m in data],
+        )
+
+    @classmethod
+    def from_messages(cls, messages: list[Message], channel_id: str = None) -> "MessageBatch":
+        client = messages[0].client if messages else None
+        channel_id = channel_id or (messages[0].channel_id if messages else None)
+        return cls(
+            client,
+            channel_id,
+            [m.id for m in messages],
+            [np.nan if m.timestamp is None else m.timestamp for m in messages],
+            [m._payload for m in messages],
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __repr__(self):
+        return f"<MessageBatch channel_id={self.channel_id}, messages={len(self)}>"
+
+    def payload(self, index: int) -> Any:
+        payload = self._payloads[index]
+        if isinstance(payload, (str, bytes)):
+            payload = self._payloads[index] = codec.loads(payload)
+        return payload
+
+    @property
+    def payloads(self) -> list[Any]:
+        return [self.payload(i) for i in range(len(self))]
+
+    def __getitem__(self, index) -> Union[Message, "MessageBatch"]:
+        if isinstance(index, (int, np.integer)):
+            data = {"message": self.ids[index], "timestamp": float(self.timestamps[index]), "payload": self.payload(index)}
+            return Message(client=self.client, data=data, channel_id=self.channel_id)
+
+        if isinstance(index, slice):
+            indices = range(len(self))[index]
+        else:
+            index = np.asarray(index)
+            indices = np.flatnonzero(index) if index.dtype == bool else index
+        return MessageBatch(
+            self.client,
+            self.channel_id,
+            [self.ids[i] for i in indices],
+            self.timestamps[index],
+            [self._payloads[i] for i in indices],
+        )
+
+    def __iter__(self) -> Iterator[Message]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def between(self, since: Optional[float] = None, until: Optional[float] = None) -> "MessageBatch":
+        """Messages with ``since <= timestamp < until``."""
+        mask = np.ones(len(self), dtype=bool)
+        if since is not None:
+            mask &= self.timestamps >= since
+        if until is not None:
+            mask &= self.timestamps < until
+        return self[mask]
+
+    def ages(self, now: Optional[float] = None):
+        """Age of each message, in seconds."""
+        return (time.time() if now is None else now) - self.timestamps
+
+    def newer_than(self, seconds: float, now: Optional[float] = None) -> "MessageBatch":
+        return self[self.ages(now) <= seconds]
+
+    def field(self, key: Union[str, tuple], default: Any = float("nan"), dtype: Any = "float64"):
+        """Extract a payload field from every message into an array, eg. ``batch.field(("pump", "pressure"))``.
+
+        Messages without the field (or that aren't dicts) get ``default``.
+        """
+        path = (key, ) if isinstance(key, str) else key
+        values = (get_path(self.payload(i), path, default) for i in range(len(self)))
+        if dtype is object:
+            return np.array(list(values), dtype=object)
+        return np.fromiter((default if v is None else v for v in values), dtype=dtype, count=len(self))
@@ -0,0 +1,126 @@
+import math
+import threading
+
+from collections import Counter
+from typing import Any, Optional
+
+
+class ClientMetrics:
+    """Thread-safe counters (and gauges) for `Client` requests, eg. ``requests``, ``retries`` or ``transport_errors``."""
+
+    def __init__(self):
+        self._counters = Counter()
+        self._histograms: dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def incr(self, name: str, value: float = 1):
+        with self._lock:
+            self._counters[name] += value
+
+    def set(self, name: str, value: float):
+        with self._lock:
+            self._counters[name] = value
+
+    def __getitem__(self, name: str) -> float:
+        return self._counters[name]
+
+    def __getattr__(self, name: str) -> float:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self._counters[name]
+
+    def observe(self, name: str, seconds: float):
+        """Record a latency sample in the histogram ``name`` (eg. a route)."""
+        try:
+            histogram = self._histograms[name]
+        except KeyError:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, LatencyHistogram())
+        histogram.record(seconds)
+
+    def histogram(self, name: str) -> Optional["LatencyHistogram"]:
+        return self._histograms.get(name)
+
+    def snapshot(self) -> dict[str, float]:
+        with self._lock:
+            return dict(self._counters)
+
+    def latency_snapshot(self) -> dict[str, dict[str, Any]]:
+        with self._lock:
+            histograms = dict(self._histograms)
+        return {name: h.to_dict() for name, h in sorted(histograms.items())}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+class LatencyHistogram:
+    """A log-linear (HDR-style) latency histogram.
+
+    Latencies are recorded in microseconds into buckets that are exact below 128us, and then 64 buckets per power of
+    two (under ~1.6% error), so recording is O(1) and memory stays small however many samples are recorded.
+    """
+
+    SUB_BUCKET_BITS = 7
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    @classmethod
+    def _index(cls, micros: int) -> int:
+        shift = max(0, micros.bit_length() - cls.SUB_BUCKET_BITS)
+        return (shift << cls.SUB_BUCKET_BITS) + (micros >> shift)
+
+    @classmethod
+    def _value(cls, index: int) -> float:
+        # the midpoint of the bucket, in seconds
+        shift = index >> cls.SUB_BUCKET_BITS
+        low = (index & ((1 << cls.SUB_BUCKET_BITS) - 1)) << shift
+        return (low + ((1 << shift) - 1) / 2) / 1e6
+
+    def record(self, seconds: float):
+        index = self._index(max(0, int(seconds * 1e6)))
+        with self._lock:
+            self._counts[index] += 1
+            self.count += 1
+            self.total += seconds
+            if self.min is None or seconds < self.min:
+                self.min = seconds
+            if self.max is None or seconds > self.max:
+                self.max = seconds
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """The latency (in seconds) at or below which ``pct`` percent of samples fall."""
+        with self._lock:
+            if not self.count:
+                return None
+            rank = max(1, math.ceil(pct / 100 * self.count))
+            seen = 0
+            for index in sorted(self._counts):
+                seen += self._counts[index]
+                if seen >= rank:
+                    return min(max(self._value(index), self.min), self.max)
+
+    def to_dict(self) -> dict[str, Any]:
+        if not self.count:
+            return {"count": 0}
+
+        def ms(value):
+            return round(value * 1000, 3)
+
+        return {
+            "count": self.count,
+            "mean_ms": ms(self.total / self.count),
+            "min_ms": ms(self.min),
+            "p50_ms": ms(self.percentile(50)),
+            "p90_ms": ms(self.percentile(90)),
+            "p99_ms": ms(self.percentile(99)),
+            "max_ms": ms(self.max),
+        }
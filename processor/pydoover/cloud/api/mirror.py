@@ -0,0 +1,187 @@
+import logging
+import sqlite3
+import threading
+import time
+
+from datetime import datetime
+from typing import TYPE_CHECKING, Optional, Union
+
+from ... import codec
+from .message import Message
+
+if TYPE_CHECKING:
+    from .client import Client
+
+
+log = logging.getLogger(__name__)
+
+
+class MessageMirror:
+    """A local (SQLite) copy of channel messages, indexed by time.
+
+    Each `sync` only fetches messages from ``lookback`` seconds before the newest one already stored, so repeated
+    history reads cost a small delta fetch. Time-range, last-N and age queries are then answered locally.
+
+    Parameters
+    ----------
+    path: str
+        SQLite database file. Use ``":memory:"`` for a non-durable mirror.
+    client: Client
+        Client used to sync. This is set automatically when the mirror is passed to a `Client`.
+    initial_history: float
+        How far back (in seconds) to fetch the first time a channel is synced, or None for its whole history.
+        The newest ``page_size`` messages are always fetched too, however old, so a quiet channel still has its
+        last messages.
+    page_size: int
+        Messages requested per page when syncing.
+    lookback: float
+        How far (in seconds) before the newest stored message to re-fetch on each sync, so messages that arrive
+        late with an older timestamp (eg. replayed from a device's outbox) are still picked up. Messages already
+        stored are ignored. Anything arriving later than this is missed until the channel is re-synced from scratch.
+    """
+
+    def __init__(
+        self,
+        path: str = ":memory:",
+        client: "Client" = None,
+        initial_history: Optional[float] = 7 * 24 * 60 * 60,
+        page_size: int = 100,
+        lookback: float = 15 * 60,
+    ):
+        self.path = path
+        self.client = client
+        self.initial_history = initial_history
+        self.page_size = page_size
+        self.lookback = lookback
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "id TEXT PRIMARY KEY, "
+            "channel_id TEXT NOT NULL, "
+            "agent_id TEXT, "
+            "channel_name TEXT, "
+            "timestamp REAL NOT NULL, "
+            "payload TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS messages_channel_time ON messages (channel_id, timestamp)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sync_state (channel_id TEXT PRIMARY KEY, synced_at REAL NOT NULL)"
+        )
+
+    def _newest_timestamp(self, channel_id: str) -> Optional[float]:
+        with self._lock:
+            row = self._conn.execute("SELECT MAX(timestamp) FROM messages WHERE channel_id = ?", (channel_id, )).fetchone()
+        return row[0]
+
+    def last_synced(self, channel_id: str) -> Optional[float]:
+        """When the channel was last synced (unix time), or None if it never has been."""
+        with self._lock:
+            row = self._conn.execute("SELECT synced_at FROM sync_state WHERE channel_id = ?", (channel_id, )).fetchone()
+        return row and row[0]
+
+    def add_messages(self, messages: list[Message]) -> int:
+        rows = [
+            (
+                m.id, m.channel_id, m.agent_id, m.channel_name, m.timestamp,
+                None if m._payload is None else codec.dumps(m._payload).decode("utf-8"),
+            )
+            for m in messages if m.id is not None and m.timestamp is not None
+        ]
+        if not rows:
+            return 0
+
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO messages (id, channel_id, agent_id, channel_name, timestamp, payload) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+            self._conn.execute("COMMIT")
+            return self._conn.total_changes - before
+
+    def sync(self, channel_id: str) -> int:
+        """Fetch messages from ``lookback`` before the newest stored message. Returns the number of new messages."""
+        first_sync = self.last_synced(channel_id) is None
+        since = self._newest_timestamp(channel_id)
+        if since is not None:
+            since -= self.lookback
+        elif self.initial_history is not None:
+            since = time.time() - self.initial_history
+
+        # messages in the lookback window are mostly fetched again; they're ignored on insert.
+        added, batch = 0, []
+        for message in self.client.iter_channel_messages(channel_id, since=since, page_size=self.page_size):
+            batch.append(message)
+            if len(batch) >= self.page_size:
+                added += self.add_messages(batch)
+                batch = []
+        added += self.add_messages(batch)
+
+        if first_sync and since is not None:
+            # a channel that's been quiet for longer than initial_history would otherwise have nothing stored.
+            added += self.add_messages(self.client.get_channel_messages(channel_id, num_messages=self.page_size))
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sync_state (channel_id, synced_at) VALUES (?, ?)", (channel_id, time.time())
+            )
+
+        log.debug("Synced %s new messages for %s", added, channel_id)
+        return added
+
+    def _to_messages(self, rows) -> list[Message]:
+        return [
+            Message(
+                client=self.client,
+                data={
+                    "message": message_id,
+                    "agent": agent_id,
+                    "channel_name": channel_name,
+                    "timestamp": timestamp,
+                    "payload": None if payload is None else codec.loads(payload),
+                },
+                channel_id=channel_id,
+            )
+            for message_id, channel_id, agent_id, channel_name, timestamp, payload in rows
+        ]
+
+    def range(
+        self, channel_id: str, since: Union[datetime, float] = None, until: Union[datetime, float] = None,
+        limit: int = None,
+    ) -> list[Message]:
+        """Stored messages with ``since <= timestamp < until``, newest first."""
+        query = "SELECT id, channel_id, agent_id, channel_name, timestamp, payload FROM messages WHERE channel_id = ?"
+        params = [channel_id]
+        if since is not None:
+            query += " AND timestamp >= ?"
+            params.append(since.timestamp() if isinstance(since, datetime) else since)
+        if until is not None:
+            query += " AND timestamp < ?"
+            params.append(until.timestamp() if isinstance(until, datetime) else until)
+        query += " ORDER BY timestamp DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return self._to_messages(rows)
+
+    def last(self, channel_id: str, num_messages: int = 1) -> list[Message]:
+        """The newest ``num_messages`` stored messages, newest first."""
+        return self.range(channel_id, limit=num_messages)
+
+    def last_update_age(self, channel_id: str) -> Optional[float]:
+        """Seconds since the newest stored message, or None if there are none."""
+        newest = self._newest_timestamp(channel_id)
+        if newest is None:
+            return None
+        return time.time() - newest
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,253 @@
+import logging
+import sqlite3
+import threading
+import time
+
+from typing import TYPE_CHECKING, Any, Optional
+
+from ... import codec
+
+if TYPE_CHECKING:
+    from .client import Client
+
+
+log = logging.getLogger(__name__)
+
+
+class DropPolicy:
+    oldest = "oldest"
+    newest = "newest"
+
+
+class Outbox:
+    """An on-disk (SQLite) write-ahead queue of publishes that couldn't be sent.
+
+    When attached to a `Client`, publishes that fail because the API is unreachable are stored here with their
+    original timestamp, and replayed in order once the API is reachable again by a background flusher (started by
+    the client when it first queues a message). The API has no batch publish, so each queued message is sent as its
+    own request, at up to ``max_rate`` a second; a backlog of N messages takes about ``N / max_rate`` seconds to
+    drain. Messages are read from (and removed from) disk in chunks.
+
+    Parameters
+    ----------
+    path: str
+        SQLite database file. Use ``":memory:"`` for a non-durable queue.
+    max_bytes: int
+        Disk budget for queued message bodies.
+    drop_policy: str
+        What to do when the budget is exceeded: drop the ``"oldest"`` queued messages, or the ``"newest"`` (incoming).
+    chunk_size: int
+        Number of messages read, and removed once sent, per SQLite transaction when flushing.
+    max_rate: float
+        Maximum messages per second to send while flushing, or None for no limit. This keeps a large backlog from
+        competing with live publishes.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = 50 * 1024 * 1024,
+        drop_policy: str = DropPolicy.oldest,
+        chunk_size: int = 100,
+        max_rate: Optional[float] = 100,
+    ):
+        if drop_policy not in (DropPolicy.oldest, DropPolicy.newest):
+            raise ValueError(f"Unknown drop policy: {drop_policy}")
+
+        self.path = path
+        self.max_bytes = max_bytes
+        self.drop_policy = drop_policy
+        self.chunk_size = chunk_size
+        self.max_rate = max_rate
+
+        self.dropped = 0
+        self.sent = 0
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flusher = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        # rows read by a flush that's sending them, which can't be dropped to make space.
+        self._in_flight: set[int] = set()
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "url TEXT NOT NULL, "
+            "body TEXT NOT NULL, "
+            "idempotency_key TEXT NOT NULL, "
+            "size INTEGER NOT NULL, "
+            "created REAL NOT NULL)"
+        )
+
+        self._count, self._bytes = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM outbox").fetchone()
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def pending_bytes(self) -> int:
+        return self._bytes
+
+    def put(self, url: str, post_data: dict[str, Any], idempotency_key: str) -> bool:
+        """Queue a publish. Returns False if it was dropped to stay within the disk budget."""
+        body = codec.dumps(post_data).decode("utf-8")
+        size = len(body)
+
+        with self._lock:
+            if size > self.max_bytes:
+                log.warning(f"Dropping {size} byte message for {url}; it is larger than the outbox budget.")
+                self.dropped += 1
+                return False
+
+            if self._bytes + size > self.max_bytes:
+                if self.drop_policy == DropPolicy.newest or not self._drop_oldest(self._bytes + size - self.max_bytes):
+                    log.warning(f"Outbox is full, dropping new message for {url}.")
+                    self.dropped += 1
+                    return False
+
+            self._conn.execute(
+                "INSERT INTO outbox (url, body, idempotency_key, size, created) VALUES (?, ?, ?, ?, ?)",
+                (url, body, idempotency_key, size, time.time()),
+            )
+            self._count += 1
+            self._bytes += size
+        return True
+
+    def _drop_oldest(self, to_free: int) -> bool:
+        """Drop the oldest messages that aren't being sent, to free ``to_free`` bytes. Returns False (dropping
+        nothing) if that isn't possible."""
+        freed = 0
+        ids = []
+        for row_id, size in self._conn.execute("SELECT id, size FROM outbox ORDER BY id"):
+            if row_id in self._in_flight:
+                continue
+            ids.append(row_id)
+            freed += size
+            if freed >= to_free:
+                break
+
+        if freed < to_free:
+            return False
+
+        self._delete(ids, freed)
+        self.dropped += len(ids)
+        log.warning(f"Outbox is full, dropped {len(ids)} oldest messages ({freed} bytes).")
+        return True
+
+    def _delete(self, ids: list[int], size: int):
+        if not ids:
+            return
+        self._conn.execute("BEGIN")
+        self._conn.executemany("DELETE FROM outbox WHERE id = ?", [(i, ) for i in ids])
+        self._conn.execute("COMMIT")
+        self._count -= len(ids)
+        self._bytes -= size
+
+    def _take(self, limit: int) -> list[tuple[int, str, str, str, int]]:
+        """Read the oldest ``limit`` messages, marking them in flight."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, url, body, idempotency_key, size FROM outbox ORDER BY id LIMIT ?", (limit, )
+            ).fetchall()
+            self._in_flight.update(row[0] for row in rows)
+            return rows
+
+    def flush(self, client: "Client", max_chunks: Optional[int] = None) -> int:
+        """Send queued messages in order, ``chunk_size`` at a time. Stops at the first transient failure; returns the
+        number sent."""
+        if not self._flush_lock.acquire(blocking=False):
+            return 0  # someone else is already flushing
+
+        sent = 0
+        interval = self.max_rate and 1 / self.max_rate or 0
+        try:
+            chunks = 0
+            while max_chunks is None or chunks < max_chunks:
+                rows = self._take(self.chunk_size)
+                if not rows:
+                    break
+                chunks += 1
+
+                done, done_size = [], 0
+                stop = False
+                try:
+                    for row_id, url, body, key, size in rows:
+                        start = time.monotonic()
+                        try:
+                            client._send_publish(url, codec.loads(body), key, template="(outbox)")
+                        except Exception as e:
+                            if client._is_transient_error(e):
+                                log.info(f"Outbox flush stopped, API still unreachable: {e}")
+                                stop = True
+                                break
+                            # the API rejected it outright; retrying won't help.
+                            log.error(f"Dropping queued message for {url}, it was rejected: {e}")
+                            self.dropped += 1
+                        else:
+                            sent += 1
+
+                        done.append(row_id)
+                        done_size += size
+
+                        if interval:
+                            delay = interval - (time.monotonic() - start)
+                            if delay > 0:
+                                time.sleep(delay)
+                finally:
+                    with self._lock:
+                        self._delete(done, done_size)
+                        self._in_flight.clear()
+
+                if stop:
+                    break
+        finally:
+            self.sent += sent
+            self._flush_lock.release()
+
+        if sent:
+            log.info(f"Flushed {sent} queued messages, {self._count} remaining.")
+        return sent
+
+    @property
+    def is_flushing_in_background(self) -> bool:
+        return self._flusher is not None and self._flusher.is_alive()
+
+    def start(self, client: "Client", interval: float = 5):
+        """Flush in a background thread every ``interval`` seconds (or when woken) while there's anything queued."""
+        if self.is_flushing_in_background:
+            return
+
+        self._stop.clear()
+
+        def run():
+            while not self._stop.is_set():
+                self._wake.wait(interval)
+                self._wake.clear()
+                if self._count and not self._stop.is_set():
+                    try:
+                        self.flush(client)
+                    except Exception as e:
+                        log.error(f"Error flushing outbox: {e}", exc_info=e)
+
+        self._flusher = threading.Thread(target=run, name="doover-outbox", daemon=True)
+        self._flusher.start()
+
+    def wake(self):
+        """Have the background flusher flush now, rather than at its next interval."""
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+
+    def close(self):
+        self.stop()
+        self._conn.close()
@@ -0,0 +1,168 @@
+import enum
+import random
+import threading
+import time
+
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+from .exceptions import CircuitOpen
+
+
+class RetryPolicy:
+    """Configures how `Client` retries failed requests.
+
+    Parameters
+    ----------
+    total: int
+        Maximum number of retries (not including the first attempt).
+    backoff_factor: float
+        The delay before retry ``n`` is ``backoff_factor * 2 ** (n - 1)`` seconds, capped at ``max_backoff``.
+    max_backoff: float
+        Maximum delay between attempts, in seconds.
+    jitter: bool
+        Pick a random delay between 0 and the backoff ("full jitter"), so many clients don't retry in lock-step.
+    status_forcelist: tuple[int]
+        Response status codes that are retried.
+    respect_retry_after: bool
+        Honour a ``Retry-After`` header on a retryable response (up to ``max_retry_after`` seconds).
+    """
+
+    def __init__(
+        self,
+        total: int = 3,
+        backoff_factor: float = 0.5,
+        max_backoff: float = 30,
+        jitter: bool = True,
+        status_forcelist: tuple[int] = (429, 500, 502, 503, 504),
+        respect_retry_after: bool = True,
+        max_retry_after: float = 60,
+        seed: int = None,
+    ):
+        self.total = total
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.status_forcelist = frozenset(status_forcelist)
+        self.respect_retry_after = respect_retry_after
+        self.max_retry_after = max_retry_after
+
+        self._rng = random.Random(seed)
+
+    def can_retry(self, attempt: int) -> bool:
+        """Whether another attempt is allowed after ``attempt`` attempts."""
+        return attempt <= self.total
+
+    def is_retryable_status(self, status_code: int) -> bool:
+        return status_code in self.status_forcelist
+
+    def get_backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if self.respect_retry_after and retry_after:
+            parsed = self.parse_retry_after(retry_after)
+            if parsed is not None:
+                return min(parsed, self.max_retry_after)
+
+        backoff = min(self.max_backoff, self.backoff_factor * 2 ** (attempt - 1))
+        if self.jitter:
+            return self._rng.uniform(0, backoff)
+        return backoff
+
+    @staticmethod
+    def parse_retry_after(value: str) -> Optional[float]:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+
+        try:
+            date = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if date.tzinfo is None:
+            date = date.replace(tzinfo=timezone.utc)
+        return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
+
+
+class CircuitState(enum.Enum):
+    closed = "closed"
+    open = "open"
+    half_open = "half_open"
+
+
+class CircuitBreaker:
+    """Fail fast while a host is unhealthy.
+
+    After ``failure_threshold`` consecutive failures the circuit opens, and requests raise `CircuitOpen` without
+    being sent. After ``recovery_timeout`` seconds one trial request is let through (half-open); if it succeeds the
+    circuit closes, otherwise it opens again.
+    """
+
+    def __init__(self, host: str, failure_threshold: int = 5, recovery_timeout: float = 30):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+
+        self.state = CircuitState.closed
+        self.consecutive_failures = 0
+        self.times_opened = 0
+        self.rejected = 0
+
+        self._opened_at = None
+        self._open_seconds = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def open_seconds(self) -> float:
+        """Total time this circuit has spent open (or half-open)."""
+        with self._lock:
+            if self._opened_at is None:
+                return self._open_seconds
+            return self._open_seconds + time.monotonic() - self._opened_at
+
+    def before_request(self):
+        with self._lock:
+            if self.state is CircuitState.closed:
+                return
+
+            if self.state is CircuitState.open and time.monotonic() - self._opened_at >= self.recovery_timeout:
+                self.state = CircuitState.half_open
+                self._trial_in_flight = False
+
+            if self.state is CircuitState.half_open and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+
+            self.rejected += 1
+
+        raise CircuitOpen(f"Circuit for {self.host} is open; not sending request.")
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+            if self.state is not CircuitState.closed:
+                self._open_seconds += time.monotonic() - self._opened_at
+                self._opened_at = None
+                self.state = CircuitState.closed
+
+    def release_trial(self):
+        """Let another trial request through, eg. when one was abandoned without a success or failure recorded."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+
+            if self.state is CircuitState.half_open:
+                # the trial failed; stay open for another recovery period
+                self.state = CircuitState.open
+                self._open_seconds += time.monotonic() - self._opened_at
+                self._opened_at = time.monotonic()
+            elif self.state is CircuitState.closed and self.consecutive_failures >= self.failure_threshold:
+                self.state = CircuitState.open
+                self._opened_at = time.monotonic()
+                self.times_opened += 1
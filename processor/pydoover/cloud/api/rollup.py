@@ -0,0 +1,249 @@
+import logging
+import sqlite3
+import threading
+import time
+
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Iterable, Optional, Union
+
+from ... import codec
+from ...utils import get_path
+from .message import Message
+
+if TYPE_CHECKING:
+    from .client import Client
+
+
+log = logging.getLogger(__name__)
+
+# tier name, bucket width in seconds. Ordered finest to coarsest; "raw" keeps every sample.
+TIERS = (("raw", 0), ("10m", 600), ("1h", 3600), ("1d", 86400))
+DEFAULT_RETENTION = {"raw": 2 * 86400, "10m": 31 * 86400, "1h": 366 * 86400, "1d": None}
+
+
+class RollupStore:
+    """Multi-resolution (raw, 10 minute, hourly and daily) rollups of numeric message fields, in SQLite.
+
+    Every ingested sample updates each tier's bucket in place (count, sum, min, max and last), so tiers are kept
+    up to date incrementally and a month-long query reads ~720 hourly rows rather than every raw message.
+
+    Messages are de-duplicated against the raw samples, so once `prune` has deleted raw samples older than some
+    time, samples older than that are refused rather than counted again in the other tiers (eg. when a `backfill`
+    is re-run). Ingest history before pruning it.
+
+    Series are keyed by channel as ``"<agent_id>/<channel_name>:<field>"`` (see `series_key`), whether the message
+    came from a processor invocation or a `backfill`, so both add to the same series. Messages without an agent ID
+    and channel name are skipped.
+
+    Parameters
+    ----------
+    fields: dict[str, str]
+        Field name: dotted path to its value in a message payload, eg. ``{"flow_rate": "pump.flow_rate"}``.
+    path: str
+        SQLite database file. Use ``":memory:"`` for a non-durable store.
+    retention: dict[str, float]
+        Tier name: seconds of history kept by `prune`, or None to keep everything.
+    """
+
+    def __init__(self, fields: dict[str, str], path: str = ":memory:", retention: dict[str, Optional[float]] = None):
+        self.fields = {name: tuple(p.split(".")) for name, p in fields.items()}
+        self.path = path
+        self.retention = {**DEFAULT_RETENTION, **(retention or {})}
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS samples ("
+            "series TEXT NOT NULL, "
+            "message_id TEXT NOT NULL, "
+            "timestamp REAL NOT NULL, "
+            "value REAL NOT NULL, "
+            "PRIMARY KEY (series, message_id))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS samples_series_time ON samples (series, timestamp)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rollups ("
+            "series TEXT NOT NULL, "
+            "tier TEXT NOT NULL, "
+            "bucket REAL NOT NULL, "
+            "count INTEGER NOT NULL, "
+            "sum REAL NOT NULL, "
+            "min REAL NOT NULL, "
+            "max REAL NOT NULL, "
+            "last REAL NOT NULL, "
+            "last_ts REAL NOT NULL, "
+            "PRIMARY KEY (series, tier, bucket))"
+        )
+        # "raw_pruned_before": raw samples older than this have been pruned, so can't be de-duplicated against.
+        self._conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value REAL NOT NULL)")
+        row = self._conn.execute("SELECT value FROM state WHERE key = 'raw_pruned_before'").fetchone()
+        self._raw_pruned_before: Optional[float] = row and row[0]
+
+    @staticmethod
+    def series_key(message: Message, field: str) -> str:
+        if message.agent_id is None or message.channel_name is None:
+            raise ValueError(f"Message {message.id} has no agent ID or channel name to key its series by.")
+        return f"{message.agent_id}/{message.channel_name}:{field}"
+
+    def _samples(self, message: Message) -> Iterable[tuple[str, float]]:
+        if message.agent_id is None or message.channel_name is None:
+            log.warning("Skipping message %s, it has no agent ID or channel name.", message.id)
+            return
+
+        payload = message._payload
+        if isinstance(payload, (str, bytes)):
+            try:
+                payload = codec.loads(payload)
+            except ValueError:
+                return
+        if not isinstance(payload, dict):
+            return
+
+        for name, p in self.fields.items():
+            value = get_path(payload, p)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                yield self.series_key(message, name), value
+
+    def ingest_messages(self, messages: Iterable[Message]) -> int:
+        """Add messages' samples to every tier. Returns the number of new samples.
+
+        Messages already ingested are ignored, as are messages older than the raw samples kept by `prune`.
+        """
+        added = refused = 0
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for message in messages:
+                    if message.id is None or message.timestamp is None:
+                        continue
+
+                    ts = message.timestamp
+                    if self._raw_pruned_before is not None and ts < self._raw_pruned_before:
+                        refused += 1
+                        continue
+                    for series, value in self._samples(message):
+                        cursor = self._conn.execute(
+                            "INSERT OR IGNORE INTO samples (series, message_id, timestamp, value) VALUES (?, ?, ?, ?)",
+                            (series, message.id, ts, value),
+                        )
+                        if not cursor.rowcount:
+                            continue
+
+                        added += 1
+                        self._conn.executemany(
+                            "INSERT INTO rollups (series, tier, bucket, count, sum, min, max, last, last_ts) "
+                            "VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?) "
+                            "ON CONFLICT (series, tier, bucket) DO UPDATE SET "
+                            "count = count + 1, sum = sum + excluded.sum, "
+                            "min = MIN(min, excluded.min), max = MAX(max, excluded.max), "
+                            "last = CASE WHEN excluded.last_ts >= last_ts THEN excluded.last ELSE last END, "
+                            "last_ts = MAX(last_ts, excluded.last_ts)",
+                            [
+                                (series, tier, ts // interval * interval, value, value, value, value, ts)
+                                for tier, interval in TIERS if interval
+                            ],
+                        )
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+        if refused:
+            log.info("Refused %s messages older than the raw samples kept (%s).", refused, self._raw_pruned_before)
+        return added
+
+    def ingest_message(self, message: Message) -> int:
+        """Processor hook: add one message (eg. ``self.message``) to the store."""
+        return self.ingest_messages([message])
+
+    def backfill(self, client: "Client", channel_id: str, since: Union[datetime, float] = None, page_size: int = 100) -> int:
+        """Ingest a channel's history (since ``since``) page by page."""
+        # key the history by agent and channel name, the same as messages passed to a processor.
+        channel = client.get_channel(channel_id)
+
+        added, batch = 0, []
+        for message in client.iter_channel_messages(channel_id, since=since, page_size=page_size):
+            message.agent_id, message.channel_name = channel.agent_id, channel.name
+            batch.append(message)
+            if len(batch) >= page_size:
+                added += self.ingest_messages(batch)
+                batch = []
+        added += self.ingest_messages(batch)
+        log.debug("Backfilled %s samples for %s", added, channel_id)
+        return added
+
+    def pick_tier(self, span: float, points: int) -> tuple[str, int]:
+        """The coarsest tier with at least ``points`` buckets in ``span`` seconds, or the raw tier."""
+        for tier, interval in reversed(TIERS):
+            if interval and span / interval >= points:
+                return tier, interval
+        return TIERS[0]
+
+    def query(
+        self,
+        series: str,
+        since: Union[datetime, float],
+        until: Union[datetime, float] = None,
+        points: int = 100,
+        tier: str = None,
+    ) -> dict[str, Any]:
+        """Buckets of ``series`` (see `series_key`) with ``since <= bucket < until``, oldest first.
+
+        The coarsest tier that still gives at least ``points`` buckets over the range is used, unless ``tier`` is
+        given. Returns compact columns, eg. ``{"tier": "1h", "interval": 3600, "t": [...], "mean": [...], ...}``.
+        """
+        since = since.timestamp() if isinstance(since, datetime) else since
+        until = time.time() if until is None else until
+        until = until.timestamp() if isinstance(until, datetime) else until
+
+        if tier is None:
+            tier, interval = self.pick_tier(until - since, points)
+        else:
+            interval = dict(TIERS)[tier]
+
+        with self._lock:
+            if interval:
+                rows = self._conn.execute(
+                    "SELECT bucket, count, sum * 1.0 / count, min, max, last FROM rollups "
+                    "WHERE series = ? AND tier = ? AND bucket >= ? AND bucket < ? ORDER BY bucket",
+                    (series, tier, since // interval * interval, until),
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT timestamp, 1, value, value, value, value FROM samples "
+                    "WHERE series = ? AND timestamp >= ? AND timestamp < ? ORDER BY timestamp",
+                    (series, since, until),
+                ).fetchall()
+
+        columns = ("t", "count", "mean", "min", "max", "last")
+        result = {"tier": tier, "interval": interval, **{c: [] for c in columns}}
+        for row in rows:
+            for c, value in zip(columns, row):
+                result[c].append(value)
+        return result
+
+    def prune(self, now: float = None) -> int:
+        """Delete samples and buckets older than each tier's retention. Returns the number of rows deleted."""
+        now = time.time() if now is None else now
+        deleted = 0
+        with self._lock:
+            for tier, _ in TIERS:
+                keep = self.retention.get(tier)
+                if keep is None:
+                    continue
+                if tier == "raw":
+                    cutoff = max(now - keep, self._raw_pruned_before or 0)
+                    cursor = self._conn.execute("DELETE FROM samples WHERE timestamp < ?", (cutoff, ))
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO state (key, value) VALUES ('raw_pruned_before', ?)", (cutoff, )
+                    )
+                    self._raw_pruned_before = cutoff
+                else:
+                    cursor = self._conn.execute("DELETE FROM rollups WHERE tier = ? AND bucket < ?", (tier, now - keep))
+                deleted += cursor.rowcount
+        return deleted
+
+    def close(self):
+        self._conn.close()
@@ -11,9 +11,9 @@ import logging
 import sys
 import time
 
-from typing import Any
+from typing import Any, Optional
 
-from ...cloud.api import Client, Message
+from ...cloud.api import Client, Message, RollupStore
 
 from ...ui import UIManager
 
@@ -48,8 +48,11 @@ class ProcessorBase:
         self.log_channel_id: str = kwargs["log_channel"]
         self.task_id: str = kwargs["task_id"]
 
-        self.api: Client = Client(token=self.access_token, base_url=kwargs["api_endpoint"])
+        # a pre-built client can be passed in when running locally, eg. against a `LocalBroker`.
+        self.api: Client = kwargs.get("client") or Client(token=self.access_token, base_url=kwargs["api_endpoint"])
         self.ui_manager: UIManager = UIManager(self.agent_id, self.api)
+        # an optional `RollupStore` (passed in, or set in `setup`), which each invoking message is added to before `process`.
+        self.rollup_store: Optional[RollupStore] = kwargs.get("rollup_store")
         
         self._log_handler = LogHandler()
         log.addHandler(self._log_handler)
@@ -97,6 +100,12 @@ class ProcessorBase:
             self.import_modules()
             self.setup()
 
+            if self.rollup_store is not None and self.message is not None:
+                try:
+                    self.rollup_store.ingest_message(self.message)
+                except Exception as e:
+                    log.error(f"ERROR attempting to add message to rollup store: {e} ", exc_info=e)
+
             try:
                 self.process()
             except Exception as e:
@@ -113,6 +122,9 @@ class ProcessorBase:
         end_time = time.time()
         log.info(f"Finished at {end_time}. Process took {end_time - start_time} seconds.")
 
+        # don't leave our handler on the root logger, otherwise warm (or replayed) invocations pile them up.
+        log.removeHandler(self._log_handler)
+
         if self._log_handler.get_logs() and self.log_channel_id is not None:
             self.api.publish_to_channel(self.log_channel_id, self._log_handler.get_logs())
 
@@ -0,0 +1,48 @@
+import contextlib
+import importlib.util
+import logging
+import os
+import sys
+
+from types import ModuleType
+
+
+def load_module(package_dir: str, module_name: str = "target") -> ModuleType:
+    """Load ``<package_dir>/<module_name>.py`` from a processor package.
+
+    The package directory is appended to ``sys.path`` (once) so the target can import its sibling modules. It goes
+    last so a sibling can't shadow the standard library or pydoover (eg. a local ``logging.py``).
+    """
+    package_dir = os.path.abspath(package_dir)
+    if package_dir not in sys.path:
+        sys.path.append(package_dir)
+
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(package_dir, f"{module_name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_processor_class(package_dir: str, module_name: str = "target", class_name: str = "target") -> type:
+    return getattr(load_module(package_dir, module_name), class_name)
+
+
+@contextlib.contextmanager
+def task_logging(level: int = logging.DEBUG):
+    """Print log records at ``level`` while a task runs locally, then put the root logger back as it was."""
+    root = logging.getLogger()
+    previous = root.level
+    handler = None
+    if not root.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+        root.addHandler(handler)
+
+    root.setLevel(level)
+    try:
+        yield
+    finally:
+        root.setLevel(previous)
+        if handler is not None:
+            root.removeHandler(handler)
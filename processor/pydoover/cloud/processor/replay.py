@@ -0,0 +1,243 @@
+"""
+Replay a recorded log of channel messages through a processor, against a `LocalBroker`, and report throughput.
+
+The log is newline-delimited JSON, one message per line::
+
+    {"timestamp": 1715646840.25, "channel_name": "deployments", "payload": {...}}
+
+``agent_id`` is optional on each line (the replay agent is used by default), and ``channel`` / ``msg`` are accepted
+as aliases for ``channel_name`` / ``payload``.
+"""
+
+import json
+import logging
+import math
+import threading
+import time
+
+from datetime import datetime, timezone
+from typing import Any, Iterable, Optional, Union
+
+from ..api.local import LocalBroker
+from .loader import load_processor_class
+
+
+log = logging.getLogger(__name__)
+
+
+def read_message_log(fp: str) -> list[dict[str, Any]]:
+    messages = []
+    with open(fp, "r") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                data = json.loads(line)
+            except ValueError:
+                log.warning(f"Skipping invalid JSON on line {line_no} of {fp}.")
+                continue
+
+            messages.append({
+                "timestamp": float(data.get("timestamp") or 0),
+                "channel_name": data.get("channel_name") or data.get("channel"),
+                "agent_id": data.get("agent_id"),
+                "payload": data["payload"] if "payload" in data else data.get("msg"),
+            })
+
+    # replay in timestamp order, keeping the log order for equal timestamps.
+    messages.sort(key=lambda m: m["timestamp"])
+    return messages
+
+
+def percentile(values: list[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    # nearest-rank
+    ordered = sorted(values)
+    index = min(len(ordered), max(1, math.ceil(pct / 100 * len(ordered)))) - 1
+    return ordered[index]
+
+
+class _ErrorRecords(logging.Handler):
+    """Counts ERROR records logged from the current thread while attached."""
+
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+        self.thread = threading.get_ident()
+        self.count = 0
+
+    def emit(self, record: logging.LogRecord):
+        if record.thread == self.thread:
+            self.count += 1
+
+
+class ReplayReport:
+    def __init__(self, messages: int, duration: float, latencies: list[float], api_calls: list[int], errors: int):
+        self.messages = messages
+        self.duration = duration
+        self.latencies = latencies
+        self.api_calls = api_calls
+        self.errors = errors
+
+    @property
+    def invocations(self) -> int:
+        return len(self.latencies)
+
+    @property
+    def invocations_per_second(self) -> float:
+        return self.duration and self.invocations / self.duration or 0
+
+    @property
+    def api_calls_per_invocation(self) -> float:
+        return self.api_calls and sum(self.api_calls) / len(self.api_calls) or 0
+
+    def latency(self, pct: float) -> Optional[float]:
+        return percentile(self.latencies, pct)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "messages": self.messages,
+            "invocations": self.invocations,
+            "errors": self.errors,
+            "duration": self.duration,
+            "invocations_per_second": self.invocations_per_second,
+            "latency_p50": self.latency(50),
+            "latency_p90": self.latency(90),
+            "latency_p99": self.latency(99),
+            "latency_max": self.latencies and max(self.latencies) or None,
+            "api_calls_per_invocation": self.api_calls_per_invocation,
+        }
+
+    def format(self) -> str:
+        def ms(value):
+            return value is not None and f"{value * 1000:.2f}ms" or "-"
+
+        return (
+            f"Messages replayed:        {self.messages}\n"
+            f"Invocations:              {self.invocations} ({self.errors} errors)\n"
+            f"Duration:                 {self.duration:.3f}s\n"
+            f"Invocations per second:   {self.invocations_per_second:.1f}\n"
+            f"Latency p50 / p90 / p99:  {ms(self.latency(50))} / {ms(self.latency(90))} / {ms(self.latency(99))}\n"
+            f"Latency max:              {ms(self.latencies and max(self.latencies) or None)}\n"
+            f"API calls per invocation: {self.api_calls_per_invocation:.2f}"
+        )
+
+
+class ReplayHarness:
+    """Drive a processor through a recorded message log.
+
+    Parameters
+    ----------
+    processor: str or type
+        A processor package directory (containing ``target.py``), or a `ProcessorBase` subclass.
+    task_config: dict
+        The task's package config, as it would be deployed in doover_config.json.
+    snapshot: dict
+        Channel name to aggregate mapping used to seed the replay agent's channels, eg. a recorded ``ui_state``.
+    broker: LocalBroker
+        The backend to replay against. A new, empty broker is created by default.
+    """
+
+    task_name = "!replay"
+    processor_name = "#replay_processor"
+
+    def __init__(
+        self,
+        processor: Union[str, type],
+        task_config: dict[str, Any] = None,
+        agent_id: str = None,
+        deployment_config: dict[str, Any] = None,
+        snapshot: dict[str, Any] = None,
+        broker: LocalBroker = None,
+    ):
+        if isinstance(processor, type):
+            self.processor_cls = processor
+        else:
+            self.processor_cls = load_processor_class(processor)
+
+        self.broker = broker or LocalBroker(seed=0)
+        self.agent_id = self.broker.add_agent(agent_id, name="replay", deployment_config=deployment_config)
+        self.client = self.broker.client(self.agent_id)
+
+        for channel_name, aggregate in (snapshot or {}).items():
+            self.broker.add_channel(self.agent_id, channel_name, aggregate)
+
+        processor_id = self.broker.add_processor(self.agent_id, self.processor_name, self._invoke)
+        self.task = self.client.create_task(self.task_name, self.agent_id, processor_id)
+        if task_config:
+            self.task.publish(task_config)
+
+        self._subscribed = dict()
+        self._latencies = []
+        self._api_calls = []
+        self._errors = 0
+
+    def _invoke(self, **kwargs):
+        # `execute` logs (rather than raises) errors from setup and process, so count an invocation as failed if it
+        # logged an error. Processors log to the root logger.
+        errors = _ErrorRecords()
+        root = logging.getLogger()
+        root.addHandler(errors)
+
+        calls_before = self.broker.request_count
+        start = time.perf_counter()
+        try:
+            self.processor_cls(**kwargs).execute()
+        except Exception as e:
+            errors.count += 1
+            log.error(f"Processor raised during replay: {e}", exc_info=e)
+        finally:
+            root.removeHandler(errors)
+            if errors.count:
+                self._errors += 1
+            self._latencies.append(time.perf_counter() - start)
+            self._api_calls.append(self.broker.request_count - calls_before)
+
+    def _get_channel(self, agent_id: str, channel_name: str):
+        key = (agent_id, channel_name)
+        try:
+            return self._subscribed[key]
+        except KeyError:
+            pass
+
+        channel = self.client.create_channel(channel_name, agent_id)
+        self.task.subscribe_to_channel(channel.id)
+        self._subscribed[key] = channel
+        return channel
+
+    def run(self, messages: Iterable[dict[str, Any]], speed: Optional[float] = None) -> ReplayReport:
+        """Replay ``messages`` in order.
+
+        ``speed`` is a multiple of real time (1 replays at the recorded rate, 10 at ten times), or None to replay
+        as fast as possible.
+        """
+        messages = list(messages)
+        self._latencies, self._api_calls, self._errors = [], [], 0
+
+        # subscribe up-front so channel creation doesn't count against the replay.
+        for m in messages:
+            self._get_channel(m.get("agent_id") or self.agent_id, m["channel_name"])
+
+        start = time.perf_counter()
+        first_ts = messages and messages[0]["timestamp"] or 0
+
+        for m in messages:
+            if speed:
+                due = start + (m["timestamp"] - first_ts) / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+            channel = self._get_channel(m.get("agent_id") or self.agent_id, m["channel_name"])
+            timestamp = m["timestamp"] and datetime.fromtimestamp(m["timestamp"], tz=timezone.utc) or None
+            channel.publish(m["payload"], timestamp=timestamp)
+
+        self.broker.run_pending()
+        duration = time.perf_counter() - start
+        return ReplayReport(len(messages), duration, self._latencies, self._api_calls, self._errors)
+
+
+def replay(package_dir: str, log_file: str, speed: Optional[float] = None, **kwargs) -> ReplayReport:
+    harness = ReplayHarness(package_dir, **kwargs)
+    return harness.run(read_message_log(log_file), speed=speed)
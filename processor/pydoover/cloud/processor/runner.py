@@ -0,0 +1,179 @@
+"""
+A long-running local processor runner.
+
+The interpreter, imported modules and authenticated `Client` are kept warm between runs. The processor package
+directory is watched for changes, and only modules that changed are reloaded before the task is re-invoked.
+The task is also re-invoked whenever a new message arrives on any of the watched channels.
+"""
+
+import importlib
+import logging
+import os
+import sys
+import time
+
+from typing import Any, Optional
+
+from ..api import Client, Message
+from ..api.channel import Task
+from .loader import load_module, task_logging
+
+
+log = logging.getLogger(__name__)
+
+
+class LocalRunner:
+    """Re-invoke a task locally on code changes or new channel messages.
+
+    Parameters
+    ----------
+    task: Task
+        The task channel to run. Its aggregate is used as the package config, and its client is reused.
+    package_dir: str
+        The processor package directory, containing ``target.py``.
+    channel_names: list[str]
+        Channels (owned by the task's agent) to watch for new messages.
+    poll_interval: float
+        Seconds between checks for changed files.
+    message_poll_interval: float
+        Seconds between checks for new messages on the watched channels.
+    ignore: tuple[str]
+        Top-level directories in the package to neither watch nor reload (eg. a vendored pydoover).
+    log_level: int
+        Root log level while the task runs. The previous level is restored after each run.
+    """
+
+    def __init__(
+        self,
+        task: Task,
+        package_dir: str,
+        channel_names: list[str] = None,
+        agent_settings: dict[str, Any] = None,
+        poll_interval: float = 0.25,
+        message_poll_interval: float = 2,
+        ignore: tuple[str] = ("pydoover", "__pycache__"),
+        log_level: int = logging.DEBUG,
+    ):
+        self.task = task
+        self.client: Client = task.client
+        self.package_dir = os.path.abspath(package_dir)
+        self.agent_settings = agent_settings or {"deployment_config": {}}
+        self.poll_interval = poll_interval
+        self.message_poll_interval = message_poll_interval
+        self.ignore = ignore
+        self.log_level = log_level
+
+        self.channels = [self.client.get_channel_named(name, task.agent_id) for name in channel_names or []]
+        self._last_message_ids = dict()
+
+        self._mtimes = self._scan()
+        self._target = load_module(self.package_dir)
+        self.run_count = 0
+
+    def _scan(self) -> dict[str, float]:
+        mtimes = dict()
+        for root, dirs, files in os.walk(self.package_dir):
+            if root == self.package_dir:
+                dirs[:] = [d for d in dirs if d not in self.ignore]
+            dirs[:] = [d for d in dirs if d != "__pycache__"]
+
+            for fname in files:
+                if fname.endswith(".py"):
+                    fp = os.path.join(root, fname)
+                    try:
+                        mtimes[fp] = os.stat(fp).st_mtime_ns
+                    except OSError:
+                        pass
+        return mtimes
+
+    def _changed_files(self) -> list[str]:
+        mtimes = self._scan()
+        changed = [fp for fp, mtime in mtimes.items() if self._mtimes.get(fp) != mtime]
+        self._mtimes = mtimes
+        return changed
+
+    def reload(self, changed: list[str]):
+        changed = set(changed)
+
+        for name, module in list(sys.modules.items()):
+            fp = getattr(module, "__file__", None)
+            if fp and os.path.abspath(fp) in changed and module is not self._target:
+                log.info(f"Reloading {name}")
+                importlib.reload(module)
+
+        # the target holds references to whatever it imported, so always re-execute it after a change.
+        self._target = load_module(self.package_dir)
+
+    def _get_new_message(self) -> Optional[Message]:
+        for channel in self.channels:
+            messages = self.client.get_channel_messages(channel.id, num_messages=1)
+            message = messages[0] if messages else None
+
+            if channel.id not in self._last_message_ids:
+                # first check just records where we're up to; None for an empty channel, so its first message is new.
+                self._last_message_ids[channel.id] = message and message.id
+            elif message is not None and self._last_message_ids[channel.id] != message.id:
+                self._last_message_ids[channel.id] = message.id
+                return message
+
+    def run_once(self, msg_obj: dict[str, Any] = None, reason: str = "manual") -> float:
+        self.task.update()
+        processor_cls = getattr(self._target, "target")
+
+        start = time.perf_counter()
+        with task_logging(self.log_level):
+            processor = processor_cls(
+                agent_id=self.task.agent_id,
+                access_token=self.client.access_token.token,
+                api_endpoint=self.client.base_url,
+                package_config=self.task.aggregate or {},
+                msg_obj=msg_obj,
+                task_id=self.task.id,
+                log_channel=None,
+                agent_settings=self.agent_settings,
+                client=self.client,
+            )
+            # ProcessorBase sets the root logger to INFO when it's created.
+            logging.getLogger().setLevel(self.log_level)
+            processor.execute()
+        elapsed = time.perf_counter() - start
+
+        self.run_count += 1
+        print(f"[run {self.run_count}] {reason}: took {elapsed * 1000:.1f}ms")
+        return elapsed
+
+    def _safe_run(self, msg_obj: dict[str, Any] = None, reason: str = "manual"):
+        try:
+            self.run_once(msg_obj, reason=reason)
+        except Exception as e:
+            # keep the runner alive so the next change can fix it
+            log.error(f"Failed to run task: {e}", exc_info=e)
+
+    def watch(self, run_first: bool = True):
+        if run_first:
+            self._safe_run(reason="initial run")
+
+        # prime the last seen message for each channel
+        self._get_new_message()
+        last_message_check = time.monotonic()
+
+        while True:
+            time.sleep(self.poll_interval)
+
+            changed = self._changed_files()
+            if changed:
+                start = time.perf_counter()
+                try:
+                    self.reload(changed)
+                except Exception as e:
+                    print(f"Failed to reload changes: {e}")
+                    continue
+                reload_time = time.perf_counter() - start
+                names = ", ".join(os.path.relpath(fp, self.package_dir) for fp in changed)
+                self._safe_run(reason=f"changed {names} (reload {reload_time * 1000:.1f}ms)")
+
+            if self.channels and time.monotonic() - last_message_check > self.message_poll_interval:
+                last_message_check = time.monotonic()
+                message = self._get_new_message()
+                if message is not None:
+                    self._safe_run(message.to_dict(), reason=f"new message {message.id}")
@@ -0,0 +1,119 @@
+"""
+pydoover.codec
+~~~~~~~~~~~~~~
+JSON encoding and decoding using the fastest available backend: orjson, then ujson, then the stdlib.
+
+Every codec encodes NaN and infinite floats as ``null`` (the API rejects ``NaN`` / ``Infinity``), as orjson does.
+
+Use the module-level `dumps` and `loads`, which always go through the current codec. Set the codec with
+`set_codec("json")`, or the ``PYDOOVER_JSON_CODEC`` environment variable.
+"""
+
+import json
+import math
+import os
+
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+def _finite(obj: Any) -> Any:
+    """A copy of ``obj`` with NaN and infinite floats replaced by None."""
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {k: _finite(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(v) for v in obj]
+    return obj
+
+
+class JSONCodec:
+    """The stdlib `json` codec. Other codecs fall back to this for anything their backend can't encode."""
+
+    name = "json"
+
+    def dumps(self, obj: Any) -> bytes:
+        try:
+            return json.dumps(obj, allow_nan=False).encode("utf-8")
+        except ValueError:
+            # NaN or infinity somewhere; only pay for the copy when there is one.
+            return json.dumps(_finite(obj), allow_nan=False).encode("utf-8")
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        return json.loads(data)
+
+
+class OrjsonCodec(JSONCodec):
+    name = "orjson"
+
+    def __init__(self):
+        self._options = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(self, obj: Any) -> bytes:
+        try:
+            return orjson.dumps(obj, option=self._options)
+        except TypeError:
+            # eg. integers larger than 64 bits, or subclasses orjson doesn't know about.
+            return super().dumps(obj)
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        return orjson.loads(data)
+
+
+class UjsonCodec(JSONCodec):
+    name = "ujson"
+
+    def dumps(self, obj: Any) -> bytes:
+        try:
+            return ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False, allow_nan=False).encode("utf-8")
+        except (TypeError, OverflowError, ValueError):
+            return super().dumps(obj)
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        return ujson.loads(data)
+
+
+CODECS = {"json": JSONCodec}
+if ujson is not None:
+    CODECS["ujson"] = UjsonCodec
+if orjson is not None:
+    CODECS["orjson"] = OrjsonCodec
+
+
+def get_codec(name: str = None) -> JSONCodec:
+    """Get a codec by name, or the fastest one available if no name is given."""
+    if name is None:
+        for name in ("orjson", "ujson", "json"):
+            if name in CODECS:
+                break
+    try:
+        return CODECS[name]()
+    except KeyError:
+        raise ValueError(f"JSON codec {name} is not available. Available codecs: {', '.join(CODECS)}")
+
+
+codec = get_codec(os.environ.get("PYDOOVER_JSON_CODEC") or None)
+
+
+def set_codec(name: str = None) -> JSONCodec:
+    global codec
+    codec = get_codec(name)
+    return codec
+
+
+def dumps(obj: Any) -> bytes:
+    return codec.dumps(obj)
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    return codec.loads(data)
@@ -0,0 +1,169 @@
+"""
+pydoover.health
+~~~~~~~~~~~~~~~
+Vectorised online / late / offline evaluation of `ConnectionInfo` settings across a fleet of agents.
+
+For a periodic connection, the first connection is expected ``next_connection`` (or, if unset,
+``connection_period``) seconds after the agent was last seen, then every ``connection_period`` seconds after that.
+Each expected connection that has passed is a miss. An agent is:
+
+- online if it hasn't missed a connection,
+- late if it has missed at least one, but no more than ``allowed_misses`` and not for longer than ``offline_after``,
+- offline once it has missed more than ``allowed_misses``, been unseen for more than ``offline_after`` seconds, or
+  has never been seen.
+
+When neither ``allowed_misses`` nor ``offline_after`` is set, ``DEFAULT_ALLOWED_MISSES`` is used.
+Constant connections are online until unseen for ``offline_after`` (or the fleet's ``constant_offline_after``).
+"""
+
+import time
+
+from collections import namedtuple
+from typing import TYPE_CHECKING, Any, Optional, Union
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+if TYPE_CHECKING:
+    from .ui.element import ConnectionInfo
+
+
+ONLINE, LATE, OFFLINE = 0, 1, 2
+STATE_NAMES = ("online", "late", "offline")
+DEFAULT_ALLOWED_MISSES = 1
+
+HealthReport = namedtuple("HealthReport", ["agent_ids", "states", "missed", "transitions"])
+# agent_id, previous state name (None on first evaluation), new state name
+Transition = namedtuple("Transition", ["agent_id", "previous", "state"])
+
+
+def _connection_params(info: Union["ConnectionInfo", dict[str, Any]]) -> tuple:
+    """(periodic, connection_period, next_connection, offline_after, allowed_misses) from a `ConnectionInfo` or its
+    ``to_dict()`` form (eg. as found in ui_state)."""
+    if isinstance(info, dict):
+        kind = info.get("connectionType", "constant")
+        values = (info.get(k) for k in ("connectionPeriod", "nextConnection", "offlineAfter", "allowedMisses"))
+    else:
+        kind = getattr(info.connection_type, "value", info.connection_type)
+        values = (info.connection_period, info.next_connection, info.offline_after, info.allowed_misses)
+    return (kind == "periodic", *(np.nan if v is None else float(v) for v in values))
+
+
+class FleetHealth:
+    """Connection health for many agents, evaluated in one vectorised pass.
+
+    Parameters
+    ----------
+    constant_offline_after: float
+        Seconds unseen before an agent with a constant connection (and no ``offline_after``) is offline.
+    """
+
+    def __init__(self, constant_offline_after: float = 300):
+        if np is None:
+            raise RuntimeError("FleetHealth requires numpy to be installed.")
+
+        self.constant_offline_after = constant_offline_after
+        self.agent_ids: list[str] = []
+        self._index: dict[str, int] = {}
+
+        self._periodic = np.zeros(0, dtype=bool)
+        self._period = np.zeros(0)
+        self._next_connection = np.zeros(0)
+        self._offline_after = np.zeros(0)
+        self._allowed_misses = np.zeros(0)
+        self._last_seen = np.zeros(0)
+        self._states = np.zeros(0, dtype=np.int8)
+        self._evaluated = np.zeros(0, dtype=bool)
+
+    def __len__(self):
+        return len(self.agent_ids)
+
+    def set_agents(self, connection_info: dict[str, Union["ConnectionInfo", dict[str, Any]]]):
+        """Add (or update the connection settings of) agents, from a dict of agent ID: `ConnectionInfo`."""
+        new = [a for a in connection_info if a not in self._index]
+        if new:
+            start = len(self.agent_ids)
+            self.agent_ids.extend(new)
+            self._index.update({a: start + i for i, a in enumerate(new)})
+
+            grow = len(new)
+            self._periodic = np.concatenate([self._periodic, np.zeros(grow, dtype=bool)])
+            self._period = np.concatenate([self._period, np.full(grow, np.nan)])
+            self._next_connection = np.concatenate([self._next_connection, np.full(grow, np.nan)])
+            self._offline_after = np.concatenate([self._offline_after, np.full(grow, np.nan)])
+            self._allowed_misses = np.concatenate([self._allowed_misses, np.full(grow, np.nan)])
+            self._last_seen = np.concatenate([self._last_seen, np.full(grow, np.nan)])
+            # never seen, so offline until evaluated otherwise.
+            self._states = np.concatenate([self._states, np.full(grow, OFFLINE, dtype=np.int8)])
+            self._evaluated = np.concatenate([self._evaluated, np.zeros(grow, dtype=bool)])
+
+        for agent_id, info in connection_info.items():
+            i = self._index[agent_id]
+            (
+                self._periodic[i], self._period[i], self._next_connection[i],
+                self._offline_after[i], self._allowed_misses[i],
+            ) = _connection_params(info)
+
+    def set_last_seen(self, last_seen: dict[str, float]):
+        """Update when agents were last seen (unix time). Unknown agents are added with a constant connection."""
+        unknown = [a for a in last_seen if a not in self._index]
+        if unknown:
+            self.set_agents({a: {} for a in unknown})
+
+        index = np.fromiter((self._index[a] for a in last_seen), dtype=np.int64, count=len(last_seen))
+        self._last_seen[index] = np.fromiter(last_seen.values(), dtype=np.float64, count=len(last_seen))
+
+    def evaluate(self, now: Optional[float] = None) -> HealthReport:
+        """Compute every agent's state and missed-connection count, and the state changes since the last call."""
+        now = time.time() if now is None else now
+        age = now - self._last_seen
+        never_seen = np.isnan(self._last_seen)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            # periodic: count the expected connections that have passed since the agent was last seen.
+            first_expected = np.where(np.isnan(self._next_connection), self._period, self._next_connection)
+            overdue = age - first_expected
+            missed = np.where(
+                overdue >= 0,
+                np.floor(overdue / np.where(self._period > 0, self._period, np.inf)) + 1,
+                0,
+            )
+            missed = np.where(self._periodic & ~never_seen & ~np.isnan(missed), missed, 0).astype(np.int64)
+
+            no_limits = np.isnan(self._allowed_misses) & np.isnan(self._offline_after)
+            allowed = np.where(no_limits, DEFAULT_ALLOWED_MISSES, self._allowed_misses)
+            periodic_offline = (missed > allowed) | (age > self._offline_after)
+
+            constant_after = np.where(np.isnan(self._offline_after), self.constant_offline_after, self._offline_after)
+            constant_offline = age > constant_after
+
+        offline = never_seen | np.where(self._periodic, periodic_offline, constant_offline)
+        states = np.where(offline, OFFLINE, np.where(missed > 0, LATE, ONLINE)).astype(np.int8)
+
+        changed = np.flatnonzero((states != self._states) | ~self._evaluated)
+        transitions = [
+            Transition(
+                self.agent_ids[i],
+                STATE_NAMES[self._states[i]] if self._evaluated[i] else None,
+                STATE_NAMES[states[i]],
+            )
+            for i in changed
+        ]
+
+        self._states = states
+        self._evaluated[:] = True
+        return HealthReport(self.agent_ids, states, missed, transitions)
+
+    def state_of(self, agent_id: str) -> Optional[str]:
+        """The state name for an agent as of the last `evaluate`, or None if it was added since."""
+        i = self._index[agent_id]
+        if not self._evaluated[i]:
+            return None
+        return STATE_NAMES[self._states[i]]
+
+    def summary(self) -> dict[str, int]:
+        """Number of agents in each state, as of the last `evaluate`."""
+        counts = np.bincount(self._states[self._evaluated], minlength=len(STATE_NAMES))
+        return dict(zip(STATE_NAMES, counts.tolist()))
@@ -0,0 +1,303 @@
+"""
+pydoover.rolling
+~~~~~~~~~~~~~~~~
+Incremental, bucketed rolling-window statistics for telemetry (eg. flow rate in 10 minute buckets).
+
+Each metric keeps a ring of fixed-width time buckets in NumPy arrays (count, sum, min, max and the first and last
+sample), so adding a sample is O(1) however large the window. Samples are placed by their own timestamp, so
+out-of-order and late samples update the bucket they belong to without recomputing anything; samples older than
+the window are dropped and counted in ``late_dropped``.
+
+Windows can be saved with ``to_dict()`` (eg. into a channel aggregate) and restored with ``from_dict()``, so
+short-lived processors can carry them between invocations.
+"""
+
+import math
+
+from typing import Any, Optional
+
+from .utils import get_path
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class RollingWindow:
+    """Rolling statistics for one metric, over ``num_buckets`` buckets of ``bucket_seconds`` each.
+
+    Parameters
+    ----------
+    bucket_seconds: float
+        Width of each bucket, in seconds.
+    num_buckets: int
+        Number of buckets in the window. The window covers ``bucket_seconds * num_buckets`` seconds, ending with
+        the bucket of the newest sample.
+    target: float
+        Optional target value, used for ``deviation`` in `stats`.
+    """
+
+    _FIELDS = ("count", "sum", "min", "max", "first_ts", "first_value", "last_ts", "last_value")
+
+    def __init__(self, bucket_seconds: float = 600, num_buckets: int = 30, target: Optional[float] = None):
+        if np is None:
+            raise RuntimeError("RollingWindow requires numpy to be installed.")
+
+        self.bucket_seconds = bucket_seconds
+        self.num_buckets = num_buckets
+        self.target = target
+        self.late_dropped = 0
+
+        # the absolute bucket number (timestamp // bucket_seconds) held in each slot, or -1 if never used.
+        self._bucket_ids = np.full(num_buckets, -1, dtype=np.int64)
+        self._newest = None
+
+        self._count = np.zeros(num_buckets, dtype=np.int64)
+        self._sum = np.zeros(num_buckets)
+        self._min = np.full(num_buckets, np.inf)
+        self._max = np.full(num_buckets, -np.inf)
+        self._first_ts = np.full(num_buckets, np.inf)
+        self._first_value = np.full(num_buckets, np.nan)
+        self._last_ts = np.full(num_buckets, -np.inf)
+        self._last_value = np.full(num_buckets, np.nan)
+
+    def _reset(self, slots, bucket_ids):
+        self._bucket_ids[slots] = bucket_ids
+        self._count[slots] = 0
+        self._sum[slots] = 0
+        self._min[slots] = np.inf
+        self._max[slots] = -np.inf
+        self._first_ts[slots] = np.inf
+        self._first_value[slots] = np.nan
+        self._last_ts[slots] = -np.inf
+        self._last_value[slots] = np.nan
+
+    def add(self, timestamp: float, value: float) -> bool:
+        """Add a sample. Returns False if it was older than the window and dropped."""
+        if value is None or math.isnan(value):
+            return False
+
+        bucket = int(timestamp // self.bucket_seconds)
+        if self._newest is None or bucket > self._newest:
+            self._newest = bucket
+        elif bucket <= self._newest - self.num_buckets:
+            self.late_dropped += 1
+            return False
+
+        slot = bucket % self.num_buckets
+        if self._bucket_ids[slot] != bucket:
+            # the slot holds an expired bucket; reuse it.
+            self._reset(slot, bucket)
+
+        self._count[slot] += 1
+        self._sum[slot] += value
+        if value < self._min[slot]:
+            self._min[slot] = value
+        if value > self._max[slot]:
+            self._max[slot] = value
+        if timestamp < self._first_ts[slot]:
+            self._first_ts[slot] = timestamp
+            self._first_value[slot] = value
+        if timestamp >= self._last_ts[slot]:
+            self._last_ts[slot] = timestamp
+            self._last_value[slot] = value
+        return True
+
+    def add_many(self, timestamps, values) -> int:
+        """Add many samples at once (vectorised), in any order. Returns the number added."""
+        ts = np.asarray(timestamps, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        ok = ~(np.isnan(ts) | np.isnan(values))
+        ts, values = ts[ok], values[ok]
+        if not len(ts):
+            return 0
+
+        buckets = np.floor_divide(ts, self.bucket_seconds).astype(np.int64)
+        newest = int(buckets.max()) if self._newest is None else max(self._newest, int(buckets.max()))
+        keep = buckets > newest - self.num_buckets
+        self.late_dropped += int((~keep).sum())
+        ts, values, buckets = ts[keep], values[keep], buckets[keep]
+        self._newest = newest
+
+        # the kept buckets span at most num_buckets consecutive buckets, so each slot maps to a single bucket.
+        slots = buckets % self.num_buckets
+        unique_slots, index = np.unique(slots, return_index=True)
+        stale = self._bucket_ids[unique_slots] != buckets[index]
+        self._reset(unique_slots[stale], buckets[index][stale])
+
+        np.add.at(self._count, slots, 1)
+        np.add.at(self._sum, slots, values)
+        np.minimum.at(self._min, slots, values)
+        np.maximum.at(self._max, slots, values)
+
+        # the earliest and latest sample per slot, from a (slot, timestamp) sort.
+        order = np.lexsort((ts, slots))
+        sorted_slots = slots[order]
+        starts = np.r_[0, np.flatnonzero(np.diff(sorted_slots)) + 1]
+        ends = np.r_[starts[1:], len(order)] - 1
+        group_slots = sorted_slots[starts]
+
+        first, last = order[starts], order[ends]
+        earlier = ts[first] < self._first_ts[group_slots]
+        self._first_ts[group_slots[earlier]] = ts[first][earlier]
+        self._first_value[group_slots[earlier]] = values[first][earlier]
+        later = ts[last] >= self._last_ts[group_slots]
+        self._last_ts[group_slots[later]] = ts[last][later]
+        self._last_value[group_slots[later]] = values[last][later]
+        return len(ts)
+
+    def _window(self, now: Optional[float] = None):
+        """Bucket numbers in the window (oldest first), their slots, and whether each has samples."""
+        newest = self._newest if now is None else int(now // self.bucket_seconds)
+        buckets = np.arange(newest - self.num_buckets + 1, newest + 1)
+        slots = buckets % self.num_buckets
+        valid = (self._bucket_ids[slots] == buckets) & (self._count[slots] > 0)
+        return buckets, slots, valid
+
+    def stats(self, now: Optional[float] = None) -> dict[str, Any]:
+        """Statistics over the whole window: count, mean, min, max, deviation from target and rate of change.
+
+        ``rate`` is the change per second between the earliest and latest samples in the window. The window ends
+        at the newest sample's bucket, or at ``now`` if given.
+        """
+        result = {"count": 0, "mean": None, "min": None, "max": None, "deviation": None, "rate": None}
+        if self._newest is None:
+            return result
+
+        _, slots, valid = self._window(now)
+        slots = slots[valid]
+        count = int(self._count[slots].sum())
+        if not count:
+            return result
+
+        mean = float(self._sum[slots].sum() / count)
+        result.update(count=count, mean=mean, min=float(self._min[slots].min()), max=float(self._max[slots].max()))
+        if self.target is not None:
+            result["deviation"] = mean - self.target
+
+        first, last = slots[self._first_ts[slots].argmin()], slots[self._last_ts[slots].argmax()]
+        elapsed = self._last_ts[last] - self._first_ts[first]
+        if elapsed > 0:
+            result["rate"] = float((self._last_value[last] - self._first_value[first]) / elapsed)
+        return result
+
+    def series(self, stats: tuple[str, ...] = ("mean", ), now: Optional[float] = None, precision: int = 3) -> dict[str, Any]:
+        """A compact, publishable per-bucket series, oldest first. Empty buckets are None.
+
+        eg. ``{"start": 1718000400, "interval": 600, "mean": [4.1, None, 4.3, ...]}``
+        """
+        if self._newest is None:
+            return {"start": None, "interval": self.bucket_seconds, **{s: [] for s in stats}}
+
+        buckets, slots, valid = self._window(now)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            columns = {
+                "mean": self._sum[slots] / self._count[slots],
+                "min": self._min[slots],
+                "max": self._max[slots],
+                "count": self._count[slots],
+            }
+
+        result = {"start": int(buckets[0] * self.bucket_seconds), "interval": self.bucket_seconds}
+        for name in stats:
+            values = np.round(columns[name], precision)
+            result[name] = [v.item() if ok else None for v, ok in zip(values, valid)]
+        return result
+
+    def to_dict(self) -> dict[str, Any]:
+        """The window's state (only buckets with samples), for saving between processor invocations."""
+        buckets = {}
+        if self._newest is not None:
+            window, slots, valid = self._window()
+            columns = [getattr(self, f"_{name}") for name in self._FIELDS]
+            for bucket, slot in zip(window[valid], slots[valid]):
+                buckets[str(int(bucket))] = [c[slot].item() for c in columns]
+
+        return {
+            "bucket_seconds": self.bucket_seconds,
+            "num_buckets": self.num_buckets,
+            "target": self.target,
+            "newest": self._newest,
+            "late_dropped": self.late_dropped,
+            "buckets": buckets,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "RollingWindow":
+        window = cls(data["bucket_seconds"], data["num_buckets"], data.get("target"))
+        window._newest = data.get("newest")
+        window.late_dropped = data.get("late_dropped", 0)
+        for bucket, values in data.get("buckets", {}).items():
+            bucket = int(bucket)
+            slot = bucket % window.num_buckets
+            window._bucket_ids[slot] = bucket
+            for name, value in zip(cls._FIELDS, values):
+                getattr(window, f"_{name}")[slot] = value
+        return window
+
+
+class KPIEngine:
+    """Rolling windows for several metrics, fed from telemetry payloads.
+
+    Parameters
+    ----------
+    fields: dict[str, str]
+        Metric name: dotted path to its value in a telemetry payload, eg. ``{"flow_rate": "pump.flow_rate"}``.
+    bucket_seconds, num_buckets:
+        See `RollingWindow`.
+    targets: dict[str, float]
+        Metric name: target value.
+    """
+
+    def __init__(
+        self,
+        fields: dict[str, str],
+        bucket_seconds: float = 600,
+        num_buckets: int = 30,
+        targets: dict[str, float] = None,
+    ):
+        self.fields = {metric: tuple(path.split(".")) for metric, path in fields.items()}
+        targets = targets or {}
+        self.windows = {
+            metric: RollingWindow(bucket_seconds, num_buckets, targets.get(metric)) for metric in self.fields
+        }
+
+    def __getitem__(self, metric: str) -> RollingWindow:
+        return self.windows[metric]
+
+    def ingest(self, payload: dict[str, Any], timestamp: float):
+        """Add the values of every configured metric present in ``payload``."""
+        for metric, path in self.fields.items():
+            value = get_path(payload, path)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                self.windows[metric].add(timestamp, value)
+
+    def ingest_message(self, message):
+        """Add a `Message` (or a `MessageBatch`, vectorised) of telemetry."""
+        if hasattr(message, "field"):
+            for metric, path in self.fields.items():
+                self.windows[metric].add_many(message.timestamps, message.field(path))
+        else:
+            self.ingest(message.fetch_payload() or {}, message.timestamp)
+
+    def set_target(self, metric: str, target: Optional[float]):
+        self.windows[metric].target = target
+
+    def stats(self, now: Optional[float] = None) -> dict[str, dict[str, Any]]:
+        return {metric: window.stats(now) for metric, window in self.windows.items()}
+
+    def series(self, stats: tuple[str, ...] = ("mean", ), now: Optional[float] = None, precision: int = 3) -> dict[str, Any]:
+        return {metric: window.series(stats, now, precision) for metric, window in self.windows.items()}
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "fields": {metric: ".".join(path) for metric, path in self.fields.items()},
+            "windows": {metric: window.to_dict() for metric, window in self.windows.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "KPIEngine":
+        engine = cls(data["fields"])
+        engine.windows = {metric: RollingWindow.from_dict(w) for metric, w in data["windows"].items()}
+        return engine
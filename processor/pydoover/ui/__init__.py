@@ -1,6 +1,8 @@
+from .dispatch import CallbackDispatcher
 from .element import *
 from .interaction import *
 from .manager import UIManager
+from .async_manager import AsyncUIManager
 from .misc import *
 from .parameter import *
 from .submodule import *
@@ -0,0 +1,252 @@
+import asyncio
+import copy
+import inspect
+import logging
+import time
+from datetime import datetime
+
+from typing import TYPE_CHECKING, Any, Optional, Union
+
+from .dispatch import CallbackDispatcher
+from .interaction import SlimCommand
+from .manager import UIManager, ShouldPushUpdate
+
+from ..cloud.api import Client
+
+if TYPE_CHECKING:
+    from ..docker.device_agent.device_agent import device_agent_iface
+
+
+log = logging.getLogger(__name__)
+
+
+async def _maybe_await(result):
+    if inspect.isawaitable(result):
+        return await result
+    return result
+
+
+class AsyncUIManager(UIManager):
+    """A `UIManager` for asyncio applications.
+
+    `push`, `pull` and `handle_comms` are coroutines. With an HTTP `Client` the blocking requests run in a thread;
+    a persistent (DDA) client's methods may be plain functions or coroutines.
+
+    `start_comms` must be awaited from the application's event loop. It sets up subscriptions (whose updates are
+    always handled on that loop, even if the client delivers them from another thread), and starts a push task
+    which calls `handle_comms` every ``push_interval`` seconds, or straight away when something critical changes.
+    Changes made between pushes are merged into the next one.
+
+    Interaction callbacks run on a `CallbackDispatcher` on the loop, so coroutine callbacks are awaited and a slow
+    callback doesn't hold up other commands.
+
+    Parameters
+    ----------
+    push_interval: float
+        Seconds between push task checks. None to not start a push task.
+
+    See `UIManager` for the other parameters.
+    """
+
+    def __init__(
+        self,
+        agent_id: str = None,
+        client: Union[Client, "device_agent_iface"] = None,
+        min_ui_update_period: int = 600,
+        min_observed_update_period: int = 4,
+        callback_dispatcher: CallbackDispatcher = None,
+        push_interval: Optional[float] = 1,
+    ):
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._push_wakeup: Optional[asyncio.Event] = None
+        self._push_task: Optional[asyncio.Task] = None
+        self.push_interval = push_interval
+
+        # comms are started by awaiting `start_comms`, rather than with auto_start.
+        super().__init__(
+            agent_id, client, auto_start=False, min_ui_update_period=min_ui_update_period,
+            min_observed_update_period=min_observed_update_period, callback_dispatcher=callback_dispatcher,
+        )
+
+    @property
+    def _has_critical_interaction_pending(self) -> bool:
+        return self._critical_pending
+
+    @_has_critical_interaction_pending.setter
+    def _has_critical_interaction_pending(self, value: bool):
+        self._critical_pending = value
+        if value:
+            self.request_push()
+
+    def request_push(self):
+        """Wake the push task. Safe to call from any thread."""
+        if self.loop is None or self._push_wakeup is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+
+        if running is self.loop:
+            self._push_wakeup.set()
+        else:
+            self.loop.call_soon_threadsafe(self._push_wakeup.set)
+
+    async def start_comms(self):
+        self.loop = asyncio.get_running_loop()
+        if self.callback_dispatcher is None:
+            self.callback_dispatcher = CallbackDispatcher(loop=self.loop)
+
+        if self._has_persistent_connection:
+            self._setup_subscriptions()
+
+        if self.push_interval is not None and self._push_task is None:
+            self._push_wakeup = asyncio.Event()
+            self._push_task = asyncio.create_task(self._run_push_task())
+
+    async def close(self):
+        if self._push_task is not None:
+            self._push_task.cancel()
+            try:
+                await self._push_task
+            except asyncio.CancelledError:
+                pass
+            self._push_task = None
+
+    async def _run_push_task(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._push_wakeup.wait(), self.push_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._push_wakeup.clear()
+
+            try:
+                await self.handle_comms()
+            except Exception as e:
+                log.error("Error pushing UI state: %s", e, exc_info=e)
+
+    ## subscriptions
+
+    def _deliver(self, handler):
+        # the client may call us from its own thread; always handle updates on our loop.
+        def deliver(channel_name, aggregate):
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+
+            if running is self.loop:
+                return self.loop.create_task(handler(channel_name, aggregate))
+            return asyncio.run_coroutine_threadsafe(handler(channel_name, aggregate), self.loop)
+
+        return deliver
+
+    def _setup_subscriptions(self):
+        if self.client is None:
+            log.warning("Attempted to setup subscriptions without client being set")
+            return
+
+        log.info("Setting up dda subscriptions")
+        self.client.add_subscription("ui_state", self._deliver(self.on_state_update))
+        self.client.add_subscription("ui_state@wss_connections", self._deliver(self.on_state_wss_update))
+        self.client.add_subscription("ui_cmds", self._deliver(self.on_command_update))
+
+        self._subscriptions_ready = True
+
+    async def on_state_update(self, _, aggregate: dict[str, Any]):
+        self._set_new_ui_state(aggregate)
+
+    async def on_state_wss_update(self, _, aggregate: dict[str, Any]):
+        was_observed = self.is_being_observed()
+        self.last_ui_state_wss_connections = aggregate
+        self.last_ui_state_wss_connections_update = time.time()
+        if self.is_being_observed() and not was_observed:
+            # someone's started watching; give them fresh state rather than waiting for the next period.
+            self.request_push()
+
+    async def on_command_update(self, _, aggregate: dict[str, Any]):
+        prev_agg = copy.deepcopy(self.last_ui_cmds)
+        aggregate = self._set_new_ui_cmds(aggregate)
+
+        # call all subscribed to cmds updates
+        for c in self._cmds_subscriptions:
+            await _maybe_await(c())
+
+        # add commands that don't currently exist
+        to_add = {k: v for k, v in aggregate.items() if k not in self._interactions}
+        for name, current_value in to_add.items():
+            self._interactions[name] = SlimCommand(name, current_value)
+
+        # work out command diff and call individual commands
+        changed = {c: v for c, v in aggregate.items() if v != prev_agg.get(c)}
+        for command_name, new_value in changed.items():
+            command = self.get_command(command_name)
+            if command is not None:
+                command._handle_new_value(new_value, dispatcher=self.callback_dispatcher)
+
+    ## comms
+
+    async def _get_aggregate(self, channel_name: str):
+        if isinstance(self.client, Client):
+            channel = await asyncio.to_thread(self.client.get_channel_named, channel_name, self.agent_id)
+            return await asyncio.to_thread(channel.fetch_aggregate)
+        return await _maybe_await(self.client.get_channel_aggregate(channel_name))
+
+    async def _publish_to_channel(self, channel_name: str, data: dict[str, Any], record_log: bool = True, timestamp: Optional[datetime] = None, **kwargs):
+        if isinstance(self.client, Client):
+            return await asyncio.to_thread(
+                super()._publish_to_channel, channel_name, data, record_log=record_log, timestamp=timestamp, **kwargs
+            )
+        return await _maybe_await(self.client.publish_to_channel(channel_name, data, record_log=record_log, **kwargs))
+
+    async def pull(self):
+        ui_cmds_agg, ui_state_agg = await asyncio.gather(self._get_aggregate("ui_cmds"), self._get_aggregate("ui_state"))
+        self._set_new_ui_state(ui_state_agg)
+        await self.on_command_update(None, ui_cmds_agg)
+
+    async def push(self, record_log: bool = True, should_remove: bool = True, timestamp: Optional[datetime] = None, even_if_empty: bool = False) -> bool:
+        if self._has_persistent_connection:
+            if not self._is_conn_ready():
+                log.warning("Attempted to push config without ready connection client.")
+                return False
+            elif not await _maybe_await(self.client.get_has_dda_been_online()):
+                log.warning("Attempted to push config without DDA being online.")
+                return False
+            elif self.last_ui_state_update is None:
+                log.warning("Waiting for UI state update to be pulled before pushing...")
+                return False
+            elif self.last_ui_cmds_update is None:
+                log.warning("Waiting for UI commands to be pulled before pushing...")
+                return False
+        else:
+            await self.pull()  # do a pull before HTTP client pushes anything...
+
+        # work out both diffs before publishing, so the state published is from a single point in time.
+        commands_update = self._get_commands_update()
+        ui_state_update = self._get_ui_state_update(should_remove=should_remove)
+        if ui_state_update is None and even_if_empty:
+            ui_state_update = {}
+
+        publishes = []
+        if commands_update is not None:
+            publishes.append(self._publish_to_channel("ui_cmds", {"cmds": commands_update}, timestamp=timestamp))
+        if ui_state_update is not None:
+            publishes.append(self._publish_to_channel("ui_state", ui_state_update, record_log=record_log, timestamp=timestamp))
+        await asyncio.gather(*publishes)
+
+        self._last_pushed_time = time.time()
+        self._critical_pending = False
+        return True
+
+    async def handle_comms(self, force_log: bool = False):
+        should_push = self._should_push_update()
+
+        if force_log is False and should_push is ShouldPushUpdate.do_nothing:
+            return  # don't need to push anything yet...
+
+        await self.push(record_log=force_log or should_push is ShouldPushUpdate.push_and_log)
+
+    async def clear_ui(self):
+        log.info("Clearing UI")
+        await self._publish_to_channel("ui_state", {"state": None})
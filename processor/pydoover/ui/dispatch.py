@@ -0,0 +1,161 @@
+import asyncio
+import inspect
+import logging
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Optional
+
+from ..cloud.api.metrics import ClientMetrics
+
+if TYPE_CHECKING:
+    from .interaction import Interaction
+
+
+log = logging.getLogger(__name__)
+
+
+class CallbackDispatcher:
+    """Run interaction callbacks off the thread that delivered the command update.
+
+    Callbacks run on a thread pool, or on an asyncio event loop if ``loop`` is given (coroutine callbacks are
+    awaited there, plain functions are run in the pool). Each interaction has at most one callback running at a time;
+    values that arrive while it runs are coalesced, so only the latest is delivered next.
+
+    A callback that runs for longer than its timeout (``Interaction.callback_timeout``, or ``default_timeout``) is
+    logged and counted. Coroutines are cancelled, and the interaction's next value runs straight away. Threads can't
+    be cancelled, so a timed out function callback keeps the interaction busy until it returns; its next value
+    runs then.
+
+    Parameters
+    ----------
+    max_workers: int
+        Size of the thread pool.
+    default_timeout: float
+        Timeout (seconds) for interactions without their own ``callback_timeout``. None for no timeout.
+    loop: asyncio.AbstractEventLoop
+        Event loop to run callbacks on, eg. when the application is async.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        default_timeout: Optional[float] = None,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+    ):
+        self.default_timeout = default_timeout
+        self.loop = loop
+        self.metrics = ClientMetrics()
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ui-callback")
+        self._lock = threading.Lock()
+        # interaction name: token of its running callback, and (interaction, latest value) waiting to run after it.
+        self._active: dict[str, object] = {}
+        self._pending: dict[str, tuple["Interaction", Any]] = {}
+
+    def dispatch(self, interaction: "Interaction", value: Any):
+        """Run ``interaction``'s callback with ``value``, or queue it (replacing any queued value) if one is running."""
+        name = interaction.name
+        with self._lock:
+            self.metrics.incr("dispatched")
+            if name in self._active:
+                if name in self._pending:
+                    self.metrics.incr("coalesced")
+                self._pending[name] = (interaction, value)
+                return
+
+            self._active[name] = token = object()
+        self._start(interaction, value, token)
+
+    def _timeout_for(self, interaction: "Interaction") -> Optional[float]:
+        timeout = getattr(interaction, "callback_timeout", None)
+        return self.default_timeout if timeout is None else timeout
+
+    def _start(self, interaction: "Interaction", value: Any, token: object):
+        if self.loop is not None:
+            asyncio.run_coroutine_threadsafe(self._run_async(interaction, value, token), self.loop)
+        else:
+            self._executor.submit(self._run, interaction, value, token)
+
+    def _run(self, interaction: "Interaction", value: Any, token: object):
+        timeout = self._timeout_for(interaction)
+        timer = None
+        if timeout is not None:
+            timer = threading.Timer(timeout, self._on_timeout, (interaction, token, timeout))
+            timer.daemon = True
+            timer.start()
+
+        start = time.perf_counter()
+        try:
+            result = interaction.callback(value)
+            if inspect.isawaitable(result):
+                # a coroutine callback without an event loop to run it on.
+                asyncio.run(_await(result))
+        except Exception as e:
+            self.metrics.incr("errors")
+            log.error("Error in callback for %s: %s", interaction.name, e, exc_info=e)
+        finally:
+            if timer is not None:
+                timer.cancel()
+            self.metrics.observe(interaction.name, time.perf_counter() - start)
+            self._finish(interaction.name, token)
+
+    async def _run_async(self, interaction: "Interaction", value: Any, token: object):
+        timeout = self._timeout_for(interaction)
+        start = time.perf_counter()
+        try:
+            if inspect.iscoroutinefunction(interaction.callback):
+                try:
+                    await asyncio.wait_for(interaction.callback(value), timeout)
+                except asyncio.TimeoutError:
+                    self.metrics.incr("timeouts")
+                    log.error("Callback for %s took longer than %ss, cancelled it.", interaction.name, timeout)
+            else:
+                future = asyncio.get_running_loop().run_in_executor(self._executor, interaction.callback, value)
+                try:
+                    await asyncio.wait_for(asyncio.shield(future), timeout)
+                except asyncio.TimeoutError:
+                    self.metrics.incr("timeouts")
+                    log.error("Callback for %s took longer than %ss, waiting for it to finish.", interaction.name, timeout)
+                    # the thread can't be stopped; don't start the next value until it has.
+                    await future
+        except Exception as e:
+            self.metrics.incr("errors")
+            log.error("Error in callback for %s: %s", interaction.name, e, exc_info=e)
+        finally:
+            self.metrics.observe(interaction.name, time.perf_counter() - start)
+            self._finish(interaction.name, token)
+
+    def _on_timeout(self, interaction: "Interaction", token: object, timeout: float):
+        # the callback's thread can't be stopped, so the next value still waits for it to return.
+        self.metrics.incr("timeouts")
+        log.error("Callback for %s took longer than %ss, still waiting for it to finish.", interaction.name, timeout)
+
+    def _finish(self, name: str, token: object):
+        with self._lock:
+            if self._active.get(name) is not token:
+                return
+
+            queued = self._pending.pop(name, None)
+            if queued is None:
+                del self._active[name]
+                return
+            self._active[name] = token = object()
+        self._start(*queued, token)
+
+    @property
+    def busy(self) -> bool:
+        """Whether any callbacks are running or queued."""
+        return bool(self._active)
+
+    def stats(self) -> dict[str, Any]:
+        """Dispatch counters, and callback latencies per interaction."""
+        return {"counters": self.metrics.snapshot(), "callbacks": self.metrics.latency_snapshot()}
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+
+async def _await(awaitable):
+    return await awaitable
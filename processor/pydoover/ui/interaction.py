@@ -7,6 +7,7 @@ from .misc import Colour, Option
 
 
 if TYPE_CHECKING:
+    from .dispatch import CallbackDispatcher
     from .manager import UIManager
 
 log = logging.getLogger(__name__)
@@ -21,7 +22,8 @@ class Interaction(Element):
 
     def __init__(
         self, name: str, display_name: str = None, current_value: Any = NotSet,
-        default: Any = None, callback=None, transform_check=None, show_activity: Optional[bool] = None, **kwargs
+        default: Any = None, callback=None, transform_check=None, show_activity: Optional[bool] = None,
+        callback_timeout: Optional[float] = None, **kwargs
     ):
         super().__init__(name, display_name, **kwargs)
         self._current_value = current_value
@@ -39,6 +41,8 @@ class Interaction(Element):
             self.coerce(self._default_value)
 
         self.show_activity = show_activity
+        # seconds a dispatched callback may run for before it's abandoned (see `CallbackDispatcher`).
+        self.callback_timeout = callback_timeout
 
     @property
     def current_value(self):
@@ -72,7 +76,7 @@ class Interaction(Element):
         else:
             return new_value
 
-    def _handle_new_value(self, new_value: Any):
+    def _handle_new_value(self, new_value: Any, dispatcher: Optional["CallbackDispatcher"] = None):
         try:
             new_value = self.transform_check(new_value)
         except Exception as e:
@@ -81,6 +85,10 @@ class Interaction(Element):
 
         self.current_value = new_value
 
+        if dispatcher is not None:
+            dispatcher.dispatch(self, new_value)
+            return
+
         try:
             self.callback(new_value)
         except Exception as e:
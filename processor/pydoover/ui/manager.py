@@ -7,6 +7,7 @@ from datetime import datetime
 
 from typing import Union, Any, Optional, TypeVar, TYPE_CHECKING
 
+from .dispatch import CallbackDispatcher
 from .element import Element
 from .interaction import SlimCommand, Interaction, NotSet
 from .submodule import Container
@@ -37,6 +38,7 @@ class UIManager:
         auto_start: bool = False,
         min_ui_update_period: int = 600,
         min_observed_update_period: int = 4,
+        callback_dispatcher: CallbackDispatcher = None,
     ):
         self.client = client
         # to determine whether we can use event-based logic
@@ -68,6 +70,9 @@ class UIManager:
         # legacy, list of subscriptions to call when we have a command update.
         self._cmds_subscriptions = []
 
+        # if set, interaction callbacks run on this rather than on the thread delivering the command update.
+        self.callback_dispatcher = callback_dispatcher
+
         if auto_start:
             self.start_comms()
 
@@ -162,7 +167,7 @@ class UIManager:
         for command_name, new_value in changed.items():
             command = self.get_command(command_name)
             if command is not None:
-                command._handle_new_value(new_value)
+                command._handle_new_value(new_value, dispatcher=self.callback_dispatcher)
 
     def _set_new_ui_cmds(self, payload: dict[str, Any]):
         if not isinstance(payload, dict):
@@ -378,9 +383,9 @@ class UIManager:
             if cloud_commands.get(name) != value and value != NotSet
         }
 
-        log.debug("Last Commands: " + str(cloud_commands))
-        log.debug("New Commands: " + str(local_commands))
-        log.debug("Commands Update: " + str(result))
+        log.debug("Last Commands: %s", cloud_commands)
+        log.debug("New Commands: %s", local_commands)
+        log.debug("Commands Update: %s", result)
 
         # don't clean up commands that exist upstream but not locally for now.
         result.update({c: None for c in cloud_commands.keys() if c not in local_commands})
@@ -394,9 +399,11 @@ class UIManager:
         # this recursively evaluates and finds the diff on all children, rather than trying to do the diff here
         result = self._base_container.get_diff(cloud_state, remove=should_remove)
 
-        log.debug("Last UI State: " + str(cloud_state))
-        log.debug("New UI State: " + str(self._base_container.to_dict()))
-        log.debug("UI State Update: " + str(result))
+        if log.isEnabledFor(logging.DEBUG):
+            # don't rebuild (and stringify) the whole UI state unless it's going to be logged.
+            log.debug("Last UI State: %s", cloud_state)
+            log.debug("New UI State: %s", self._base_container.to_dict())
+            log.debug("UI State Update: %s", result)
 
         if not result or len(result) == 0:
             return None
@@ -1,32 +1,106 @@
+import bisect
+
+from typing import Any, Optional
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class Calibration:
+    """Piecewise-linear mapping of raw readings (eg. 4-20mA) to output values.
+
+    Breakpoints and slopes are computed once, so mapping a reading is a bisect (or a ``searchsorted`` for
+    NumPy arrays) and a multiply-add. Readings below ``ignore_below`` map to None (NaN for arrays).
+
+    This matches ``map_reading`` exactly, including extrapolating past either end of ``raw_readings``.
+    """
+
+    def __init__(self, output_values, raw_readings=(4, 20), ignore_below=3):
+        if len(raw_readings) < 2 or len(raw_readings) != len(output_values):
+            raise ValueError("raw_readings and output_values must be the same length, with at least 2 values.")
+        if any(a >= b for a, b in zip(raw_readings, raw_readings[1:])):
+            raise ValueError("raw_readings must be in increasing order.")
+
+        self.raw_readings = list(raw_readings)
+        self.output_values = list(output_values)
+        self.ignore_below = ignore_below
+
+        # segment k is used for readings with bisect_left(raw_readings, reading) == k (clamped to the last segment).
+        # like map_reading, segment 0 spans from the last reading back to the first.
+        num = len(self.raw_readings)
+        self._x0, self._y0, self._slope = [], [], []
+        for k in range(num):
+            lower = k - 1 if k > 0 else -1
+            upper = lower + 1
+            in_span = self.raw_readings[upper] - self.raw_readings[lower]
+            out_span = self.output_values[upper] - self.output_values[lower]
+            self._x0.append(self.raw_readings[lower])
+            self._y0.append(self.output_values[lower])
+            self._slope.append(float(out_span) / float(in_span))
+
+        # readings above the last breakpoint use the last segment
+        self._last_k = num - 1
+        self._np_arrays = None
+
+    def __call__(self, in_val):
+        if np is not None and isinstance(in_val, (np.ndarray, list, tuple)):
+            return self.map_array(in_val)
+        return self.map(in_val)
+
+    def map(self, in_val):
+        if self.ignore_below is not None and in_val < self.ignore_below:
+            return None
+
+        k = bisect.bisect_left(self.raw_readings, in_val)
+        if k > self._last_k:
+            k = self._last_k
+        return self._y0[k] + (in_val - self._x0[k]) * self._slope[k]
+
+    def map_array(self, in_vals):
+        if np is None:
+            raise RuntimeError("numpy is required to map arrays of readings.")
+
+        if self._np_arrays is None:
+            self._np_arrays = tuple(
+                np.asarray(a, dtype=np.float64) for a in (self.raw_readings, self._x0, self._y0, self._slope)
+            )
+        raw, x0, y0, slope = self._np_arrays
+
+        in_vals = np.asarray(in_vals, dtype=np.float64)
+        k = np.searchsorted(raw, in_vals, side="left")
+        np.minimum(k, self._last_k, out=k)
+
+        # y0 + (x - x0) * slope, done in place to avoid extra temporaries
+        result = in_vals - x0[k]
+        result *= slope[k]
+        result += y0[k]
+
+        if self.ignore_below is not None:
+            result[in_vals < self.ignore_below] = np.nan
+        return result
 
 
 ## A function to map a reading to a value in a range
 def map_reading(in_val, output_values, raw_readings=[4,20], ignore_below=3):
-
+    ## one-off readings don't need a `Calibration`; find the segment with a bisect rather than a scan.
+    ## like the original implementation, extra values in the longer of the two lists are ignored.
     if in_val < ignore_below:
         return None
 
-    ## Choose the value set to map between
-    lower_val_ind = 0
-    found = False
-    for i in range(0, len(raw_readings)):
-        if in_val <= raw_readings[i]:
-            lower_val_ind = i-1
-            found = True
-            break
-
-    if not found:
-        lower_val_ind = len(raw_readings)-2
-
-    # Figure out how 'wide' each range is
-    inSpan = raw_readings[lower_val_ind + 1] - raw_readings[lower_val_ind]
-    outSpan = output_values[lower_val_ind + 1] - output_values[lower_val_ind]
+    last = len(raw_readings) - 1
+    if len(output_values) <= last:
+        last = len(output_values) - 1
 
-    # Convert the left range into a 0-1 range (float)
-    valueScaled = float(in_val - raw_readings[lower_val_ind]) / float(inSpan)
+    ## readings past either end use the first or last range
+    lower_val_ind = bisect.bisect_left(raw_readings, in_val, 0, last) - 1
+    raw_lower = raw_readings[lower_val_ind]
+    out_lower = output_values[lower_val_ind]
 
-    # Convert the 0-1 range into a value in the right range.
-    return output_values[lower_val_ind] + (valueScaled * outSpan)
+    # Convert the left range into a 0-1 range (float), then into a value in the right range.
+    valueScaled = float(in_val - raw_lower) / float(raw_readings[lower_val_ind + 1] - raw_lower)
+    return out_lower + (valueScaled * (output_values[lower_val_ind + 1] - out_lower))
 
 
 def find_object_with_key(obj, key_to_find):
@@ -61,4 +135,84 @@ def find_path_to_key(obj, key_to_find):
                 new_path = f"{path}.{key}" if path else key
                 stack.append({'current': current[key], 'path': new_path})
 
-    return None
\ No newline at end of file
+    return None
+
+
+class KeyIndex:
+    """A one-pass index of key -> [paths] over a nested dict.
+
+    Paths are tuples of keys from the root object, in the same visiting order as ``find_object_with_key``
+    (so ``index.first(key)`` resolves to the same object that function would return).
+    Pass ``keys`` to only index the keys you're interested in, which is cheaper for large objects.
+    """
+
+    def __init__(self, obj, keys=None):
+        self.obj = obj
+        self.keys = frozenset(keys) if keys is not None else None
+        self._index: dict[Any, list[tuple]] = dict()
+        self._build()
+
+    def _build(self):
+        stack = [(self.obj, ())]
+        wanted = self.keys
+
+        while stack:
+            current, path = stack.pop()
+            if not isinstance(current, dict):
+                continue
+
+            for key, value in current.items():
+                if wanted is None or key in wanted:
+                    self._index.setdefault(key, []).append(path + (key, ))
+                if isinstance(value, dict):
+                    stack.append((value, path + (key, )))
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def paths(self, key) -> list[tuple]:
+        return self._index.get(key, [])
+
+    def first(self, key) -> Optional[tuple]:
+        try:
+            return self._index[key][0]
+        except (KeyError, IndexError):
+            return None
+
+    def get(self, key, default=None):
+        path = self.first(key)
+        if path is None:
+            return default
+        return get_path(self.obj, path)
+
+    def find(self, *keys) -> dict[Any, Optional[tuple]]:
+        return {k: self.first(k) for k in keys}
+
+
+def get_path(obj, path: tuple, default=None):
+    for key in path:
+        try:
+            obj = obj[key]
+        except (KeyError, TypeError):
+            return default
+    return obj
+
+
+def set_path(obj, path: tuple, value):
+    for key in path[:-1]:
+        obj = obj.setdefault(key, {})
+    obj[path[-1]] = value
+
+
+def pop_path(obj, path: tuple, default=None):
+    parent = get_path(obj, path[:-1])
+    if not isinstance(parent, dict):
+        return default
+    return parent.pop(path[-1], default)
+
+
+def path_to_update(path: tuple, value) -> dict:
+    """Build the minimal nested dict that sets ``value`` at ``path``, ie. for publishing a partial aggregate."""
+    for key in reversed(path):
+        value = {key: value}
+    return value
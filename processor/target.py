@@ -1,7 +1,24 @@
 import logging, json, time
 
+from pydoover import codec
 from pydoover.cloud import ProcessorBase
-from pydoover.utils import find_object_with_key
+from pydoover.cloud.api import NotFound
+from pydoover.utils import KeyIndex, get_path, path_to_update
+
+## where the per-skid KPI table lives in the dashboard agent's ui_state, keyed by skid agent ID
+SKID_TABLE_PATH = ("state", "children", "SiaDashboard", "skids")
+## each skid's last published KPI row is kept in its own (small) channel on the dashboard agent
+SKID_KPI_CHANNEL_PREFIX = "sia_kpis_"
+
+## dashboard tile field: path to the value in a skid's telemetry message
+DEFAULT_KPI_FIELDS = {
+    "tankLevel": "tank_level",
+    "actualFlowRate": "flow_rate",
+    "targetFlow": "target_flow",
+    "pressureDelta": "pressure_delta",
+    "strokesPerMin": "strokes_per_min",
+    "hasFault": "fault",
+}
 
 class target(ProcessorBase):
 
@@ -19,34 +36,130 @@ class target(ProcessorBase):
 
         if message_type == "DEPLOY":
             self.on_deploy()
+        elif message_type == "SKID_KPIS":
+            self.on_skid_kpis()
 
     def on_deploy(self):
 
         ## Get the latest ui_state
         ui_state = self.ui_state_channel.fetch_aggregate()
 
-        ## From the ui_state, if there is a "RemoteComponent" object, extract it
-        remote_component = None
+        ## From the ui_state, if there is a "RemoteComponent" object, find where it lives
+        remote_component_path = None
         if ui_state:
-            remote_component = find_object_with_key(ui_state, "RemoteComponent")
+            remote_component_path = KeyIndex(ui_state, keys=("RemoteComponent",)).first("RemoteComponent")
 
-        if remote_component is None:
+        if remote_component_path is None:
             logging.error("RemoteComponent not found in ui_state")
             return
-        
+
+        remote_component = get_path(ui_state, remote_component_path)
+        if not isinstance(remote_component, dict):
+            logging.error("RemoteComponent in ui_state is not an object")
+            return
+
         if "containers" in remote_component:
             containers = remote_component["containers"]
             remote_component["children"] = containers
             remote_component.pop("containers")
 
-        ## republish the updated ui_state
-        state_update = {
-            "state": {
-                "children": {
-                    "RemoteComponent": None,
-                    "GwStoragesDashboard": remote_component
-                }
-            }
-        }
+        ## republish only the parent of the RemoteComponent, with the subtree relocated
+        parent_path = remote_component_path[:-1]
+        state_update = path_to_update(parent_path, {
+            "RemoteComponent": None,
+            "GwStoragesDashboard": remote_component
+        })
 
         self.ui_state_channel.publish(state_update)
+
+    ## Skid KPI table
+    ##
+    ## The task subscribes to each skid's telemetry channel. A deployment (a message from this agent) sets up the
+    ## subscriptions and seeds the whole table; each telemetry message then only updates that skid's row, publishing
+    ## just the fields that changed. The previous row is read from the skid's own KPI channel rather than the
+    ## (fleet-sized) ui_state, so the cost per message doesn't grow with the number of skids.
+
+    @property
+    def skids(self):
+        return {s["agent_id"]: s.get("name") or s["agent_id"] for s in self.package_config.get("skids", [])}
+
+    @property
+    def telemetry_channel_name(self):
+        return self.package_config.get("telemetry_channel", "telemetry")
+
+    @property
+    def kpi_fields(self):
+        return self.package_config.get("kpi_fields", DEFAULT_KPI_FIELDS)
+
+    def on_skid_kpis(self):
+        if self.message is None or self.message.agent_id == self.agent_id:
+            self.setup_skid_subscriptions()
+            return
+
+        agent_id = self.message.agent_id
+        if agent_id not in self.skids:
+            ## the skid was removed from the config since the last deployment; drop its row and stop listening
+            logging.warning(f"Ignoring telemetry from {agent_id}, it isn't a configured skid.")
+            self.api.unsubscribe_from_channel(self.message.channel_id, self.task_id)
+            self.ui_state_channel.publish(path_to_update(SKID_TABLE_PATH + (agent_id,), None))
+            return
+
+        payload = self.message.fetch_payload()
+        if isinstance(payload, str):
+            payload = codec.loads(payload)
+        self.update_skid_row(agent_id, payload or {})
+
+    def build_kpi_row(self, telemetry):
+        ## missing fields are left out (rather than set to None), so partial telemetry doesn't clear a tile
+        row = {}
+        for field, telemetry_path in self.kpi_fields.items():
+            value = get_path(telemetry, tuple(telemetry_path.split(".")))
+            if value is not None:
+                row[field] = value
+        return row
+
+    def setup_skid_subscriptions(self):
+        task = self.api.get_channel(self.task_id)
+
+        rows = {}
+        for agent_id, name in self.skids.items():
+            try:
+                telemetry_channel = self.api.get_channel_named(self.telemetry_channel_name, agent_id)
+            except NotFound:
+                logging.warning(f"Skid {name} ({agent_id}) has no {self.telemetry_channel_name} channel yet.")
+                continue
+
+            task.subscribe_to_channel(telemetry_channel.id)
+            rows[agent_id] = {"title": name, **self.build_kpi_row(telemetry_channel.aggregate or {})}
+            self.api.publish_to_channel_name(self.agent_id, SKID_KPI_CHANNEL_PREFIX + agent_id, rows[agent_id], override_aggregate=True)
+
+        logging.info(f"Subscribed to telemetry from {len(rows)} of {len(self.skids)} skids.")
+
+        ## rows (and subscriptions) for skids no longer in the config are removed; a None value deletes the key
+        current_rows = get_path(self.ui_state_channel.fetch_aggregate() or {}, SKID_TABLE_PATH) or {}
+        for agent_id in current_rows:
+            if agent_id in self.skids:
+                continue
+            rows[agent_id] = None
+            try:
+                telemetry_channel = self.api.get_channel_named(self.telemetry_channel_name, agent_id)
+            except NotFound:
+                continue
+            task.unsubscribe_from_channel(telemetry_channel.id)
+
+        self.ui_state_channel.publish(path_to_update(SKID_TABLE_PATH, rows))
+
+    def update_skid_row(self, agent_id, telemetry):
+        kpi_channel = self.api.create_channel(SKID_KPI_CHANNEL_PREFIX + agent_id, self.agent_id)
+        previous = kpi_channel.aggregate or {}
+
+        row = self.build_kpi_row(telemetry)
+        if not previous:
+            row["title"] = self.skids[agent_id]
+
+        changed = {k: v for k, v in row.items() if previous.get(k) != v}
+        if not changed:
+            return
+
+        self.ui_state_channel.publish(path_to_update(SKID_TABLE_PATH + (agent_id,), changed))
+        kpi_channel.publish(changed, save_log=False)
@@ -0,0 +1,89 @@
+import asyncio
+import contextlib
+import io
+import threading
+
+import pydoover.cloud  # noqa: F401, imported before pydoover.ui to avoid a circular import
+from pydoover.cloud.api import LocalBroker, LocalDeviceAgent
+from pydoover.ui import Action, AsyncUIManager, NumericVariable
+from pydoover.utils import KeyIndex, get_path
+
+
+def _current_value(aggregate, name):
+    path = KeyIndex(aggregate or {}, keys=(name, )).first(name)
+    return path and get_path(aggregate, path).get("currentValue")
+
+
+async def _wait_for(condition, timeout=3):
+    async def poll():
+        while not condition():
+            await asyncio.sleep(0.01)
+    await asyncio.wait_for(poll(), timeout)
+
+
+def test_push_and_pull_over_http():
+    broker = LocalBroker(seed=0)
+    agent_id = broker.add_agent()
+    for channel_name in ("ui_state", "ui_cmds"):
+        broker.add_channel(agent_id, channel_name, {})
+    cloud_client = broker.client(agent_id)
+
+    handled = []
+
+    async def on_pump(value):
+        handled.append((value, threading.current_thread()))
+
+    async def main():
+        manager = AsyncUIManager(agent_id, broker.client(agent_id), push_interval=None)
+        manager.add_children(NumericVariable("pressure", "Pressure"), Action("pump", "Pump", callback=on_pump))
+        await manager.start_comms()
+
+        manager.update_variable("pressure", 4.2)
+        assert await manager.push()
+        assert _current_value(broker.get_aggregate(agent_id, "ui_state"), "pressure") == 4.2
+
+        cloud_client.publish_to_channel_name(agent_id, "ui_cmds", {"cmds": {"pump": True}})
+        await manager.pull()
+        await _wait_for(lambda: handled)
+        return threading.current_thread()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        loop_thread = asyncio.run(main())
+    # coroutine callbacks are awaited on the application's loop.
+    assert handled == [(True, loop_thread)]
+
+
+def test_push_task_and_subscriptions_with_device_agent():
+    broker = LocalBroker(seed=0)
+    # deliveries come from the device agent's own thread.
+    dda = LocalDeviceAgent(broker, update_rate=50, observers=1)
+    cloud_client = broker.client(dda.agent_id)
+
+    handled = []
+
+    async def on_pump(value):
+        handled.append((value, threading.current_thread()))
+
+    async def main():
+        manager = AsyncUIManager(dda.agent_id, dda, push_interval=0.02)
+        manager.add_children(NumericVariable("pressure", "Pressure"), Action("pump", "Pump", callback=on_pump))
+        await manager.start_comms()
+        try:
+            await _wait_for(lambda: manager.last_ui_state_update is not None and manager.last_ui_cmds_update is not None)
+
+            # nothing pushes explicitly; the push task does.
+            manager.update_variable("pressure", 1.5)
+            await _wait_for(lambda: _current_value(broker.get_aggregate(dda.agent_id, "ui_state"), "pressure") == 1.5)
+
+            cloud_client.publish_to_channel_name(dda.agent_id, "ui_cmds", {"cmds": {"pump": 3}})
+            await _wait_for(lambda: handled)
+        finally:
+            await manager.close()
+        return threading.current_thread()
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            loop_thread = asyncio.run(main())
+    finally:
+        dda.close()
+    assert handled == [(3, loop_thread)]
@@ -0,0 +1,90 @@
+from pydoover.cloud.api import LocalBroker, QueryCache
+from pydoover.cloud.api.cache import MISSING
+
+
+def test_values_are_copies():
+    cache = QueryCache()
+    value = {"a": [1, 2]}
+    cache.set(("aggregate", "ch"), value)
+    value["a"].append(3)
+
+    cached = cache.get(("aggregate", "ch"))
+    assert cached == {"a": [1, 2]}
+    cached["a"].append(4)
+    assert cache.get(("aggregate", "ch")) == {"a": [1, 2]}
+
+
+def test_none_is_cached():
+    cache = QueryCache()
+    assert cache.get(("aggregate", "ch")) is MISSING
+    cache.set(("aggregate", "ch"), None)
+    assert cache.get(("aggregate", "ch")) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_max_age(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("pydoover.cloud.api.cache.time.monotonic", lambda: now[0])
+    cache = QueryCache(ttl=30)
+    cache.set(("aggregate", "ch"), 1)
+
+    now[0] += 10
+    assert cache.get(("aggregate", "ch")) == 1
+    # too old for this read, but kept for reads that accept it.
+    assert cache.get(("aggregate", "ch"), max_age=5) is MISSING
+    assert len(cache) == 1
+
+    now[0] += 30
+    # older than the TTL, so dropped.
+    assert cache.get(("aggregate", "ch")) is MISSING
+    assert len(cache) == 0
+
+
+def test_evicts_least_recently_used():
+    cache = QueryCache(max_entries=2)
+    cache.set(("aggregate", "a"), 1)
+    cache.set(("aggregate", "b"), 2)
+    cache.get(("aggregate", "a"))
+    cache.set(("aggregate", "c"), 3)
+
+    assert cache.get(("aggregate", "b")) is MISSING
+    assert cache.get(("aggregate", "a")) == 1
+    assert cache.evictions == 1
+
+
+def test_max_bytes():
+    cache = QueryCache(max_bytes=100)
+    cache.set(("aggregate", "big"), "x" * 200)
+    assert len(cache) == 0
+
+    for i in range(10):
+        cache.set(("aggregate", str(i)), "x" * 20)
+    assert cache.stats()["bytes"] <= 100
+    assert cache.get(("aggregate", "9")) == "x" * 20
+
+
+def test_invalidate_channel():
+    cache = QueryCache()
+    cache.set(("aggregate", "a"), 1)
+    cache.set(("messages", "a", 10), [])
+    cache.set(("aggregate", "b"), 2)
+    cache.invalidate("a")
+    assert len(cache) == 1
+    assert cache.stats()["bytes"] == len(b"2")
+
+
+def test_publish_invalidates_cached_aggregate():
+    broker = LocalBroker(seed=0)
+    agent_id = broker.add_agent()
+    channel_id = broker.add_channel(agent_id, "readings")
+    client = broker.client(agent_id)
+    client.publish_to_channel(channel_id, {"value": 1})
+
+    channel = client.get_channel(channel_id)
+    fetches = broker.calls["GET /ch/v1/channel/{channel_id}"]
+    assert channel.fetch_aggregate() == {"value": 1}
+    assert broker.calls["GET /ch/v1/channel/{channel_id}"] == fetches
+
+    client.publish_to_channel(channel_id, {"value": 2})
+    assert channel.fetch_aggregate() == {"value": 2}
+    assert broker.calls["GET /ch/v1/channel/{channel_id}"] == fetches + 1
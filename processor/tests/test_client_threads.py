@@ -0,0 +1,56 @@
+import threading
+
+import pytest
+
+from pydoover.benchmarks import bench_client_threads
+from pydoover.cloud.api import LocalBroker
+
+
+def test_client_threads():
+    # raises on any request error, more than one token refresh, or a lost publish.
+    bench_client_threads(num_threads=8, requests_per_thread=20, latency=0.001)
+
+
+def test_assigned_session_is_shared():
+    broker = LocalBroker()
+    agent_id = broker.add_agent()
+    channel_id = broker.add_channel(agent_id, "readings")
+    client = broker.client(agent_id)
+
+    session = broker.client(agent_id).session
+    with pytest.warns(DeprecationWarning):
+        client.session = session
+    assert client.session is session
+    assert session.headers["Authorization"] == client._auth_headers["Authorization"]
+
+    client.publish_to_channel(channel_id, {"i": 0})
+    assert len(broker.channels[channel_id].messages) == 1
+
+
+def test_fetch_aggregates_from_many_threads():
+    broker = LocalBroker(latency=0.002, seed=0)
+    agent_ids = [broker.add_agent() for _ in range(20)]
+    for agent_id in agent_ids:
+        broker.add_channel(agent_id, "readings")
+        broker.publish(agent_id, "readings", {"agent": agent_id})
+    client = broker.client(agent_ids[0])
+
+    errors = []
+
+    def work(concurrency):
+        try:
+            for _ in range(5):
+                aggregates, failed = client.fetch_aggregates(agent_ids, "readings", concurrency=concurrency)
+                assert not failed
+                assert aggregates == {agent_id: {"agent": agent_id} for agent_id in agent_ids}
+        except Exception as e:
+            errors.append(e)
+
+    # callers asking for different pool sizes mustn't shut down each other's executor.
+    threads = [threading.Thread(target=work, args=(concurrency, )) for concurrency in (None, 2, 4, 8, 2, None)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    assert sorted(client._executors) == [2, 4, 8, 32]
@@ -0,0 +1,28 @@
+import math
+
+import pytest
+
+from pydoover import codec
+
+
+VALUES = [
+    {"a": 1, "b": [1.5, "two", None, True], "c": {"d": {"e": "é/ü"}}},
+    {"nan": math.nan, "inf": [math.inf, -math.inf], "nested": {"x": (1.0, math.nan)}},
+    [math.nan],
+    math.inf,
+]
+
+
+@pytest.mark.parametrize("name", list(codec.CODECS))
+@pytest.mark.parametrize("value", VALUES)
+def test_codecs_agree(name, value):
+    reference = codec.get_codec("json")
+    c = codec.get_codec(name)
+    assert c.loads(c.dumps(value)) == reference.loads(reference.dumps(value))
+
+
+@pytest.mark.parametrize("name", list(codec.CODECS))
+def test_non_finite_floats_encode_as_null(name):
+    encoded = codec.get_codec(name).dumps({"nan": math.nan, "inf": math.inf})
+    assert b"NaN" not in encoded and b"Infinity" not in encoded
+    assert codec.loads(encoded) == {"nan": None, "inf": None}
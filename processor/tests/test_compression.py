@@ -0,0 +1,80 @@
+import pytest
+
+from pydoover.cloud.api import Client, LocalBroker
+from pydoover.cloud.api.compression import available_encodings
+
+
+def _served(**broker_kwargs):
+    broker = LocalBroker(**broker_kwargs)
+    agent_id = broker.add_agent()
+    channel_id = broker.add_channel(agent_id, "readings")
+    server = broker.serve()
+    return broker, server, agent_id, channel_id
+
+
+def _big_payload():
+    return {"readings": [{"sensor": f"sensor_{i}", "value": i * 1.5} for i in range(200)]}
+
+
+@pytest.mark.parametrize("encoding", available_encodings())
+def test_compressed_publish_over_http(encoding):
+    broker, server, agent_id, channel_id = _served()
+    client = Client(token=broker.add_token(agent_id), base_url=server.url, agent_id=agent_id, compression=encoding)
+    payload = _big_payload()
+    try:
+        client.publish_to_channel(channel_id, payload)
+        # the response is large enough to come back gzipped, which requests decodes for us.
+        assert client.get_channel(channel_id).aggregate == payload
+    finally:
+        server.shutdown()
+
+    assert broker.compressed_requests == 1
+    assert broker.channels[channel_id].messages[-1]["payload"] == payload
+    assert client.metrics["compressed_requests"] == 1
+    assert client.compression_ratio > 1
+
+
+def test_small_bodies_are_not_compressed():
+    broker, server, agent_id, channel_id = _served()
+    client = Client(token=broker.add_token(agent_id), base_url=server.url, agent_id=agent_id, compression="gzip")
+    try:
+        client.publish_to_channel(channel_id, {"value": 1})
+    finally:
+        server.shutdown()
+
+    assert broker.compressed_requests == 0
+    assert broker.channels[channel_id].messages[-1]["payload"] == {"value": 1}
+
+
+def test_rejected_compression_falls_back_to_plain_bodies():
+    broker, server, agent_id, channel_id = _served(accept_compression=False)
+    client = Client(token=broker.add_token(agent_id), base_url=server.url, agent_id=agent_id, compression="gzip")
+    payload = _big_payload()
+    try:
+        client.publish_to_channel(channel_id, payload)
+        client.publish_to_channel(channel_id, payload)
+    finally:
+        server.shutdown()
+
+    # the first body is resent uncompressed after the 415, and later ones aren't compressed at all.
+    assert [m["payload"] for m in broker.channels[channel_id].messages] == [payload, payload]
+    assert client.metrics["compression_rejected"] == 1
+    assert client.metrics["compressed_requests"] == 1
+    assert client.metrics["failures"] == 0
+    assert broker.calls["POST /ch/v1/channel/{channel_id}/"] == 3
+
+
+def test_response_bytes_counts_compressed_size():
+    broker, server, agent_id, channel_id = _served()
+    client = Client(token=broker.add_token(agent_id), base_url=server.url, agent_id=agent_id)
+    payload = _big_payload()
+    broker.publish(agent_id, "readings", payload)
+    try:
+        before = client.metrics["response_bytes"]
+        client.get_channel(channel_id)
+    finally:
+        server.shutdown()
+
+    # the aggregate alone is bigger than what came over the wire, gzipped.
+    received = client.metrics["response_bytes"] - before
+    assert 0 < received < len(str(payload))
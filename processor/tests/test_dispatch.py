@@ -0,0 +1,129 @@
+import asyncio
+import threading
+import time
+
+from types import SimpleNamespace
+
+import pydoover.cloud  # noqa: F401, imported before pydoover.ui to avoid a circular import
+from pydoover.ui.dispatch import CallbackDispatcher
+
+
+def _interaction(callback, name="button", callback_timeout=None):
+    return SimpleNamespace(name=name, callback=callback, callback_timeout=callback_timeout)
+
+
+def _wait_idle(dispatcher, timeout=3):
+    deadline = time.monotonic() + timeout
+    while dispatcher.busy:
+        assert time.monotonic() < deadline, "callbacks didn't finish"
+        time.sleep(0.005)
+
+
+def test_runs_off_the_calling_thread():
+    dispatcher = CallbackDispatcher()
+    threads = []
+    dispatcher.dispatch(_interaction(lambda value: threads.append(threading.current_thread())), 1)
+    _wait_idle(dispatcher)
+    assert threads and threads[0] is not threading.current_thread()
+    dispatcher.shutdown()
+
+
+def test_coalesces_values_while_running():
+    dispatcher = CallbackDispatcher()
+    release = threading.Event()
+    seen = []
+
+    def callback(value):
+        seen.append(value)
+        release.wait(3)
+
+    interaction = _interaction(callback)
+    for value in range(1, 5):
+        dispatcher.dispatch(interaction, value)
+    release.set()
+    _wait_idle(dispatcher)
+
+    assert seen == [1, 4]
+    assert dispatcher.stats()["counters"]["coalesced"] == 2
+    dispatcher.shutdown()
+
+
+def test_interactions_run_independently():
+    dispatcher = CallbackDispatcher()
+    release = threading.Event()
+    seen = []
+    dispatcher.dispatch(_interaction(lambda value: release.wait(3), name="slow"), 1)
+    dispatcher.dispatch(_interaction(seen.append, name="fast"), 2)
+
+    deadline = time.monotonic() + 3
+    while not seen and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert seen == [2]
+    release.set()
+    _wait_idle(dispatcher)
+    dispatcher.shutdown()
+
+
+def test_errors_are_counted():
+    dispatcher = CallbackDispatcher()
+    seen = []
+
+    def callback(value):
+        seen.append(value)
+        raise ValueError("bad value")
+
+    interaction = _interaction(callback)
+    dispatcher.dispatch(interaction, 1)
+    _wait_idle(dispatcher)
+    dispatcher.dispatch(interaction, 2)
+    _wait_idle(dispatcher)
+
+    assert seen == [1, 2]
+    assert dispatcher.stats()["counters"]["errors"] == 2
+    dispatcher.shutdown()
+
+
+def test_timed_out_thread_finishes_before_next_value():
+    dispatcher = CallbackDispatcher(default_timeout=0.05)
+    events = []
+
+    def callback(value):
+        events.append(("start", value))
+        if value == 1:
+            time.sleep(0.2)
+        events.append(("end", value))
+
+    interaction = _interaction(callback)
+    dispatcher.dispatch(interaction, 1)
+    time.sleep(0.1)
+    dispatcher.dispatch(interaction, 2)
+    _wait_idle(dispatcher)
+
+    assert events == [("start", 1), ("end", 1), ("start", 2), ("end", 2)]
+    assert dispatcher.stats()["counters"]["timeouts"] == 1
+    dispatcher.shutdown()
+
+
+def test_event_loop_cancels_timed_out_coroutines():
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    dispatcher = CallbackDispatcher(loop=loop)
+    seen = []
+
+    async def callback(value):
+        if value == 1:
+            await asyncio.sleep(10)
+        seen.append(value)
+
+    interaction = _interaction(callback, callback_timeout=0.05)
+    dispatcher.dispatch(interaction, 1)
+    dispatcher.dispatch(interaction, 2)
+    _wait_idle(dispatcher)
+
+    assert seen == [2]
+    assert dispatcher.stats()["counters"]["timeouts"] == 1
+    assert dispatcher.stats()["callbacks"]["button"]["count"] == 2
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(1)
+    dispatcher.shutdown()
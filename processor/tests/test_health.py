@@ -0,0 +1,70 @@
+import pydoover.cloud  # noqa: F401, imported before pydoover.ui to avoid a circular import
+from pydoover.health import FleetHealth
+from pydoover.ui.element import ConnectionInfo, ConnectionType
+
+NOW = 1_700_000_000
+
+
+def _states(health, ages):
+    health.set_last_seen({agent_id: NOW - age for agent_id, age in ages.items()})
+    report = health.evaluate(NOW)
+    return {agent_id: health.state_of(agent_id) for agent_id in report.agent_ids}
+
+
+def test_periodic_allowed_misses():
+    health = FleetHealth()
+    agents = ["a", "b", "c", "d"]
+    health.set_agents({a: {"connectionType": "periodic", "connectionPeriod": 600, "allowedMisses": 2} for a in agents})
+    states = _states(health, {"a": 500, "b": 700, "c": 1300, "d": 1900})
+    assert states == {"a": "online", "b": "late", "c": "late", "d": "offline"}
+
+    report = health.evaluate(NOW)
+    assert report.missed.tolist() == [0, 1, 2, 3]
+
+
+def test_periodic_defaults_and_offline_after():
+    health = FleetHealth()
+    health.set_agents({
+        "default": {"connectionType": "periodic", "connectionPeriod": 600},
+        "offline_after": {"connectionType": "periodic", "connectionPeriod": 600, "offlineAfter": 1000},
+        "next_connection": {"connectionType": "periodic", "connectionPeriod": 600, "nextConnection": 60},
+    })
+    assert _states(health, {"default": 700, "offline_after": 700, "next_connection": 100}) == {
+        "default": "late", "offline_after": "late", "next_connection": "late",
+    }
+    assert _states(health, {"default": 1300, "offline_after": 1100, "next_connection": 50}) == {
+        "default": "offline", "offline_after": "offline", "next_connection": "online",
+    }
+
+
+def test_constant_and_never_seen():
+    health = FleetHealth(constant_offline_after=300)
+    health.set_agents({"never": {}, "custom": {"offlineAfter": 60}})
+    assert _states(health, {"recent": 100, "stale": 400, "custom": 100}) == {
+        "never": "offline", "custom": "offline", "recent": "online", "stale": "offline",
+    }
+    assert health.summary() == {"online": 1, "late": 0, "offline": 3}
+
+
+def test_connection_info_objects():
+    health = FleetHealth()
+    info = ConnectionInfo(connection_type=ConnectionType.periodic, connection_period=600, allowed_misses=0)
+    health.set_agents({"a": info})
+    assert _states(health, {"a": 700}) == {"a": "offline"}
+
+
+def test_transitions():
+    health = FleetHealth()
+    health.set_agents({a: {"connectionType": "periodic", "connectionPeriod": 600} for a in ("a", "b")})
+    health.set_last_seen({"a": NOW - 100, "b": NOW - 100})
+
+    first = health.evaluate(NOW)
+    assert sorted(first.transitions) == [("a", None, "online"), ("b", None, "online")]
+    assert health.evaluate(NOW).transitions == []
+
+    health.set_last_seen({"b": NOW - 700})
+    assert health.evaluate(NOW).transitions == [("b", "online", "late")]
+
+    health.set_agents({"c": {}})
+    assert health.state_of("c") is None
+    assert health.evaluate(NOW).transitions == [("c", None, "offline")]
@@ -0,0 +1,75 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from pydoover.cloud.api import LocalBroker
+
+
+def _broker_with_messages(num_messages):
+    broker = LocalBroker(seed=0)
+    agent_id = broker.add_agent()
+    channel_id = broker.add_channel(agent_id, "readings")
+    client = broker.client(agent_id)
+    for i in range(num_messages):
+        # pairs of messages share a timestamp, so pages split them.
+        timestamp = datetime.fromtimestamp(1_700_000_000 + i // 2, tz=timezone.utc)
+        client.publish_to_channel(channel_id, {"i": i}, timestamp=timestamp)
+    return broker, client, channel_id
+
+
+def test_pages_through_every_message_once():
+    broker, client, channel_id = _broker_with_messages(95)
+    messages = list(client.iter_channel_messages(channel_id, page_size=10))
+    assert sorted(m.id for m in messages) == sorted(m["message"] for m in broker.channels[channel_id].messages)
+
+
+def test_stops_when_server_ignores_window():
+    broker, client, channel_id = _broker_with_messages(50)
+
+    handler = broker._get_messages
+
+    def ignore_window(request, **kwargs):
+        return handler({**request, "query": {}}, **kwargs)
+
+    for route in broker._routes:
+        if route.handler == handler:
+            route.handler = ignore_window
+
+    messages = list(client.iter_channel_messages(channel_id, page_size=10))
+    # only the first page can be trusted; paging must stop rather than loop.
+    assert len(messages) == 10
+    assert len({m.id for m in messages}) == 10
+    assert broker.calls["GET /ch/v1/channel/{channel_id}/messages/{num_messages}"] == 2
+
+
+def test_pages_through_messages_sharing_one_timestamp():
+    broker = LocalBroker(seed=0)
+    agent_id = broker.add_agent()
+    channel_id = broker.add_channel(agent_id, "readings")
+    client = broker.client(agent_id)
+    timestamp = datetime.fromtimestamp(1_700_000_000, tz=timezone.utc)
+    older = datetime.fromtimestamp(1_699_999_999, tz=timezone.utc)
+    client.publish_to_channel(channel_id, {"i": -1}, timestamp=older)
+    for i in range(250):
+        client.publish_to_channel(channel_id, {"i": i}, timestamp=timestamp)
+
+    messages = list(client.iter_channel_messages(channel_id, page_size=100))
+    assert len(messages) == 251
+    assert len({m.id for m in messages}) == 251
+    assert messages[-1].timestamp == older.timestamp()
+
+
+def test_raises_rather_than_truncating_a_tie(monkeypatch):
+    from pydoover.cloud.api import client as client_module
+
+    broker = LocalBroker(seed=0)
+    agent_id = broker.add_agent()
+    channel_id = broker.add_channel(agent_id, "readings")
+    client = broker.client(agent_id)
+    timestamp = datetime.fromtimestamp(1_700_000_000, tz=timezone.utc)
+    for i in range(50):
+        client.publish_to_channel(channel_id, {"i": i}, timestamp=timestamp)
+
+    monkeypatch.setattr(client_module, "MAX_PAGE_SIZE", 40)
+    with pytest.raises(RuntimeError):
+        list(client.iter_channel_messages(channel_id, page_size=10))
@@ -0,0 +1,119 @@
+import time
+
+from pydoover.cloud.api import LocalBroker, Outbox
+from pydoover.cloud.api.retry import RetryPolicy
+
+
+def _setup(outbox, **broker_kwargs):
+    broker = LocalBroker(seed=0, **broker_kwargs)
+    agent_id = broker.add_agent()
+    channel_id = broker.add_channel(agent_id, "readings")
+    client = broker.client(agent_id, outbox=outbox, retry_policy=RetryPolicy(total=0))
+    return broker, client, channel_id
+
+
+def _payloads(broker, channel_id):
+    return [m["payload"] for m in broker.channels[channel_id].messages]
+
+
+def _wait_for(condition, timeout=3):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_failed_publish_is_flushed_in_background():
+    outbox = Outbox(":memory:", max_rate=None)
+    broker, client, channel_id = _setup(outbox)
+
+    broker.fail_next(exception=ConnectionError())
+    assert client.publish_to_channel(channel_id, {"i": 0}) is None
+    assert outbox.is_flushing_in_background
+
+    # nothing else is published; the flusher has to send it by itself.
+    assert _wait_for(lambda: len(outbox) == 0)
+    assert _payloads(broker, channel_id) == [{"i": 0}]
+    outbox.close()
+
+
+def test_publishes_queue_behind_backlog_in_order():
+    outbox = Outbox(":memory:", max_rate=None)
+    broker, client, channel_id = _setup(outbox)
+
+    broker.fail_next(exception=ConnectionError())
+    for i in range(20):
+        client.publish_to_channel(channel_id, {"i": i})
+
+    assert _wait_for(lambda: len(outbox) == 0)
+    assert _payloads(broker, channel_id) == [{"i": i} for i in range(20)]
+    assert outbox.sent == 20
+    outbox.close()
+
+
+def test_queued_messages_keep_their_timestamp():
+    outbox = Outbox(":memory:", max_rate=None)
+    broker, client, channel_id = _setup(outbox)
+
+    broker.fail_next(exception=ConnectionError())
+    queued_at = int(time.time())
+    client.publish_to_channel(channel_id, {"i": 0})
+    assert _wait_for(lambda: len(outbox) == 0)
+    assert abs(broker.channels[channel_id].messages[0]["timestamp"] - queued_at) <= 1
+    outbox.close()
+
+
+def test_survives_restart(tmp_path):
+    path = str(tmp_path / "outbox.db")
+    outbox = Outbox(path)
+    outbox.put("/ch/v1/channel/abc/", {"msg": {"i": 0}}, "key-0")
+    outbox.close()
+
+    reopened = Outbox(path)
+    assert len(reopened) == 1
+    assert reopened.pending_bytes > 0
+    reopened.close()
+
+
+def test_drop_oldest_keeps_counters_consistent():
+    outbox = Outbox(":memory:", max_bytes=200)
+    for i in range(20):
+        outbox.put("/ch/v1/channel/abc/", {"msg": {"i": i}}, f"key-{i}")
+
+    count, size = outbox._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM outbox").fetchone()
+    assert (len(outbox), outbox.pending_bytes) == (count, size)
+    assert size <= 200
+    assert outbox.dropped == 20 - count
+    # the newest messages are kept
+    newest = outbox._conn.execute("SELECT idempotency_key FROM outbox ORDER BY id DESC LIMIT 1").fetchone()[0]
+    assert newest == "key-19"
+    outbox.close()
+
+
+def test_drop_newest():
+    outbox = Outbox(":memory:", max_bytes=100, drop_policy="newest")
+    results = [outbox.put("/ch/v1/channel/abc/", {"msg": {"i": i}}, f"key-{i}") for i in range(10)]
+    assert results[0] and not results[-1]
+    oldest = outbox._conn.execute("SELECT idempotency_key FROM outbox ORDER BY id LIMIT 1").fetchone()[0]
+    assert oldest == "key-0"
+    outbox.close()
+
+
+def test_dropping_during_flush_skips_rows_in_flight():
+    outbox = Outbox(":memory:", max_bytes=300, chunk_size=3, max_rate=None)
+    broker, client, channel_id = _setup(outbox, latency=0.01)
+
+    broker.fail_next(exception=ConnectionError())
+    for i in range(60):
+        client.publish_to_channel(channel_id, {"i": i, "pad": "x" * 10})
+        time.sleep(0.002)
+
+    assert _wait_for(lambda: len(outbox) == 0)
+    count, size = outbox._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM outbox").fetchone()
+    assert (len(outbox), outbox.pending_bytes) == (count, size) == (0, 0)
+    delivered = len(broker.channels[channel_id].messages)
+    assert outbox.sent + outbox.dropped == 60
+    assert delivered == outbox.sent
+    outbox.close()
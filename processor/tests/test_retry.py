@@ -0,0 +1,110 @@
+import time
+
+import pytest
+
+from pydoover.cloud.api import LocalBroker
+from pydoover.cloud.api.exceptions import CircuitOpen, HTTPException
+from pydoover.cloud.api.retry import CircuitBreaker, CircuitState, RetryPolicy
+
+
+def _client(broker, **kwargs):
+    agent_id = broker.add_agent()
+    channel_id = broker.add_channel(agent_id, "readings", {"value": 1})
+    return broker.client(agent_id, **kwargs), channel_id
+
+
+def test_backoff_without_jitter_doubles_up_to_max():
+    policy = RetryPolicy(backoff_factor=0.5, max_backoff=3, jitter=False)
+    assert [policy.get_backoff(n) for n in range(1, 6)] == [0.5, 1, 2, 3, 3]
+
+
+def test_retry_after_is_respected_and_capped():
+    policy = RetryPolicy(max_retry_after=10, jitter=False)
+    assert policy.get_backoff(1, "4") == 4
+    assert policy.get_backoff(1, "120") == 10
+    assert policy.get_backoff(1, "not a date") == 0.5
+
+
+def test_retries_transient_failures(monkeypatch):
+    broker = LocalBroker(seed=0)
+    client, channel_id = _client(broker, retry_policy=RetryPolicy(total=3, jitter=False))
+    monkeypatch.setattr(client, "_sleep_before_retry", lambda seconds: None)
+
+    broker.fail_next(2, status=503)
+    assert client.get_channel(channel_id).aggregate == {"value": 1}
+    assert broker.calls["GET /ch/v1/channel/{channel_id}"] == 3
+
+
+def test_gives_up_after_total_retries(monkeypatch):
+    broker = LocalBroker(seed=0)
+    client, channel_id = _client(broker, retry_policy=RetryPolicy(total=1, jitter=False))
+    monkeypatch.setattr(client, "_sleep_before_retry", lambda seconds: None)
+
+    broker.fail_next(3, status=502)
+    with pytest.raises(HTTPException):
+        client.get_channel(channel_id)
+    assert broker.calls["GET /ch/v1/channel/{channel_id}"] == 2
+
+
+def test_publishes_are_retried_once_applied():
+    broker = LocalBroker(seed=0)
+    client, channel_id = _client(broker, retry_policy=RetryPolicy(total=2, backoff_factor=0))
+
+    broker.fail_next(exception=ConnectionError())
+    client.publish_to_channel(channel_id, {"value": 2})
+    assert len(broker.channels[channel_id].messages) == 1
+
+
+def test_circuit_opens_rejects_and_recovers():
+    breaker = CircuitBreaker("doover.local", failure_threshold=2, recovery_timeout=0.05)
+    breaker.before_request()
+    breaker.record_failure()
+    breaker.before_request()
+    breaker.record_failure()
+    assert breaker.state is CircuitState.open
+
+    with pytest.raises(CircuitOpen):
+        breaker.before_request()
+    assert breaker.rejected == 1
+
+    time.sleep(0.06)
+    breaker.before_request()  # the trial
+    assert breaker.state is CircuitState.half_open
+    with pytest.raises(CircuitOpen):
+        breaker.before_request()  # only one trial at a time
+
+    breaker.record_success()
+    assert breaker.state is CircuitState.closed
+    breaker.before_request()
+
+
+def test_failed_trial_reopens_circuit():
+    breaker = CircuitBreaker("doover.local", failure_threshold=1, recovery_timeout=0.05)
+    breaker.before_request()
+    breaker.record_failure()
+    time.sleep(0.06)
+    breaker.before_request()
+    breaker.record_failure()
+    assert breaker.state is CircuitState.open
+    with pytest.raises(CircuitOpen):
+        breaker.before_request()
+
+
+def test_unexpected_error_releases_trial():
+    broker = LocalBroker(seed=0)
+    client, channel_id = _client(
+        broker, retry_policy=RetryPolicy(total=0), circuit_breaker={"failure_threshold": 1, "recovery_timeout": 0.05},
+    )
+
+    broker.fail_next(exception=ConnectionError())
+    with pytest.raises(ConnectionError):
+        client.get_channel(channel_id)
+    time.sleep(0.06)
+
+    broker.fail_next(exception=ValueError("not a transport error"))
+    with pytest.raises(ValueError):
+        client.get_channel(channel_id)
+
+    # the abandoned trial mustn't leave the circuit rejecting everything.
+    assert client.get_channel(channel_id).aggregate == {"value": 1}
+    assert client.stats()["circuit_breakers"]["doover.local"]["state"] == "closed"
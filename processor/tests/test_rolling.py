@@ -0,0 +1,110 @@
+import json
+import random
+
+import pytest
+
+from pydoover.cloud.api import MessageBatch
+from pydoover.rolling import KPIEngine, RollingWindow
+
+START = 1_700_000_400  # a bucket boundary
+
+
+def test_stats():
+    window = RollingWindow(bucket_seconds=60, num_buckets=10, target=5)
+    for i in range(10):
+        window.add(START + i * 30, float(i))
+
+    stats = window.stats()
+    assert stats["count"] == 10
+    assert stats["mean"] == 4.5
+    assert (stats["min"], stats["max"]) == (0.0, 9.0)
+    assert stats["deviation"] == -0.5
+    assert stats["rate"] == pytest.approx(9 / 270)
+
+
+def test_late_samples():
+    window = RollingWindow(bucket_seconds=60, num_buckets=10)
+    window.add(START + 600, 1.0)
+    # out of order, but within the window
+    assert window.add(START + 60, 3.0)
+    # older than the window
+    assert not window.add(START, 5.0)
+    assert window.late_dropped == 1
+    assert window.stats()["mean"] == 2.0
+
+
+def test_window_slides():
+    window = RollingWindow(bucket_seconds=60, num_buckets=2)
+    window.add(START, 100.0)
+    window.add(START + 60, 1.0)
+    window.add(START + 120, 3.0)
+    # the first bucket's slot was reused.
+    assert window.stats()["mean"] == 2.0
+    assert window.stats(now=START + 600)["count"] == 0
+
+
+def test_add_many_matches_add():
+    rng = random.Random(0)
+    samples = [(START + rng.uniform(0, 3600), rng.uniform(-10, 10)) for _ in range(500)]
+
+    one_by_one = RollingWindow(bucket_seconds=60, num_buckets=30)
+    for ts, value in samples:
+        one_by_one.add(ts, value)
+    vectorised = RollingWindow(bucket_seconds=60, num_buckets=30)
+    vectorised.add_many([ts for ts, _ in samples], [value for _, value in samples])
+
+    assert vectorised.stats() == pytest.approx(one_by_one.stats())
+    stats = ("mean", "min", "max", "count")
+    assert vectorised.series(stats) == one_by_one.series(stats)
+
+
+def test_series():
+    window = RollingWindow(bucket_seconds=60, num_buckets=3)
+    window.add(START, 1.0)
+    window.add(START + 10, 2.0)
+    window.add(START + 120, 4.0)
+    assert window.series(("mean", "count")) == {
+        "start": START, "interval": 60, "mean": [1.5, None, 4.0], "count": [2, None, 1],
+    }
+
+
+def test_round_trip():
+    window = RollingWindow(bucket_seconds=60, num_buckets=10, target=2)
+    for i in range(20):
+        window.add(START + i * 20, float(i % 7))
+    window.add(START - 600, 1.0)
+
+    # eg. saved in a channel aggregate between invocations.
+    restored = RollingWindow.from_dict(json.loads(json.dumps(window.to_dict())))
+    assert restored.stats() == window.stats()
+    assert restored.late_dropped == 1
+
+    window.add(START + 500, 10.0)
+    restored.add(START + 500, 10.0)
+    assert restored.stats() == window.stats()
+
+
+def test_kpi_engine():
+    engine = KPIEngine({"flow": "pump.flow", "level": "tank_level"}, bucket_seconds=60, num_buckets=10, targets={"flow": 3})
+    engine.ingest({"pump": {"flow": 2}, "tank_level": 50}, START)
+    engine.ingest({"pump": {"flow": 4}, "tank_level": True}, START + 30)
+
+    stats = engine.stats()
+    assert stats["flow"]["mean"] == 3.0
+    assert stats["flow"]["deviation"] == 0.0
+    # bools aren't numbers
+    assert stats["level"]["count"] == 1
+
+    restored = KPIEngine.from_dict(json.loads(json.dumps(engine.to_dict())))
+    assert restored.stats() == stats
+
+
+def test_kpi_engine_ingests_batches():
+    data = [
+        {"message": str(i), "timestamp": START + i * 10, "payload": {"pump": {"flow": float(i)}}} for i in range(20)
+    ]
+    batch = MessageBatch.from_data(None, "ch", data)
+    engine = KPIEngine({"flow": "pump.flow"}, bucket_seconds=60, num_buckets=10)
+    engine.ingest_message(batch)
+    assert engine["flow"].stats()["count"] == 20
+    assert engine["flow"].stats()["mean"] == 9.5
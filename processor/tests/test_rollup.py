@@ -0,0 +1,90 @@
+from pydoover.cloud import ProcessorBase
+from pydoover.cloud.api import LocalBroker, Message, RollupStore
+
+DAY = 86400
+NOW = 1_700_006_400  # a bucket boundary for every tier
+
+
+def _message(i, timestamp, value):
+    data = {"message": f"m{i}", "agent": "agent", "channel_name": "pump", "timestamp": timestamp, "payload": {"flow": value}}
+    return Message(client=None, data=data)
+
+
+def _messages(count, start):
+    return [_message(i, start + i * 60, float(i)) for i in range(count)]
+
+
+def test_tiers_are_rolled_up():
+    store = RollupStore({"flow": "flow"})
+    assert store.ingest_messages(_messages(10, NOW)) == 10
+
+    result = store.query("agent/pump:flow", NOW, NOW + 600, tier="10m")
+    assert result["count"] == [10]
+    assert result["mean"] == [4.5]
+    assert (result["min"], result["max"], result["last"]) == ([0.0], [9.0], [9.0])
+    assert store.query("agent/pump:flow", NOW, NOW + 600, tier="raw")["count"] == [1] * 10
+    store.close()
+
+
+def test_reingesting_is_ignored():
+    store = RollupStore({"flow": "flow"})
+    messages = _messages(10, NOW)
+    store.ingest_messages(messages)
+    assert store.ingest_messages(messages) == 0
+    assert store.query("agent/pump:flow", NOW, NOW + DAY, tier="1d")["count"] == [10]
+    store.close()
+
+
+def test_reingesting_after_prune_does_not_double_count(tmp_path):
+    path = str(tmp_path / "rollup.db")
+    store = RollupStore({"flow": "flow"}, path=path)
+    messages = _messages(10, NOW)
+    store.ingest_messages(messages)
+    store.prune(now=NOW + 3 * DAY)
+    assert store.query("agent/pump:flow", NOW, NOW + DAY, tier="raw")["count"] == []
+
+    assert store.ingest_messages(messages) == 0
+    store.close()
+
+    # the pruned horizon survives a restart.
+    reopened = RollupStore({"flow": "flow"}, path=path)
+    assert reopened.ingest_messages(messages) == 0
+    assert reopened.query("agent/pump:flow", NOW, NOW + DAY, tier="1d")["count"] == [10]
+    # newer samples are still added.
+    assert reopened.ingest_messages([_message(99, NOW + 3 * DAY, 1.0)]) == 1
+    reopened.close()
+
+
+def test_pick_tier():
+    store = RollupStore({"flow": "flow"})
+    assert store.pick_tier(30 * DAY, 100)[0] == "1h"
+    assert store.pick_tier(DAY, 100)[0] == "10m"
+    assert store.pick_tier(600, 100)[0] == "raw"
+    store.close()
+
+
+class _Processor(ProcessorBase):
+    processed = False
+
+    def setup(self):
+        pass
+
+    def process(self):
+        type(self).processed = True
+
+
+class _BrokenStore:
+    def ingest_message(self, message):
+        raise RuntimeError("disk full")
+
+
+def test_processor_still_runs_when_ingest_fails():
+    broker = LocalBroker(seed=0)
+    agent_id = broker.add_agent()
+    processor = _Processor(
+        agent_id=agent_id, access_token=broker.add_token(agent_id), api_endpoint=broker.base_url,
+        package_config={}, msg_obj={"message": "m0", "agent": agent_id, "timestamp": NOW}, task_id="task",
+        log_channel=None, agent_settings={}, client=broker.client(agent_id), rollup_store=_BrokenStore(),
+    )
+    processor.execute()
+    assert _Processor.processed
@@ -0,0 +1,97 @@
+import json
+import logging
+import os
+import time
+
+from pydoover.cloud.api import LocalBroker
+from pydoover.cloud.processor.runner import LocalRunner
+
+
+TARGET = """
+import json, logging
+from pydoover.cloud import ProcessorBase
+
+class target(ProcessorBase):
+    def setup(self):
+        pass
+
+    def process(self):
+        with open({runs!r}, "a") as f:
+            f.write(json.dumps({{
+                "version": {version},
+                "level": logging.getLogger().level,
+                "message": self.message and self.message.id,
+            }}) + "\\n")
+"""
+
+
+def _write_target(package_dir, runs_file, version):
+    fp = package_dir / "target.py"
+    fp.write_text(TARGET.format(runs=str(runs_file), version=version))
+    # make sure the change is visible to an mtime check, even on coarse-grained filesystems.
+    mtime = time.time() + version
+    os.utime(fp, (mtime, mtime))
+
+
+def _runs(runs_file):
+    if not runs_file.exists():
+        return []
+    return [json.loads(line) for line in runs_file.read_text().splitlines()]
+
+
+def _runner(tmp_path, channel_names=()):
+    runs_file = tmp_path / "runs.jsonl"
+    package_dir = tmp_path / "package"
+    package_dir.mkdir()
+    _write_target(package_dir, runs_file, 1)
+
+    broker = LocalBroker(seed=0)
+    agent_id = broker.add_agent()
+    client = broker.client(agent_id)
+    for name in channel_names:
+        broker.add_channel(agent_id, name)
+    processor_id = broker.add_processor(agent_id, "runner_test", lambda **kwargs: None)
+    task = client.create_task("!runner_test", agent_id, processor_id)
+
+    runner = LocalRunner(task, str(package_dir), channel_names=list(channel_names), log_level=logging.DEBUG)
+    return runner, client, package_dir, runs_file
+
+
+def test_runs_with_log_level_and_restores_it(tmp_path):
+    runner, _, _, runs_file = _runner(tmp_path)
+    root = logging.getLogger()
+    before = root.level
+
+    runner.run_once()
+
+    assert _runs(runs_file) == [{"version": 1, "level": logging.DEBUG, "message": None}]
+    assert root.level == before
+
+
+def test_reloads_changed_target(tmp_path):
+    runner, _, package_dir, runs_file = _runner(tmp_path)
+    runner.run_once()
+
+    _write_target(package_dir, runs_file, 2)
+    changed = runner._changed_files()
+    assert changed == [str(package_dir / "target.py")]
+    runner.reload(changed)
+    runner.run_once()
+
+    assert [r["version"] for r in _runs(runs_file)] == [1, 2]
+
+
+def test_first_message_on_empty_channel_is_new(tmp_path):
+    runner, client, _, _ = _runner(tmp_path, channel_names=["readings"])
+    channel = client.get_channel_named("readings", runner.task.agent_id)
+
+    # priming an empty channel
+    assert runner._get_new_message() is None
+
+    channel.publish({"value": 1})
+    message = runner._get_new_message()
+    assert message is not None and message.fetch_payload() == {"value": 1}
+    assert runner._get_new_message() is None
+
+    channel.publish({"value": 2})
+    assert runner._get_new_message().fetch_payload() == {"value": 2}